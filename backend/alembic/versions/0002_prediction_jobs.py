@@ -0,0 +1,63 @@
+"""Add prediction_jobs table
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create the JobStatus enum type in PostgreSQL
+    jobstatus_enum = sa.Enum(
+        "queued", "running", "completed", "failed", name="jobstatus"
+    )
+    jobstatus_enum.create(op.get_bind(), checkfirst=True)
+
+    # ── prediction_jobs table ────────────────────────────────────────
+    op.create_table(
+        "prediction_jobs",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", jobstatus_enum, nullable=False),
+        sa.Column("total_slices", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("completed_slices", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("storage_path", sa.String(255), nullable=False),
+        sa.Column("result", sa.Text, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+    op.create_index("ix_prediction_jobs_user_id", "prediction_jobs", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prediction_jobs_user_id", table_name="prediction_jobs")
+    op.drop_table("prediction_jobs")
+
+    # Drop the enum type
+    jobstatus_enum = sa.Enum(
+        "queued", "running", "completed", "failed", name="jobstatus"
+    )
+    jobstatus_enum.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,60 @@
+"""Add user_prediction_stats rollup table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ── user_prediction_stats table ──────────────────────────────────
+    op.create_table(
+        "user_prediction_stats",
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("total_predictions", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("tumor_detected", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("confidence_sum", sa.Float, nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+
+    # ── Backfill from existing predictions ───────────────────────────
+    op.execute(
+        """
+        INSERT INTO user_prediction_stats
+            (user_id, total_predictions, tumor_detected, confidence_sum)
+        SELECT
+            user_id,
+            COUNT(id),
+            SUM(CASE WHEN prediction_label = 'Tumor' THEN 1 ELSE 0 END),
+            COALESCE(SUM(confidence_score), 0)
+        FROM predictions
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_prediction_stats")
@@ -0,0 +1,58 @@
+"""Add composite indexes for the listing queries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ── predictions: WHERE user_id = ? ORDER BY created_at DESC ──────
+    # The table itself is managed by create_all(), which only adds
+    # indexes when it creates the table — existing databases need this
+    op.create_index(
+        "ix_predictions_user_id_created_at",
+        "predictions",
+        ["user_id", "created_at"],
+        if_not_exists=True,
+    )
+
+    # ── conversations: WHERE user_id = ? ORDER BY updated_at DESC ────
+    op.create_index(
+        "ix_conversations_user_id_updated_at",
+        "conversations",
+        ["user_id", "updated_at"],
+        if_not_exists=True,
+    )
+    # Leading column of the composite index covers user_id lookups
+    op.drop_index("ix_conversations_user_id", table_name="conversations", if_exists=True)
+
+    # ── messages: WHERE conversation_id = ? ORDER BY created_at ──────
+    op.create_index(
+        "ix_messages_conversation_id_created_at",
+        "messages",
+        ["conversation_id", "created_at"],
+        if_not_exists=True,
+    )
+    op.drop_index("ix_messages_conversation_id", table_name="messages", if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index("ix_messages_conversation_id", "messages", ["conversation_id"])
+    op.drop_index("ix_messages_conversation_id_created_at", table_name="messages")
+
+    op.create_index("ix_conversations_user_id", "conversations", ["user_id"])
+    op.drop_index("ix_conversations_user_id_updated_at", table_name="conversations")
+
+    op.drop_index("ix_predictions_user_id_created_at", table_name="predictions")
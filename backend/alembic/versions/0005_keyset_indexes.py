@@ -0,0 +1,56 @@
+"""Add id to the listing indexes for keyset pagination
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pages are ordered by (timestamp DESC, id DESC); with id in the index
+    # both the keyset seek and the tie-break ordering come from the index
+
+    # ── predictions ──────────────────────────────────────────────────
+    op.create_index(
+        "ix_predictions_user_id_created_at_id",
+        "predictions",
+        ["user_id", "created_at", "id"],
+        if_not_exists=True,
+    )
+    op.drop_index(
+        "ix_predictions_user_id_created_at", table_name="predictions", if_exists=True
+    )
+
+    # ── conversations ────────────────────────────────────────────────
+    op.create_index(
+        "ix_conversations_user_id_updated_at_id",
+        "conversations",
+        ["user_id", "updated_at", "id"],
+        if_not_exists=True,
+    )
+    op.drop_index(
+        "ix_conversations_user_id_updated_at", table_name="conversations", if_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_conversations_user_id_updated_at", "conversations", ["user_id", "updated_at"]
+    )
+    op.drop_index("ix_conversations_user_id_updated_at_id", table_name="conversations")
+
+    op.create_index(
+        "ix_predictions_user_id_created_at", "predictions", ["user_id", "created_at"]
+    )
+    op.drop_index("ix_predictions_user_id_created_at_id", table_name="predictions")
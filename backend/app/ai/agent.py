@@ -1,17 +1,18 @@
 import os
 import re
 import json
-import time
+import asyncio
 import logging
-from typing import AsyncIterator, Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 
-from sqlalchemy.orm import Session
-from groq import Groq
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud import prediction as crud_prediction
 from app.crud import conversation as crud_conversation
+from app.database.database import AsyncSessionLocal
 from app.database.models import Message, MessageRole
 from app.ai.rag import rag_service
+from app.ai.llm_client import llm_client
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -21,6 +22,20 @@ MAX_RETRIES = 3
 RETRY_BASE_DELAY = 1.0  # seconds — doubles each attempt (1s, 2s, 4s)
 RETRYABLE_STATUS_CODES = {"429", "500", "502", "503", "504"}
 
+# ── LLM client configuration ─────────────────────────────────────────
+# Every call is bounded as a whole (connect + generation), not per read.
+# The client itself (connection pool, base URL) lives in app/ai/llm_client.py
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds per call
+FOLLOW_UP_TIMEOUT = float(os.getenv("FOLLOW_UP_TIMEOUT", "10"))  # seconds
+
+
+class LLMTimeoutError(Exception):
+    """An LLM call exceeded its time budget."""
+
+    def __init__(self, seconds: float):
+        # "timeout" in the message: the agent loop classifies errors by text
+        super().__init__(f"LLM request timeout after {seconds:g}s")
+
 # ── Context window configuration ─────────────────────────────────────
 # Llama 3.3 70B on Groq has a 128K context window, but we use a
 # conservative budget to leave room for the response + tool definitions.
@@ -31,38 +46,85 @@ SYSTEM_PROMPT_BUDGET = 2000  # reserved for system prompt
 TOOL_DEFS_BUDGET = 500  # approximate tokens for tool JSON definitions
 
 
+INLINE_CALL_PREFIX = "<function="
+
+
+class StreamedRound:
+    """One streamed completion, assembled from its deltas."""
+
+    def __init__(self):
+        self.content = ""
+        self.held = ""  # text not yet yielded
+        self.streamed = False  # has any text been yielded?
+        self.tool_calls: List[Dict[str, Any]] = []
+
+    def add_tool_call_delta(self, delta) -> None:
+        """Merge a tool_calls delta: id/name arrive once, arguments in pieces."""
+        while len(self.tool_calls) <= delta.index:
+            self.tool_calls.append(
+                {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+        call = self.tool_calls[delta.index]
+        if delta.id:
+            call["id"] = delta.id
+        if delta.function is not None:
+            if delta.function.name:
+                call["function"]["name"] += delta.function.name
+            if delta.function.arguments:
+                call["function"]["arguments"] += delta.function.arguments
+
+
 class ChatAgent:
     def __init__(
         self,
         user_id: int,
         conversation_id: str,
-        db: Session,
+        db: AsyncSession,
         api_key: Optional[str] = None,
     ):
-        """Initialize the chat agent with Groq and load history from DB."""
+        """Initialize the chat agent with Groq.
+
+        History is loaded separately (it needs an await) — use
+        ChatAgent.create(), which does both.
+        """
         self.user_id = user_id
         self.conversation_id = conversation_id
         self.db = db
 
-        # Initialize Groq client
-        self.client = Groq(api_key=api_key or os.getenv("GROQ_API_KEY"))
+        self.api_key = api_key
 
         self.conversation_history: List[Dict[str, Any]] = []
         self.max_tokens = 2048
         self.model = "llama-3.3-70b-versatile"
 
-        # Load existing conversation history from DB
-        self._load_history_from_db()
+    @property
+    def client(self):
+        """Process-wide async Groq client: agents come and go with each
+        message, its warm keep-alive connections stay."""
+        return llm_client.get(api_key=self.api_key)
+
+    @classmethod
+    async def create(
+        cls,
+        user_id: int,
+        conversation_id: str,
+        db: AsyncSession,
+        api_key: Optional[str] = None,
+    ) -> "ChatAgent":
+        """Create an agent and load the conversation history from DB."""
+        agent = cls(user_id, conversation_id, db, api_key=api_key)
+        await agent._load_history_from_db()
 
         logger.info(
-            f"ChatAgent initialized for user={self.user_id}, "
+            f"ChatAgent initialized for user={user_id}, "
             f"conversation={conversation_id}, "
-            f"loaded {len(self.conversation_history)} history messages"
+            f"loaded {len(agent.conversation_history)} history messages"
         )
+        return agent
 
-    def _load_history_from_db(self) -> None:
+    async def _load_history_from_db(self) -> None:
         """Load previous messages from the database into conversation_history."""
-        messages = crud_conversation.get_conversation_messages(
+        messages = await crud_conversation.get_conversation_messages_async(
             self.db,
             conversation_id=self.conversation_id,
             user_id=self.user_id,
@@ -238,18 +300,22 @@ Do not contradict this context without strong justification.
         }
 
     async def execute_tool(
-        self, tool_name: str, tool_input: Dict[str, Any]
+        self,
+        tool_name: str,
+        tool_input: Dict[str, Any],
+        db: Optional[AsyncSession] = None,
     ) -> Dict[str, Any]:
-        """Execute the requested tool"""
+        """Execute the requested tool (on db, defaulting to the agent's session)"""
         logger.info(f"Executing tool: {tool_name} with input: {tool_input}")
+        db = db or self.db
 
         try:
             if tool_name == "get_user_predictions":
                 limit = tool_input.get("limit", 10)
                 limit = min(limit, 50)
 
-                predictions = crud_prediction.get_user_predictions(
-                    self.db, user_id=self.user_id, limit=limit
+                predictions = await crud_prediction.get_user_predictions_async(
+                    db, user_id=self.user_id, limit=limit
                 )
 
                 formatted_predictions = [
@@ -270,7 +336,9 @@ Do not contradict this context without strong justification.
                 }
 
             elif tool_name == "get_user_statistics":
-                stats = crud_prediction.get_statistics(self.db, user_id=self.user_id)
+                stats = await crud_prediction.get_statistics_async(
+                    db, user_id=self.user_id
+                )
                 return {"success": True, "statistics": stats}
 
             elif tool_name == "explain_prediction":
@@ -281,7 +349,9 @@ Do not contradict this context without strong justification.
                         "error": "prediction_id is required",
                     }
 
-                pred = crud_prediction.get_prediction_by_id(self.db, prediction_id)
+                pred = await crud_prediction.get_prediction_by_id_async(
+                    db, prediction_id
+                )
 
                 # Authorization: ensure the prediction belongs to this user
                 if pred is None or pred.user_id != self.user_id:
@@ -317,6 +387,23 @@ Do not contradict this context without strong justification.
             logger.exception(f"Tool execution failed: {tool_name}")
             return {"success": False, "error": f"Tool execution failed: {str(e)}"}
 
+    async def _execute_tools_concurrently(
+        self, calls: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Execute one round's tool calls at once; results in call order.
+
+        Calls returned together don't depend on each other (a call that
+        needs another's result comes in a later round), so the round takes
+        as long as its slowest tool. Each call gets its own session: an
+        AsyncSession can't run two queries at the same time.
+        """
+
+        async def run(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+            async with AsyncSessionLocal() as db:
+                return await self.execute_tool(tool_name, tool_input, db=db)
+
+        return await asyncio.gather(*(run(name, args) for name, args in calls))
+
     @staticmethod
     def _build_clinical_context(pred) -> Dict[str, Any]:
         """Build clinical context dict for a prediction to help the LLM explain it.
@@ -494,10 +581,11 @@ Do not contradict this context without strong justification.
     #  SUGGESTED FOLLOW-UPS
     # ══════════════════════════════════════════════════════════════
 
-    def generate_follow_ups(self, assistant_response: str) -> List[str]:
+    async def generate_follow_ups(self, assistant_response: str) -> List[str]:
         """Generate 2-3 contextual follow-up questions based on the conversation.
 
-        Makes a lightweight, separate Groq call with a focused prompt.
+        Makes a lightweight, separate Groq call with a focused prompt,
+        bounded by FOLLOW_UP_TIMEOUT and never retried.
         Returns a list of short question strings, or empty list on failure.
         """
         last_user_msg = ""
@@ -510,7 +598,8 @@ Do not contradict this context without strong justification.
             return []
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
+                FOLLOW_UP_TIMEOUT,
                 model=self.model,
                 messages=[
                     {
@@ -561,8 +650,27 @@ Do not contradict this context without strong justification.
     #  GROQ API CALL WITH RETRY
     # ══════════════════════════════════════════════════════════════
 
-    def _call_groq_with_retry(self, use_tools: bool = True, rag_chunks: list = None):
-        """Make a Groq API call with exponential backoff retry. Uses token-aware context window management instead of a hard slice.rag_chunks — if provided, injected into the system prompt."""
+    async def _create_completion(self, timeout: float, **kwargs):
+        """One chat completion call, bounded by timeout seconds in total.
+
+        Cancelling the awaiting task (e.g. the SSE client went away) aborts
+        the underlying HTTP request.
+        """
+        try:
+            return await asyncio.wait_for(
+                self.client.chat.completions.create(**kwargs), timeout
+            )
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(timeout) from None
+
+    async def _call_groq_with_retry(
+        self, use_tools: bool = True, rag_chunks: list = None, stream: bool = False
+    ):
+        """Make a Groq API call with exponential backoff retry. Uses token-aware context window management instead of a hard slice.rag_chunks — if provided, injected into the system prompt.
+
+        With stream=True, returns the chunk stream once the call has been
+        accepted; only opening it is retried (read it with _stream_round).
+        """
         context_messages = self._build_context_messages()
 
         kwargs = {
@@ -579,13 +687,15 @@ Do not contradict this context without strong justification.
         }
         if use_tools:
             kwargs["tools"] = self.get_tools()
+        if stream:
+            kwargs["stream"] = True
 
         last_exception = None
 
         for attempt in range(1, MAX_RETRIES + 1):
             try:
-                response = self.client.chat.completions.create(**kwargs)
-                return response.choices[0].message
+                response = await self._create_completion(LLM_TIMEOUT, **kwargs)
+                return response if stream else response.choices[0].message
 
             except Exception as e:
                 last_exception = e
@@ -604,7 +714,7 @@ Do not contradict this context without strong justification.
                             f"Groq API error (attempt {attempt}/{MAX_RETRIES}): {e}. "
                             f"Retrying in {delay}s..."
                         )
-                        time.sleep(delay)
+                        await asyncio.sleep(delay)
                         continue
                     else:
                         logger.error(
@@ -617,14 +727,68 @@ Do not contradict this context without strong justification.
 
         raise last_exception
 
-    def _call_groq(self, use_tools: bool = True, rag_chunks: list = None):
-        return self._call_groq_with_retry(use_tools=use_tools, rag_chunks=rag_chunks)
+    async def _call_groq(self, use_tools: bool = True, rag_chunks: list = None):
+        return await self._call_groq_with_retry(use_tools=use_tools, rag_chunks=rag_chunks)
+
+    # ══════════════════════════════════════════════════════════════
+    #  STREAMED ROUNDS
+    # ══════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _may_be_inline_call(text: str) -> bool:
+        """Could this start of a reply still turn into "<function=...>"?"""
+        head = text.lstrip()
+        return INLINE_CALL_PREFIX.startswith(head) or head.startswith(INLINE_CALL_PREFIX)
+
+    async def _stream_round(self, stream, round_: StreamedRound) -> AsyncIterator[str]:
+        """Read one streamed completion into round_, yielding answer text
+        as soon as the round is known not to be a tool call.
+
+        Text is held back while the round has tool_calls deltas or its text
+        could still be an inline "<function=...>" call; anything held is
+        left for the caller (round_.held). Each chunk must arrive within
+        LLM_TIMEOUT.
+        """
+        chunks = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(LLM_TIMEOUT) from None
+
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+
+                for tool_call in delta.tool_calls or []:
+                    round_.add_tool_call_delta(tool_call)
+
+                if not delta.content:
+                    continue
+                round_.content += delta.content
+                if round_.streamed:
+                    yield delta.content
+                    continue
+
+                round_.held += delta.content
+                if round_.tool_calls or self._may_be_inline_call(round_.held):
+                    continue
+                round_.streamed = True
+                text, round_.held = round_.held, ""
+                yield text
+        finally:
+            # Releases the connection, also when the reply is cancelled
+            await stream.close()
 
     async def send_message(self, user_message: str):
         """Send message and get response.
 
         Handles the full agentic loop: LLM call → tool execution → LLM call with results.
-        Only yields the FINAL text response — never intermediate preambles.
+        Every round is streamed; only the FINAL text response is yielded,
+        token by token as it arrives — tool-call rounds never are.
         Tool-call messages are persisted to DB inside the loop.
 
         RAG: on the first iteration only, if the question is medical/educational,
@@ -658,6 +822,7 @@ Do not contradict this context without strong justification.
 
         max_iterations = 5
         iteration = 0
+        streamed = False
 
         while iteration < max_iterations:
             iteration += 1
@@ -666,72 +831,81 @@ Do not contradict this context without strong justification.
             try:
                 # Pass rag_chunks on every iteration so the enriched system
                 # prompt is consistent across tool-call rounds.
-                message = self._call_groq_with_retry(
-                    use_tools=True, rag_chunks=rag_chunks
+                stream = await self._call_groq_with_retry(
+                    use_tools=True, rag_chunks=rag_chunks, stream=True
                 )
+                # Answer text is yielded as it arrives; tool-call rounds are
+                # held back and handled below once the stream has ended.
+                round_ = StreamedRound()
+                async for text in self._stream_round(stream, round_):
+                    streamed = True
+                    yield text
 
                 # ── Path A: Structured tool calls ────────────────────
-                if message.tool_calls:
+                if round_.tool_calls:
                     logger.info("AI requested tool use (structured)")
 
-                    tool_calls_list = [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.function.name,
-                                "arguments": tc.function.arguments,
-                            },
-                        }
-                        for tc in message.tool_calls
-                    ]
+                    tool_calls_list = round_.tool_calls
 
                     self.conversation_history.append(
                         {
                             "role": "assistant",
-                            "content": message.content or "",
+                            "content": round_.content,
                             "tool_calls": tool_calls_list,
                         }
                     )
 
-                    crud_conversation.save_message(
+                    await crud_conversation.save_message_async(
                         self.db,
                         conversation_id=self.conversation_id,
                         role=MessageRole.assistant,
-                        content=message.content or "",
+                        content=round_.content,
                         tool_name="__tool_request__",
                         tool_input=tool_calls_list,
                     )
 
-                    for tool_call in message.tool_calls:
-                        tool_name = tool_call.function.name
-                        tool_input = json.loads(tool_call.function.arguments)
+                    calls = []
+                    for tool_call in tool_calls_list:
+                        tool_name = tool_call["function"]["name"]
+                        tool_input = json.loads(tool_call["function"]["arguments"] or "{}")
                         logger.info(f"Tool call: {tool_name}({tool_input})")
+                        calls.append((tool_name, tool_input))
 
-                        tool_result = await self.execute_tool(tool_name, tool_input)
+                    tool_results = await self._execute_tools_concurrently(calls)
 
+                    tool_messages = []
+                    for tool_call, (_, tool_input), tool_result in zip(
+                        tool_calls_list, calls, tool_results
+                    ):
                         self.conversation_history.append(
                             {
                                 "role": "tool",
-                                "tool_call_id": tool_call.id,
+                                "tool_call_id": tool_call["id"],
                                 "content": json.dumps(tool_result),
                             }
                         )
-
-                        crud_conversation.save_message(
-                            self.db,
-                            conversation_id=self.conversation_id,
-                            role=MessageRole.tool,
-                            content=json.dumps(tool_result),
-                            tool_name=tool_call.id,
-                            tool_input=tool_input,
-                            tool_result=tool_result,
+                        tool_messages.append(
+                            {
+                                "role": MessageRole.tool,
+                                "content": json.dumps(tool_result),
+                                "tool_name": tool_call["id"],
+                                "tool_input": tool_input,
+                                "tool_result": tool_result,
+                            }
                         )
 
+                    # All of the round's results in one transaction
+                    await crud_conversation.save_messages_async(
+                        self.db, self.conversation_id, tool_messages
+                    )
+
                     continue
 
                 # ── Path B: Inline tool call ─────────────────────────
-                text_response = message.content or ""
+                # Only calls at the start of the reply are held back; one
+                # after a streamed preamble still runs, but the preamble
+                # has already reached the client.
+                text_response = round_.content
 
                 inline_call = self._parse_inline_tool_call(text_response)
                 if inline_call:
@@ -769,7 +943,7 @@ Do not contradict this context without strong justification.
                         }
                     )
 
-                    crud_conversation.save_message(
+                    await crud_conversation.save_message_async(
                         self.db,
                         conversation_id=self.conversation_id,
                         role=MessageRole.assistant,
@@ -786,7 +960,7 @@ Do not contradict this context without strong justification.
                             }
                         ],
                     )
-                    crud_conversation.save_message(
+                    await crud_conversation.save_message_async(
                         self.db,
                         conversation_id=self.conversation_id,
                         role=MessageRole.tool,
@@ -805,13 +979,21 @@ Do not contradict this context without strong justification.
                     {"role": "assistant", "content": text_response}
                 )
 
-                yield text_response
+                # Whatever _stream_round held back (e.g. a reply that only
+                # looked like it might open with an inline call)
+                if round_.held:
+                    yield round_.held
                 break
 
             except Exception as e:
                 error_str = str(e)
                 logger.exception("Error in agent loop")
 
+                # Part of the answer is already on screen; an error code now
+                # would be appended to it, so just end the reply there
+                if streamed:
+                    break
+
                 if "rate_limit" in error_str.lower() or "429" in error_str:
                     wait_match = re.search(
                         r"try again in (\d+m[\d.]+s|\d+s)", error_str, re.IGNORECASE
@@ -823,7 +1005,7 @@ Do not contradict this context without strong justification.
                 if "tool_use_failed" in error_str or "400" in error_str:
                     logger.warning("Tool call failed, retrying without tools")
                     try:
-                        message = self._call_groq_with_retry(use_tools=False)
+                        message = await self._call_groq_with_retry(use_tools=False)
                         text_response = message.content or ""
                         self.conversation_history.append(
                             {"role": "assistant", "content": text_response}
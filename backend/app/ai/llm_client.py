@@ -0,0 +1,146 @@
+"""
+app/ai/llm_client.py — Process-wide LLM client with a keep-alive pool
+
+A ChatAgent is built per chat message. When each agent made its own
+AsyncGroq client, every turn opened a fresh connection pool and paid TCP +
+TLS setup to the provider before the first token. All agents now share one
+AsyncGroq over one httpx.AsyncClient, so turns reuse warm connections.
+
+HTTP/2 is used when the optional `h2` package is installed (pip install
+h2): requests are then multiplexed over a single connection instead of
+one connection per concurrent request.
+
+Connection reuse shows up in /metrics:
+    llm_http_requests             requests sent
+    llm_http_connections_opened   new TCP connections
+    llm_tls_handshakes            TLS handshakes
+requests - connections_opened = requests served on a reused connection.
+
+httpx connections belong to the event loop that opened them, so the client
+is created lazily on first use (get() must be called inside the loop) and
+re-created if it is ever asked for from another loop (e.g. a test's
+asyncio.run).
+
+Usage:
+    from app.ai.llm_client import llm_client
+
+    client = llm_client.get()                       # shared AsyncGroq
+    client = llm_client.get(api_key="gsk_...")     # same pool, other key
+    ...
+    await llm_client.aclose()                       # app shutdown
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+from groq import AsyncGroq, GroqError
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ── Client config ──────────────────────────────────────────────────────
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # None = the SDK default
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))  # idle connections kept
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))  # seconds idle
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """httpx transport that counts requests and new connections.
+
+    Connection setup is observed through httpcore's "trace" request
+    extension, which reports each TCP connect and TLS handshake.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = metrics.counter(
+            "llm_http_requests", description="HTTP requests sent to the LLM provider"
+        )
+        self.connects = metrics.counter(
+            "llm_http_connections_opened",
+            description="New TCP connections to the LLM provider",
+        )
+        self.tls_handshakes = metrics.counter(
+            "llm_tls_handshakes", description="TLS handshakes with the LLM provider"
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.inc()
+        request.extensions["trace"] = self._trace
+        return await super().handle_async_request(request)
+
+    async def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connects.inc()
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes.inc()
+
+
+class LLMClient:
+    """Lazily created AsyncGroq shared by every ChatAgent."""
+
+    def __init__(self):
+        self._client: Optional[AsyncGroq] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._copies: Dict[str, AsyncGroq] = {}  # per api_key, same pool
+
+    def get(self, api_key: Optional[str] = None) -> AsyncGroq:
+        """The shared client; with another api_key, a copy on the same
+        connections. Raises GroqError if no key is configured at all."""
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise GroqError("GROQ_API_KEY is not set")
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # A client from a finished loop can't be closed from this one;
+            # its connections are dropped with it
+            self._client = self._create()
+            self._loop = loop
+            self._copies = {}
+        if api_key == self._client.api_key:
+            return self._client
+        if api_key not in self._copies:
+            self._copies[api_key] = self._client.with_options(api_key=api_key)
+        return self._copies[api_key]
+
+    def _create(self) -> AsyncGroq:
+        http_client = httpx.AsyncClient(
+            transport=CountingTransport(
+                http2=LLM_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                ),
+            ),
+        )
+        logger.info(
+            f"LLM client created (http2={LLM_HTTP2}, "
+            f"max_connections={LLM_MAX_CONNECTIONS}, keepalive={LLM_MAX_KEEPALIVE})"
+        )
+        # Retries are the agent's (see ChatAgent._call_groq_with_retry)
+        return AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY", ""),  # "" = per-call keys only
+            base_url=GROQ_BASE_URL,
+            max_retries=0,
+            http_client=http_client,
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled connections; the next get() starts a new pool."""
+        client, self._client, self._loop = self._client, None, None
+        self._copies = {}
+        if client is not None:
+            await client.close()
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+llm_client = LLMClient()
@@ -10,6 +10,56 @@ class PredictionResponse(BaseModel):
     confidence: float
 
 
+# ── Batch (multi-slice study) Schemas ────────────────────────────────
+
+
+class SlicePrediction(BaseModel):
+    """Prediction for one slice of a study."""
+
+    filename: str
+    label: str
+    confidence: float
+    valid_scan: bool
+    message: Optional[str] = None
+    prediction_id: Optional[int] = None
+
+
+class StudyVerdict(BaseModel):
+    """Study-level verdict aggregated over all valid slices."""
+
+    label: str
+    confidence: float
+    total_slices: int
+    valid_slices: int
+    tumor_slices: int
+
+
+class BatchPredictionResponse(BaseModel):
+    study: StudyVerdict
+    slices: List[SlicePrediction]
+
+
+class JobSubmitResponse(BaseModel):
+    """Returned immediately when a study is submitted as a background job."""
+
+    job_id: str
+    status: str
+    total_slices: int
+
+
+class JobStatusResponse(BaseModel):
+    """Progress of a background job; result is set once it completes."""
+
+    job_id: str
+    status: str
+    total_slices: int
+    completed_slices: int
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[BatchPredictionResponse] = None
+    error: Optional[str] = None
+
+
 """
 pydantic data validation library
 
@@ -145,4 +195,5 @@ class ConversationListResponse(BaseModel):
     """Paginated list of conversations."""
 
     conversations: List[ConversationResponse]
-    total: int
+    total: int  # all of the user's conversations, not just this page
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page
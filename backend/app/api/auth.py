@@ -1,26 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from app.database.database import get_db
+from app.database.database import get_async_db
 from app.crud import user as crud_user
 from app.auth.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.api.Pydantic_Schema import UserCreate, UserResponse, Userlogin, Token
 from app.auth.dependencies import get_current_active_user
 from app.database.models import User
 from app.middleware.rate_limit import limiter
+from app.services.inference_pool import PoolSaturatedError
 
 router = APIRouter()
 
 
+def password_pool_saturated(e: PoolSaturatedError) -> HTTPException:
+    """503 + Retry-After when too many hashes are already queued."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 """Register a new user."""
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("5/hour")
-def register_user(request: Request, user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(request: Request, user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
 
     
     # Check if email already exists
-    db_user = crud_user.get_user_by_email(db, user_data.email)
+    db_user = await crud_user.get_user_by_email_async(db, user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,7 +38,7 @@ def register_user(request: Request, user_data: UserCreate, db: Session = Depends
         )
 
     # Check if username already exists
-    db_user = crud_user.get_user_by_username(db, username=user_data.username)
+    db_user = await crud_user.get_user_by_username_async(db, username=user_data.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -43,26 +53,32 @@ def register_user(request: Request, user_data: UserCreate, db: Session = Depends
         )
 
     # Create the user
-    new_user = crud_user.create_user(
-        db=db,
-        email=user_data.email,
-        username=user_data.username,
-        password=user_data.password
-    )
+    try:
+        new_user = await crud_user.create_user_async(
+            db=db,
+            email=user_data.email,
+            username=user_data.username,
+            password=user_data.password
+        )
+    except PoolSaturatedError as e:
+        raise password_pool_saturated(e) from e
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
 @limiter.limit("10/minute")
-def login_user(request: Request, user_data: Userlogin, db: Session = Depends(get_db)):
+async def login_user(request: Request, user_data: Userlogin, db: AsyncSession = Depends(get_async_db)):
     """Login and get access token."""
     
-    user = crud_user.authenticate_user(
-        db=db,
-        email=user_data.email,
-        password=user_data.password
-    )
+    try:
+        user = await crud_user.authenticate_user_async(
+            db=db,
+            email=user_data.email,
+            password=user_data.password
+        )
+    except PoolSaturatedError as e:
+        raise password_pool_saturated(e) from e
 
     if user is None:
         raise HTTPException(
@@ -73,7 +89,7 @@ def login_user(request: Request, user_data: Userlogin, db: Session = Depends(get
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email},
+        data={"sub": user.email, "uid": user.id, "active": user.is_active},
         expires_delta=access_token_expires
     )
 
@@ -1,15 +1,21 @@
+import asyncio
 import json
+import time
+
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
+from typing import Optional
 
 # Import our modules
-from app.database.database import get_db
+from app.database.database import get_async_db, AsyncSessionLocal
 from app.auth.dependencies import get_current_active_user
 from app.database.models import User, MessageRole
 from app.middleware.rate_limit import limiter
 from app.crud import conversation as crud_conversation
+from app.utils.metrics import metrics
+from app.utils.pagination import InvalidCursor, Page, decode_cursor
 from app.api.Pydantic_Schema import (
     ChatMessageRequest,
     ConversationResponse,
@@ -25,6 +31,20 @@ from app.ai.agent import ChatAgent
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# ── Metrics ──────────────────────────────────────────────────────────
+# Both measured from the moment the request reaches the handler
+CHAT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+ttfb_histogram = metrics.histogram(
+    "chat_ttfb_seconds",
+    buckets=CHAT_LATENCY_BUCKETS,
+    description="Time until the first token of the answer was sent",
+)
+response_histogram = metrics.histogram(
+    "chat_response_seconds",
+    buckets=CHAT_LATENCY_BUCKETS,
+    description="Time until the whole answer was sent",
+)
+
 
 # ── Send Message (updated with DB persistence) ──────────────────────
 
@@ -35,7 +55,7 @@ async def send_message(
     request: Request,
     chat_request: ChatMessageRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Send a message to the AI agent with full conversation persistence.
 
@@ -46,11 +66,12 @@ async def send_message(
     - Streams SSE with JSON-encoded events to handle newlines in text.
     - Sends suggested follow-up questions after the main response.
     """
+    started = time.perf_counter()
     try:
         # ── Resolve conversation ─────────────────────────────────────
         if chat_request.conversation_id:
             # Load existing conversation (also verifies ownership)
-            conversation = crud_conversation.get_conversation(
+            conversation = await crud_conversation.get_conversation_async(
                 db,
                 conversation_id=chat_request.conversation_id,
                 user_id=current_user.id,
@@ -62,7 +83,7 @@ async def send_message(
                 )
         else:
             # Create new conversation
-            conversation = crud_conversation.create_conversation(
+            conversation = await crud_conversation.create_conversation_async(
                 db,
                 user_id=current_user.id,
                 first_message=chat_request.message,
@@ -75,36 +96,57 @@ async def send_message(
         )
 
         # ── Save user message BEFORE calling LLM ────────────────────
-        crud_conversation.save_message(
+        await crud_conversation.save_message_async(
             db,
             conversation_id=conversation_id,
             role=MessageRole.user,
             content=chat_request.message,
         )
 
-        # ── Create AI agent (loads history from DB) ──────────────────
-        agent = ChatAgent(
-            user_id=current_user.id,
-            conversation_id=conversation_id,
-            db=db,
-        )
+        user_id = current_user.id
 
         async def response_generator():
+            # The request's session (get_async_db) is closed before the body
+            # streams, so the agent and the final save get their own session
+            # that lives exactly as long as the stream
+            async with AsyncSessionLocal() as stream_db:
+                async for event in stream_reply(stream_db):
+                    yield event
+
+        async def stream_reply(stream_db: AsyncSession):
             full_response = ""
+            ttfb = None
             try:
                 # Send conversation_id as first SSE event
                 yield f"data: {json.dumps({'conversation_id': conversation_id})}\n\n"
 
+                # ── Create AI agent (loads history from DB) ──────────
+                agent = await ChatAgent.create(
+                    user_id=user_id,
+                    conversation_id=conversation_id,
+                    db=stream_db,
+                )
+
                 async for chunk in agent.send_message(chat_request.message):
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+                        ttfb_histogram.observe(ttfb)
                     full_response += chunk
                     # JSON-encode the chunk so newlines in the text become \n literals
                     # This prevents SSE from splitting on \n\n inside the response text
                     yield f"data: {json.dumps({'text': chunk})}\n\n"
 
+                total = time.perf_counter() - started
+                response_histogram.observe(total)
+                logger.info(
+                    f"Reply in conversation {conversation_id}: "
+                    f"first token {ttfb or 0:.2f}s, complete {total:.2f}s"
+                )
+
                 # Save assistant response AFTER streaming completes
                 if full_response:
-                    crud_conversation.save_message(
-                        db,
+                    await crud_conversation.save_message_async(
+                        stream_db,
                         conversation_id=conversation_id,
                         role=MessageRole.assistant,
                         content=full_response,
@@ -114,7 +156,7 @@ async def send_message(
                 # Only generate if we got a real response (not an error code)
                 if full_response and not full_response.startswith("__ERROR_"):
                     try:
-                        suggestions = agent.generate_follow_ups(full_response)
+                        suggestions = await agent.generate_follow_ups(full_response)
                         if suggestions:
                             yield f"data: {json.dumps({'suggestions': suggestions})}\n\n"
                     except Exception as e:
@@ -123,6 +165,12 @@ async def send_message(
 
                 yield "data: [DONE]\n\n"
 
+            except asyncio.CancelledError:
+                # The SSE client disconnected: Starlette cancels the stream,
+                # which aborts the in-flight LLM request / retry backoff
+                logger.info(f"Client disconnected, reply cancelled ({conversation_id})")
+                raise
+
             except Exception as e:
                 logger.exception("Error in response generator")
                 yield f"data: {json.dumps({'error': str(e)})}\n\n"
@@ -156,12 +204,30 @@ async def list_conversations(
     request: Request,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """List all conversations for the authenticated user, newest first."""
-    conversations = crud_conversation.list_user_conversations(
-        db, user_id=current_user.id, skip=skip, limit=limit
+    """List conversations for the authenticated user, most recently active first.
+
+    Page with the returned next_cursor; skip still works for existing clients.
+    """
+    if cursor is not None and skip:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either skip or cursor",
+        )
+    try:
+        key = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # One extra row tells us whether there is a next page
+    rows = await crud_conversation.list_user_conversations_async(
+        db, user_id=current_user.id, skip=skip, limit=limit + 1, cursor=key
+    )
+    conversations, next_cursor = Page.from_rows(
+        rows, limit, lambda row: (row[0].updated_at, row[0].id)
     )
 
     conversation_list = [
@@ -170,14 +236,15 @@ async def list_conversations(
             title=conv.title,
             created_at=conv.created_at,
             updated_at=conv.updated_at,
-            message_count=len(conv.messages),
+            message_count=message_count,
         )
-        for conv in conversations
+        for conv, message_count in conversations
     ]
 
     return ConversationListResponse(
         conversations=conversation_list,
-        total=len(conversation_list),
+        total=await crud_conversation.count_user_conversations_async(db, user_id=current_user.id),
+        next_cursor=next_cursor,
     )
 
 
@@ -193,10 +260,10 @@ async def get_conversation(
     request: Request,
     conversation_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get a single conversation with all its messages."""
-    conversation = crud_conversation.get_conversation(
+    conversation = await crud_conversation.get_conversation_async(
         db, conversation_id=conversation_id, user_id=current_user.id
     )
     if conversation is None:
@@ -205,7 +272,7 @@ async def get_conversation(
             detail="Conversation not found",
         )
 
-    messages = crud_conversation.get_conversation_messages(
+    messages = await crud_conversation.get_conversation_messages_async(
         db, conversation_id=conversation_id, user_id=current_user.id
     )
 
@@ -227,10 +294,10 @@ async def delete_conversation(
     request: Request,
     conversation_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Delete a conversation and all its messages."""
-    deleted = crud_conversation.delete_conversation(
+    deleted = await crud_conversation.delete_conversation_async(
         db, conversation_id=conversation_id, user_id=current_user.id
     )
     if not deleted:
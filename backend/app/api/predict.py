@@ -1,30 +1,101 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, Request
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from contextlib import contextmanager
 from uuid import uuid4
+import asyncio
+import json
 import os
-import shutil
 import logging
 import time
-
-
-from app.utils.file_validator import validate_image_file, sanitize_filename
-from app.api.Pydantic_Schema import PredictionResponse
-from app.services.predictor import Predictor
-from app.database.database import get_db
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Tuple
+
+
+from app.utils.file_validator import (
+    ScanSlice,
+    validate_scan_file,
+    decode_scan,
+    read_batch_uploads,
+    sanitize_filename,
+)
+from app.utils.image_decoder import DecodedImage
+from app.utils.pagination import InvalidCursor, Page, decode_cursor
+from app.api.Pydantic_Schema import (
+    PredictionResponse,
+    BatchPredictionResponse,
+    SlicePrediction,
+    StudyVerdict,
+    JobSubmitResponse,
+    JobStatusResponse,
+)
+from app.services.model_service import (
+    model_service,
+    ModelNotReadyError,
+    ModelState,
+    MODEL_VERSION,
+)
+from app.services.inference_pool import inference_pool, PoolSaturatedError
+from app.services.prediction_cache import prediction_cache
+from app.services.prediction_jobs import job_runner
+from app.database.database import get_async_db, AsyncSessionLocal
 from app.crud import prediction as crud_prediction
+from app.crud import prediction_job as crud_job
 from app.auth.dependencies import get_current_active_user
-from app.database.models import User
+from app.database.models import User, PredictionJob, JobStatus
 from app.middleware.rate_limit import limiter
 
+if TYPE_CHECKING:
+    from app.services.predictor import Predictor
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-MODEL_PATH = os.getenv("MODEL_PATH", "model/tumor_model.keras")
-UPLOAD_DIR = os.path.join("backend", "uploads")
+# Background jobs: slices per progress update, SSE poll interval (seconds)
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "16"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+
+def model_not_ready(e: ModelNotReadyError) -> HTTPException:
+    logger.warning("Prediction rejected: model %s", e.state.value)
+    detail = (
+        "The model failed to load. Please contact support."
+        if e.state == ModelState.failed
+        else "The model is still loading. Please retry shortly."
+    )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@contextmanager
+def prediction_errors() -> Iterator[None]:
+    """Map prediction failures to HTTP errors, the same way for every
+    predict endpoint: model not ready / pool saturated → 503 with
+    Retry-After, anything unexpected → 500."""
+    try:
+        yield
+
+    except HTTPException:
+        raise
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-predictor = Predictor(MODEL_PATH)
+    except ModelNotReadyError as e:
+        raise model_not_ready(e) from e
+
+    except PoolSaturatedError as e:
+        logger.warning("Inference pool saturated (%d pending)", inference_pool.pending)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy processing other scans. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+
+    except Exception as e:
+        logger.exception("Unexpected server error")
+        raise HTTPException(500, "Internal server error.") from e
 
 
 @router.post("/predict", response_model=PredictionResponse)
@@ -32,33 +103,43 @@ predictor = Predictor(MODEL_PATH)
 async def predict_image(
     request: Request,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
 ):
-    """Upload an image and get tumor prediction."""
+    """Upload an image (or a DICOM file / NIfTI volume) and get tumor
+    prediction. A multi-slice volume is predicted as a study and the
+    study verdict is returned."""
 
-    # Validate uploaded file
-    file_bytes = await validate_image_file(file)
+    # Validate uploaded file (decoded once, reused for preprocessing)
+    scan = await validate_scan_file(file)
 
     # Sanitize filename
     safe_filename = sanitize_filename(file.filename)
-    unique_filename = f"{uuid4().hex}_{safe_filename}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
 
     start_time = time.time()
 
-    try:
-        # Get file size
-        file_size = len(file_bytes)
-        # logger.info(file_size)
-        # Save file temporarily
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_bytes)
-
-        logger.info("Saved file: %s", file_path)
-
-        # Run prediction
-        result = predictor.predict_img(file_path)
+    if len(scan) > 1:
+        return await predict_volume(db, current_user.id, scan, start_time)
+
+    decoded, error, file_size = scan[0].decoded, scan[0].error, scan[0].file_size
+    if error is not None:
+        raise error
+
+    with prediction_errors():
+        # Same bytes already predicted by this model version? Skip inference
+        # (decoded.data is the raw upload, a DICOM file included)
+        content_hash = prediction_cache.hash_bytes(decoded.data)
+        result = prediction_cache.get(MODEL_VERSION, content_hash)
+
+        if result is not None:
+            logger.info("Prediction cache hit (bytes) for %s", safe_filename)
+        else:
+            # Preprocess on the bounded worker pool, then await the batched
+            # forward pass without holding a worker
+            predictor = model_service.get_predictor()
+            [result] = await run_predictions(
+                predictor, [decoded], [safe_filename], [content_hash]
+            )
         processing_time = time.time() - start_time
 
         logger.info(
@@ -68,7 +149,7 @@ async def predict_image(
         )
 
         # Save prediction to database
-        db_prediction = crud_prediction.create_prediction(
+        db_prediction = await crud_prediction.create_prediction_async(
             db=db,
             user_id=current_user.id,
             filename=safe_filename,
@@ -76,23 +157,416 @@ async def predict_image(
             prediction_label=result["label"],
             confidence_score=result["confidence"],
             processing_time=processing_time,
+            model_version=MODEL_VERSION,
         )
         logger.info(f"Saved prediction to db with id: {db_prediction.id}")
 
         return PredictionResponse(**result)
 
-    except Exception as e:
-        logger.exception("Unexpected server error")
-        raise HTTPException(500, "Internal server error.") from e
 
-    finally:
-        # Cleanup temp file
-        if os.path.exists(file_path):
+async def predict_volume(
+    db: AsyncSession, user_id: int, scan: List[ScanSlice], start_time: float
+) -> PredictionResponse:
+    """Single-upload path for a DICOM multi-frame / NIfTI volume."""
+    with prediction_errors():
+        results = await predict_slices([_slice_input(s) for s in scan])
+        processing_time = time.time() - start_time
+        study = (await save_study(db, user_id, results, processing_time)).study
+        return PredictionResponse(label=study.label, confidence=study.confidence)
+
+
+# ── Batch prediction (multi-slice studies) ───────────────────────────
+
+
+class SliceInput(NamedTuple):
+    """One validated (or rejected) slice, ready for prediction."""
+    filename: str
+    file_size: int
+    decoded: Optional[DecodedImage]
+    content_hash: Optional[str]
+    error: Optional[str]
+
+
+def _slice_input(scan_slice: ScanSlice) -> SliceInput:
+    decoded = scan_slice.decoded
+    if decoded is None:
+        return SliceInput(
+            sanitize_filename(scan_slice.name),
+            scan_slice.file_size,
+            None,
+            None,
+            str(scan_slice.error.detail),
+        )
+    return SliceInput(
+        sanitize_filename(scan_slice.name),
+        scan_slice.file_size,
+        decoded,
+        prediction_cache.hash_bytes(decoded.data),
+        None,
+    )
+
+
+def _decode_upload(item: Tuple[str, bytes]) -> List[SliceInput]:
+    """Validate, decode and hash one uploaded file on a pool thread.
+
+    Images give one slice, DICOM / NIfTI volumes give several. A file that
+    fails validation becomes one rejected slice, so it is reported instead
+    of failing the whole study.
+    """
+    name, data = item
+    try:
+        scan = decode_scan(data, name)
+    except HTTPException as e:
+        return [SliceInput(sanitize_filename(name), len(data), None, None, str(e.detail))]
+
+    return [_slice_input(s) for s in scan]
+
+
+async def run_study(slices: List[Tuple[str, bytes]]) -> List[dict]:
+    """Validate, preprocess and predict every slice of a study.
+
+    Files are decoded in parallel on the inference pool (volumes expand
+    into several slices), then predicted by predict_slices.
+    """
+    decoded = await inference_pool.map(_decode_upload, slices)
+    return await predict_slices([s for group in decoded for s in group])
+
+
+async def predict_slices(inputs: List[SliceInput]) -> List[dict]:
+    """Predict decoded slices as one study.
+
+    All valid, uncached slices go to the predictor together so they run as
+    batched forward passes. Each result dict carries filename and
+    file_size, and "validated" marks slices that passed validation (those
+    get DB rows).
+
+    Raises ModelNotReadyError only if some slice actually needs the model.
+    """
+    results: List[Optional[dict]] = [None] * len(inputs)
+    to_predict = []  # (index, decoded, filename, content_hash)
+
+    for i, (filename, file_size, decoded, content_hash, error) in enumerate(inputs):
+        base = {"filename": filename, "file_size": file_size}
+
+        if error is not None:
+            results[i] = {
+                **base,
+                "label": "Invalid Input",
+                "confidence": 0.0,
+                "message": error,
+                "valid_scan": False,
+                "validated": False,
+            }
+            continue
+
+        cached = prediction_cache.get(MODEL_VERSION, content_hash)
+        if cached is not None:
+            results[i] = {**base, **cached, "validated": True}
+        else:
+            to_predict.append((i, decoded, filename, content_hash))
+
+    if to_predict:
+        predictor = model_service.get_predictor()
+        predicted = await run_predictions(
+            predictor,
+            [decoded for _, decoded, _, _ in to_predict],
+            [filename for _, _, filename, _ in to_predict],
+            [content_hash for _, _, _, content_hash in to_predict],
+        )
+        for (i, _, filename, _), result in zip(to_predict, predicted):
+            results[i] = {
+                "filename": filename,
+                "file_size": inputs[i].file_size,
+                **result,
+                "validated": True,
+            }
+
+    return results
+
+
+async def run_predictions(
+    predictor: "Predictor",
+    images: List[DecodedImage],
+    names: List[str],
+    content_hashes: List[Optional[str]],
+) -> List[dict]:
+    """Preprocess on the inference pool, then await the batcher's futures.
+
+    A worker is held only while preprocessing. Waiting for the batched
+    forward pass happens on the event loop, so the number of requests
+    that can share one batch is not capped by INFERENCE_WORKERS.
+    """
+    batch = await inference_pool.run(predictor.submit_batch, images, names, content_hashes)
+    outputs = await asyncio.gather(
+        *(asyncio.wrap_future(future) for _, _, future in batch.pending),
+        return_exceptions=True,
+    )
+    return predictor.collect(batch, outputs)
+
+
+def summarize_study(results: List[dict]) -> dict:
+    """Aggregate per-slice results into one study-level verdict.
+
+    Only valid slices count. Any tumor slice makes the study "Tumor" with
+    the strongest tumor confidence. Otherwise the study is "No Tumor" with
+    the weakest no-tumor confidence (the conservative choice). With no
+    valid slices the study is "Inconclusive".
+    """
+    valid = [r for r in results if r.get("valid_scan")]
+    tumor = [r for r in valid if r["label"] == "Tumor"]
+
+    if not valid:
+        label, confidence = "Inconclusive", 0.0
+    elif tumor:
+        label, confidence = "Tumor", max(r["confidence"] for r in tumor)
+    else:
+        label, confidence = "No Tumor", min(r["confidence"] for r in valid)
+
+    return {
+        "label": label,
+        "confidence": round(confidence, 4),
+        "total_slices": len(results),
+        "valid_slices": len(valid),
+        "tumor_slices": len(tumor),
+    }
+
+
+async def save_study(
+    db: AsyncSession,
+    user_id: int,
+    results: List[dict],
+    processing_time: float,
+    commit: bool = True,
+) -> BatchPredictionResponse:
+    """Persist a study's validated slices in one transaction and build the
+    response (per-slice results + study verdict). commit=False leaves the
+    transaction open for the caller."""
+    persisted = [r for r in results if r["validated"]]
+    prediction_ids = []
+    if persisted:
+        prediction_ids = await crud_prediction.create_predictions_async(
+            db=db,
+            user_id=user_id,
+            predictions=[
+                {
+                    "filename": r["filename"],
+                    "file_size": r["file_size"],
+                    "prediction_label": r["label"],
+                    "confidence_score": r["confidence"],
+                    # Per-slice share of the batch wall time
+                    "processing_time": processing_time / len(persisted),
+                }
+                for r in persisted
+            ],
+            model_version=MODEL_VERSION,
+            commit=commit,
+        )
+
+    for r, prediction_id in zip(persisted, prediction_ids):
+        r["prediction_id"] = prediction_id
+
+    study = summarize_study(results)
+    logger.info(
+        "Study prediction => label=%s slices=%d valid=%d tumor=%d",
+        study["label"],
+        study["total_slices"],
+        study["valid_slices"],
+        study["tumor_slices"],
+    )
+
+    return BatchPredictionResponse(
+        study=StudyVerdict(**study),
+        slices=[
+            SlicePrediction(
+                filename=r["filename"],
+                label=r["label"],
+                confidence=r["confidence"],
+                valid_scan=r["valid_scan"],
+                message=r.get("message"),
+                prediction_id=r.get("prediction_id"),
+            )
+            for r in results
+        ],
+    )
+
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+@limiter.limit("5/minute")
+async def predict_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Upload the slices of an MRI study (images and/or .zip archives) and
+    get per-slice predictions plus a study-level verdict."""
+
+    slices = await read_batch_uploads(files)
+    start_time = time.time()
+
+    with prediction_errors():
+        results = await run_study(slices)
+        processing_time = time.time() - start_time
+
+        # One bulk transaction for every slice that passed validation
+        return await save_study(db, current_user.id, results, processing_time)
+
+
+# ── Asynchronous prediction jobs ─────────────────────────────────────
+
+
+async def process_prediction_job(job: PredictionJob) -> dict:
+    """Job handler registered with job_runner in main.py.
+
+    Runs the stored slices in chunks so progress can be reported, waits
+    out a saturated pool (and a model still loading) instead of failing,
+    then saves the study exactly like the synchronous batch endpoint.
+
+    The predictions and the job's completion are committed together: a
+    crash in between would otherwise leave the study saved for a job that
+    resume-on-start runs again, duplicating its Prediction rows.
+    """
+    # Jobs resumed at startup usually arrive before the model is ready
+    await model_service.wait_until_loaded()
+
+    slices = await run_in_threadpool(job_runner.load_inputs, job.storage_path)
+    start_time = time.time()
+    results: List[dict] = []
+
+    for start in range(0, len(slices), JOB_CHUNK_SIZE):
+        chunk = slices[start : start + JOB_CHUNK_SIZE]
+        while True:
             try:
-                os.remove(file_path)
-                logger.info("Deleted temp file: %s", file_path)
-            except Exception:
-                logger.exception("Failed to delete temp file")
+                results.extend(await run_study(chunk))
+                break
+            except PoolSaturatedError as e:
+                await asyncio.sleep(e.retry_after)
+
+        # Progress counts uploaded files (volumes expand into more results)
+        await job_runner.report_progress(job.id, start + len(chunk))
+
+    processing_time = time.time() - start_time
+    async with AsyncSessionLocal() as db:
+        response = await save_study(db, job.user_id, results, processing_time, commit=False)
+        result = response.model_dump()
+        await crud_job.complete_job_async(db, job.id, result)
+    return result
+
+
+def job_status(job: PredictionJob) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=job.id,
+        status=job.status.value if isinstance(job.status, JobStatus) else job.status,
+        total_slices=job.total_slices,
+        completed_slices=job.completed_slices,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        result=json.loads(job.result) if job.result else None,
+        error=job.error,
+    )
+
+
+@router.post(
+    "/predict/jobs",
+    response_model=JobSubmitResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+@limiter.limit("5/minute")
+async def submit_prediction_job(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Submit a study (images and/or .zip archives) for background
+    prediction. Returns a job id to poll or subscribe to."""
+
+    slices = await read_batch_uploads(files)
+
+    job_id = str(uuid4())
+    storage_path = await run_in_threadpool(job_runner.store_inputs, job_id, slices)
+
+    job = await crud_job.create_job_async(
+        db,
+        user_id=current_user.id,
+        total_slices=len(slices),
+        storage_path=storage_path,
+        job_id=job_id,
+    )
+    await job_runner.enqueue(job.id)
+
+    logger.info(f"Queued prediction job {job.id} ({len(slices)} slices)")
+    return JobSubmitResponse(
+        job_id=job.id, status=JobStatus.queued.value, total_slices=len(slices)
+    )
+
+
+@router.get("/predict/jobs/{job_id}", response_model=JobStatusResponse)
+@limiter.limit("120/minute")
+async def get_prediction_job(
+    request: Request,
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Poll a prediction job for progress and, once finished, its result."""
+    job = await crud_job.get_job_async(db, job_id=job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+@router.get("/predict/jobs/{job_id}/events")
+async def stream_prediction_job(
+    request: Request,
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Subscribe to a prediction job over SSE.
+
+    Emits the job status (same shape as the polling endpoint) whenever the
+    status or progress changes, then [DONE] once the job has finished.
+    """
+    if await crud_job.get_job_async(db, job_id=job_id, user_id=current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    user_id = current_user.id
+
+    async def event_generator():
+        last_seen = None
+        try:
+            while not await request.is_disconnected():
+                job = await job_runner.fetch(job_id, user_id)
+                if job is None:
+                    yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
+                    break
+
+                seen = (job.status, job.completed_slices)
+                if seen != last_seen:
+                    last_seen = seen
+                    payload = job_status(job).model_dump(mode="json")
+                    yield f"data: {json.dumps(payload)}\n\n"
+
+                if job.status in (JobStatus.completed, JobStatus.failed):
+                    yield "data: [DONE]\n\n"
+                    break
+
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        except Exception as e:
+            logger.exception("Error in job event stream")
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 @router.get("/predictions")
@@ -101,10 +575,16 @@ async def get_predictions(
     request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
 ):
-    """Get prediction history for current user."""
+    """Get prediction history for current user, newest first.
+
+    Page with the returned next_cursor (constant cost at any depth);
+    skip still works for existing clients. total is the user's total
+    prediction count, read from the statistics rollup.
+    """
 
     if skip < 0:
         raise HTTPException(status_code=400, detail="Skip must be >= 0")
@@ -112,21 +592,32 @@ async def get_predictions(
     if limit < 1 or limit > 100:
         raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
 
-    predictions = crud_prediction.get_user_predictions(
-        db, user_id=current_user.id, skip=skip, limit=limit
+    if cursor is not None and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor")
+
+    try:
+        key = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One extra row tells us whether there is a next page
+    rows = await crud_prediction.get_user_predictions_async(
+        db, user_id=current_user.id, skip=skip, limit=limit + 1, cursor=key
     )
-    return {"predictions": predictions, "total": len(predictions)}
+    page = Page.from_rows(rows, limit, lambda p: (p.created_at, p.id))
+    total = await crud_prediction.count_user_predictions_async(db, user_id=current_user.id)
+    return {"predictions": page.items, "total": total, "next_cursor": page.next_cursor}
 
 
 @router.get("/predictions/{prediction_id}")
 async def get_prediction(
     prediction_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """Get a specific prediction by ID."""
 
-    prediction = crud_prediction.get_prediction_by_id(db, prediction_id)
+    prediction = await crud_prediction.get_prediction_by_id_async(db, prediction_id)
 
     if not prediction:
         raise HTTPException(status_code=404, detail="Prediction not found")
@@ -143,9 +634,9 @@ async def get_prediction(
 @limiter.limit("20/minute")
 async def get_statistics(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """Get prediction statistics for current user."""
-    stats = crud_prediction.get_statistics(db, user_id=current_user.id)
+    stats = await crud_prediction.get_statistics_async(db, user_id=current_user.id)
     return stats
@@ -1,8 +1,9 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
 from app.auth.security import decode_access_token
+from app.auth.principal_cache import principal_cache
 from app.crud import user as crud_user
 from app.database.models import User
 
@@ -10,9 +11,9 @@ security = HTTPBearer()
 
 
 """Get the current user from JWT token."""
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     
     credentials_exception = HTTPException(
@@ -31,10 +32,27 @@ def get_current_user(
     if email is None:
         raise credentials_exception
 
-    user = crud_user.get_user_by_email(db, email=email)
+    # Tokens carry the active flag: a deactivated account's token is
+    # refused without touching the cache or the database
+    if payload.get("active") is False:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
 
+    # Most requests are served from the principal cache; on a miss, the
+    # uid claim allows a primary-key lookup (older tokens only have sub)
+    user = principal_cache.get(email)
     if user is None:
-        raise credentials_exception
+        user_id = payload.get("uid")
+        if user_id is not None:
+            user = await crud_user.get_user_by_id_async(db, user_id=user_id)
+        else:
+            user = await crud_user.get_user_by_email_async(db, email=email)
+
+        if user is None or user.email != email:
+            raise credentials_exception
+        principal_cache.put(email, user)
 
     if not user.is_active:
         raise HTTPException(
@@ -46,10 +64,20 @@ def get_current_user(
 
 
 """Get current active user."""
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+"""Get current active user with admin rights (operational endpoints)."""
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
@@ -0,0 +1,106 @@
+"""
+app/auth/principal_cache.py — Short-lived cache of authenticated users
+
+Every authenticated request used to decode the JWT and then load the user
+row, so each chat message and each history page paid a database round
+trip just for auth. Users are cached here under the token subject
+(email) for a few seconds instead.
+
+Staleness is bounded two ways:
+    - explicit invalidation: crud/user.py drops the entry whenever it
+      changes a user (e.g. deactivation), so this process sees it at once
+    - TTL: other worker processes have their own caches, which see the
+      change at most AUTH_CACHE_TTL seconds later
+
+Cached users are detached ORM objects (column attributes only) shared by
+concurrent requests — treat them as read-only.
+
+Usage:
+    from app.auth.principal_cache import principal_cache
+
+    user = principal_cache.get(email)
+    if user is None:
+        user = await crud_user.get_user_by_id_async(db, user_id)
+        principal_cache.put(email, user)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.database.models import User
+from app.utils.metrics import metrics
+
+# ── Cache config ───────────────────────────────────────────────────────
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))  # entries
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))  # seconds
+
+
+class PrincipalCache:
+    """Bounded LRU + TTL map of token subject → User."""
+
+    def __init__(
+        self,
+        max_entries: int = AUTH_CACHE_SIZE,
+        ttl_seconds: float = AUTH_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = metrics.counter("auth_cache_hits")
+        self._misses = metrics.counter("auth_cache_misses")
+        self._evictions = metrics.counter("auth_cache_evictions")
+        self._invalidations = metrics.counter("auth_cache_invalidations")
+
+    def get(self, subject: str) -> Optional[User]:
+        """Return the cached user, or None on a miss/expiry."""
+        if self.max_entries <= 0:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is not None:
+                expires_at, user = entry
+                if expires_at > now:
+                    self._entries.move_to_end(subject)
+                    self._hits.inc()
+                    return user
+                del self._entries[subject]
+
+        self._misses.inc()
+        return None
+
+    def put(self, subject: str, user: User) -> None:
+        """Cache a user, evicting the least recently used entry if full."""
+        if self.max_entries <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[subject] = (expires_at, user)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions.inc()
+
+    def invalidate(self, subject: str) -> None:
+        """Forget a user; the next request reloads it from the database."""
+        with self._lock:
+            if self._entries.pop(subject, None) is not None:
+                self._invalidations.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+principal_cache = PrincipalCache()
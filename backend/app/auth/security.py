@@ -1,11 +1,24 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
 
-# Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated='auto')
+from app.services.inference_pool import InferencePool
+
+# Password hashing setup. Hashes made with a different cost are flagged
+# by pwd_context.needs_update and re-hashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated='auto', bcrypt__rounds=BCRYPT_ROUNDS)
+
+# A bcrypt call costs 2^BCRYPT_ROUNDS rounds of CPU (~250ms at 12). The
+# request path runs them on their own small pool, never on the event loop
+# or the shared threadpool; a login burst beyond the queue gets a 503.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))  # running + waiting
+password_pool = InferencePool(
+    workers=BCRYPT_WORKERS, max_queue=BCRYPT_MAX_QUEUE, retry_after=1, name="password"
+)
 
 # JWT configurations
 SECRET_KEY = os.getenv("SECRET_KEY", "UiMaV7qrSTXk2m51dMMiUXHbzAvVcK4lyHC3YZLknixPBP4vAdUU7udejZV")
@@ -24,6 +37,19 @@ def get_password_hash(password: str) -> str:
 
 
 
+"""Verify a password; also returns a new hash if the stored one uses an outdated cost."""
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+     return pwd_context.verify_and_update(plain_password, hashed_password)
+
+"""Hash a password on the password pool (raises PoolSaturatedError when full)."""
+async def get_password_hash_async(password: str) -> str:
+     return await password_pool.run(get_password_hash, password)
+
+"""verify_and_update_password on the password pool."""
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+     return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+
 """Create a JWT access token."""
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
      to_encode = data.copy()
@@ -4,42 +4,96 @@ Follows the same pattern as app/crud/prediction.py:
 - Accept db: Session
 - Query / create / delete
 - Return the ORM object(s)
+
+Each function has an `_async` variant taking an AsyncSession, used by the
+async endpoints and the chat agent.
 """
 
 import json
-from datetime import datetime, timezone
-from typing import List, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Any, Tuple
 
 from sqlalchemy.orm import Session
-from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update
 
 from app.database.models import Conversation, Message, MessageRole
+from app.utils.pagination import CursorKey, keyset_before
 
 
-# ── Conversation CRUD ────────────────────────────────────────────────
+# ── Builders (shared by the sync and async functions) ────────────────
 
 
-def create_conversation(
-    db: Session,
-    user_id: int,
-    first_message: str,
-    conversation_id: Optional[str] = None,
+def _new_conversation(
+    user_id: int, first_message: str, conversation_id: Optional[str]
 ) -> Conversation:
-    """Create a new conversation with a title derived from the first message."""
     # Truncate first message to ~50 chars for the title
     title = first_message[:50].strip()
     if len(first_message) > 50:
         title += "..."
 
-    kwargs = {
-        "user_id": user_id,
-        "title": title,
-    }
+    kwargs = {"user_id": user_id, "title": title}
     # Allow caller to specify ID (e.g. from frontend), otherwise let default generate it
     if conversation_id:
         kwargs["id"] = conversation_id
+    return Conversation(**kwargs)
 
-    db_conversation = Conversation(**kwargs)
+
+def _new_message(
+    conversation_id: str,
+    role: MessageRole,
+    content: str,
+    tool_name: Optional[str],
+    tool_input: Optional[Any],
+    tool_result: Optional[Any],
+    token_count: Optional[int],
+) -> Message:
+    return Message(
+        conversation_id=conversation_id,
+        role=role,
+        content=content,
+        tool_name=tool_name,
+        tool_input=json.dumps(tool_input) if tool_input else None,
+        tool_result=json.dumps(tool_result) if tool_result else None,
+        token_count=token_count,
+    )
+
+
+def _new_messages(conversation_id: str, messages: List[dict]) -> List[Message]:
+    """Message rows for one batch, timestamped in list order.
+
+    The batch goes in with one INSERT, where the server default would give
+    every row the same created_at; increasing timestamps keep the history
+    order the order they were saved in.
+    """
+    now = datetime.now(timezone.utc)
+    db_messages = []
+    for i, fields in enumerate(messages):
+        db_message = _new_message(
+            conversation_id,
+            fields["role"],
+            fields["content"],
+            fields.get("tool_name"),
+            fields.get("tool_input"),
+            fields.get("tool_result"),
+            fields.get("token_count"),
+        )
+        db_message.created_at = now + timedelta(microseconds=i)
+        db_messages.append(db_message)
+    return db_messages
+
+
+# ── Conversation CRUD ────────────────────────────────────────────────
+
+
+def create_conversation(
+    db: Session,
+    user_id: int,
+    first_message: str,
+    conversation_id: Optional[str] = None,
+) -> Conversation:
+    """Create a new conversation with a title derived from the first message."""
+    db_conversation = _new_conversation(user_id, first_message, conversation_id)
     db.add(db_conversation)
     db.commit()
     db.refresh(db_conversation)
@@ -62,20 +116,50 @@ def get_conversation(
     )
 
 
+def _user_conversations_query(
+    user_id: int, skip: int, limit: int, cursor: Optional[CursorKey]
+):
+    # Counted per listed conversation by a correlated subquery (an index
+    # range on messages(conversation_id, ...)) in the same statement,
+    # instead of loading every message just to len() it
+    message_count = (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .correlate(Conversation)
+        .scalar_subquery()
+        .label("message_count")
+    )
+    query = select(Conversation, message_count).where(Conversation.user_id == user_id)
+    if cursor is not None:
+        query = query.where(keyset_before(Conversation, Conversation.updated_at, cursor))
+    return (
+        query.order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+
+
 def list_user_conversations(
     db: Session,
     user_id: int,
     skip: int = 0,
     limit: int = 50,
-) -> List[Conversation]:
-    """List all conversations for a user, newest first."""
-    return (
-        db.query(Conversation)
-        .filter(Conversation.user_id == user_id)
-        .order_by(Conversation.updated_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    cursor: Optional[CursorKey] = None,
+) -> List[Tuple[Conversation, int]]:
+    """List conversations for a user, most recently active first, as
+    (conversation, message_count) pairs — one SQL statement per page.
+
+    Pass the decoded cursor of the previous page to page by keyset;
+    skip is kept for offset callers.
+    """
+    result = db.execute(_user_conversations_query(user_id, skip, limit, cursor))
+    return [tuple(row) for row in result.all()]
+
+
+def count_user_conversations(db: Session, user_id: int) -> int:
+    """Number of conversations a user has (index-only count)."""
+    return db.scalar(
+        select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id)
     )
 
 
@@ -110,14 +194,8 @@ def save_message(
     token_count: Optional[int] = None,
 ) -> Message:
     """Save a message to the database and touch conversation.updated_at."""
-    db_message = Message(
-        conversation_id=conversation_id,
-        role=role,
-        content=content,
-        tool_name=tool_name,
-        tool_input=json.dumps(tool_input) if tool_input else None,
-        tool_result=json.dumps(tool_result) if tool_result else None,
-        token_count=token_count,
+    db_message = _new_message(
+        conversation_id, role, content, tool_name, tool_input, tool_result, token_count
     )
     db.add(db_message)
 
@@ -135,6 +213,23 @@ def save_message(
     return db_message
 
 
+def save_messages(
+    db: Session, conversation_id: str, messages: List[dict]
+) -> List[Message]:
+    """Save several messages in one transaction (one commit, one
+    updated_at touch). Each dict holds save_message's keyword arguments
+    (role, content, tool_name, ...)."""
+    db_messages = _new_messages(conversation_id, messages)
+    db.add_all(db_messages)
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+    return db_messages
+
+
 def get_conversation_messages(
     db: Session,
     conversation_id: str,
@@ -154,3 +249,139 @@ def get_conversation_messages(
         .order_by(Message.created_at.asc())
         .all()
     )
+
+
+# ── Async variants (request path) ────────────────────────────────────
+
+
+async def create_conversation_async(
+    db: AsyncSession,
+    user_id: int,
+    first_message: str,
+    conversation_id: Optional[str] = None,
+) -> Conversation:
+    """Create a new conversation with a title derived from the first message."""
+    db_conversation = _new_conversation(user_id, first_message, conversation_id)
+    db.add(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
+    return db_conversation
+
+
+async def get_conversation_async(
+    db: AsyncSession,
+    conversation_id: str,
+    user_id: int,
+) -> Optional[Conversation]:
+    """Get a single conversation by ID, scoped to the user for authorization."""
+    result = await db.execute(
+        select(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id,
+        )
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def list_user_conversations_async(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[CursorKey] = None,
+) -> List[Tuple[Conversation, int]]:
+    """List conversations for a user with message counts (see
+    list_user_conversations)."""
+    result = await db.execute(_user_conversations_query(user_id, skip, limit, cursor))
+    return [tuple(row) for row in result.all()]
+
+
+async def count_user_conversations_async(db: AsyncSession, user_id: int) -> int:
+    """Number of conversations a user has (index-only count)."""
+    return await db.scalar(
+        select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id)
+    )
+
+
+async def delete_conversation_async(
+    db: AsyncSession,
+    conversation_id: str,
+    user_id: int,
+) -> bool:
+    """Delete a conversation and all its messages (cascade).
+
+    Returns True if deleted, False if not found.
+    """
+    conversation = await get_conversation_async(db, conversation_id, user_id)
+    if conversation is None:
+        return False
+    await db.delete(conversation)
+    await db.commit()
+    return True
+
+
+async def save_message_async(
+    db: AsyncSession,
+    conversation_id: str,
+    role: MessageRole,
+    content: str,
+    tool_name: Optional[str] = None,
+    tool_input: Optional[Any] = None,
+    tool_result: Optional[Any] = None,
+    token_count: Optional[int] = None,
+) -> Message:
+    """Save a message to the database and touch conversation.updated_at."""
+    db_message = _new_message(
+        conversation_id, role, content, tool_name, tool_input, tool_result, token_count
+    )
+    db.add(db_message)
+
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=datetime.now(timezone.utc))
+    )
+
+    await db.commit()
+    await db.refresh(db_message)
+    return db_message
+
+
+async def save_messages_async(
+    db: AsyncSession, conversation_id: str, messages: List[dict]
+) -> List[Message]:
+    """Save several messages in one transaction (one commit, one
+    updated_at touch). Each dict holds save_message's keyword arguments
+    (role, content, tool_name, ...)."""
+    db_messages = _new_messages(conversation_id, messages)
+    db.add_all(db_messages)
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(updated_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+    return db_messages
+
+
+async def get_conversation_messages_async(
+    db: AsyncSession,
+    conversation_id: str,
+    user_id: int,
+) -> List[Message]:
+    """Get all messages for a conversation, ordered chronologically.
+
+    Joins through Conversation to verify user ownership.
+    """
+    result = await db.execute(
+        select(Message)
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id,
+        )
+        .order_by(Message.created_at.asc())
+    )
+    return list(result.scalars().all())
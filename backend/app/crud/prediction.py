@@ -1,9 +1,88 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 
-from app.database.models import Prediction
+from app.database.models import Prediction, UserPredictionStats
+from app.utils.pagination import CursorKey, keyset_before
+
+TUMOR_LABEL = "Tumor"
+
+
+# ── Per-user rollup (user_prediction_stats) ──────────────────────────
+# Updated in the same transaction as the prediction rows, so statistics
+# are one primary-key read however long a user's history is.
+
+def _rollup_increment(dialect_name: str, user_id: int, predictions: List[dict]):
+    """Upsert statement adding a batch of (already flushed) predictions to a
+    user's rollup.
+
+    An existing row is incremented atomically (col = col + batch), so
+    concurrent uploads by the same user never lose an update. A missing row
+    is seeded from an aggregate over the user's predictions, which already
+    include the batch — so the rollup is correct even for users whose
+    history predates the table.
+    """
+    seed = select(
+        literal(user_id),
+        func.count(Prediction.id),
+        func.coalesce(func.sum(case((Prediction.prediction_label == TUMOR_LABEL, 1), else_=0)), 0),
+        func.coalesce(func.sum(Prediction.confidence_score), 0.0),
+    ).where(Prediction.user_id == user_id)
+
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(UserPredictionStats).from_select(
+        ["user_id", "total_predictions", "tumor_detected", "confidence_sum"], seed
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserPredictionStats.user_id],
+        set_={
+            "total_predictions": UserPredictionStats.total_predictions + len(predictions),
+            "tumor_detected": UserPredictionStats.tumor_detected
+            + sum(p["prediction_label"] == TUMOR_LABEL for p in predictions),
+            "confidence_sum": UserPredictionStats.confidence_sum
+            + float(sum(p["confidence_score"] for p in predictions)),
+            "updated_at": func.now(),
+        },
+    )
+
+def _rollup_decrement(prediction: Prediction):
+    """Update statement removing one prediction from its user's rollup."""
+    return (
+        update(UserPredictionStats)
+        .where(UserPredictionStats.user_id == prediction.user_id)
+        .values(
+            total_predictions=UserPredictionStats.total_predictions - 1,
+            tumor_detected=UserPredictionStats.tumor_detected
+            - (1 if prediction.prediction_label == TUMOR_LABEL else 0),
+            confidence_sum=UserPredictionStats.confidence_sum - prediction.confidence_score,
+        )
+    )
+
+def _aggregate_statistics_query(user_id: int):
+    """One scan computing count, tumor count and mean confidence together."""
+    return select(
+        func.count(Prediction.id),
+        func.coalesce(func.sum(case((Prediction.prediction_label == TUMOR_LABEL, 1), else_=0)), 0),
+        func.avg(Prediction.confidence_score),
+    ).where(Prediction.user_id == user_id)
+
+def _statistics(total: int, tumor: int, avg_confidence: Optional[float]) -> dict:
+    return {
+        "total_predictions": total,
+        "tumor_detected": tumor,
+        "average_confidence": round(float(avg_confidence or 0), 4),
+        "no_tumor_detected": total - tumor
+    }
+
+def _rollup_statistics(rollup: UserPredictionStats) -> dict:
+    total = rollup.total_predictions
+    return _statistics(
+        total, rollup.tumor_detected, rollup.confidence_sum / total if total else 0
+    )
+
 
 #creating objects i guess
 def create_prediction(
@@ -28,10 +107,38 @@ def create_prediction(
     )
 
     db.add(db_prediction)
+    db.flush()
+    db.execute(_rollup_increment(db.get_bind().dialect.name, user_id, [{
+        "prediction_label": prediction_label, "confidence_score": confidence_score
+    }]))
     db.commit()
     db.refresh(db_prediction)
     return db_prediction
 
+def create_predictions(
+    db: Session,
+    user_id: int,
+    predictions: List[dict],
+    model_version: str = "vgg16_v1"
+) -> List[int]:
+    """Create many prediction records in one transaction.
+
+    Each dict holds filename, file_size, prediction_label, confidence_score
+    and processing_time. Returns the new ids in input order.
+    """
+    db_predictions = [
+        Prediction(user_id=user_id, model_version=model_version, **prediction)
+        for prediction in predictions
+    ]
+
+    db.add_all(db_predictions)
+    db.flush()
+    ids = [db_prediction.id for db_prediction in db_predictions]
+    if predictions:
+        db.execute(_rollup_increment(db.get_bind().dialect.name, user_id, predictions))
+    db.commit()
+    return ids
+
 def get_prediction_by_id(db: Session, prediction_id: int) -> Optional[Prediction]:
     """Get a prediction by ID."""
     return db.query(Prediction).filter(Prediction.id == prediction_id).first()
@@ -40,21 +147,30 @@ def get_all_predictions(db: Session, skip: int = 0, limit: int = 100) -> List[Pr
     """Get all predictions with pagination."""
     return db.query(Prediction).offset(skip).limit(limit).all()
 
+def _user_predictions_query(user_id: int, skip: int, limit: int, cursor: Optional[CursorKey]):
+    query = select(Prediction).where(Prediction.user_id == user_id)
+    if cursor is not None:
+        query = query.where(keyset_before(Prediction, Prediction.created_at, cursor))
+    return (
+        query
+        .order_by(Prediction.created_at.desc(), Prediction.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+
 def get_user_predictions(
     db: Session,
     user_id: int,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[CursorKey] = None,
 ) -> List[Prediction]:
-    """Get all predictions for a specific user."""
-    return (
-        db.query(Prediction)
-        .filter(Prediction.user_id == user_id)
-        .order_by(Prediction.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    """Get predictions for a specific user, newest first.
+
+    Pass the decoded cursor of the previous page to page by keyset
+    (constant cost at any depth); skip is kept for offset callers.
+    """
+    return list(db.scalars(_user_predictions_query(user_id, skip, limit, cursor)))
 
 def get_recent_predictions(
     db: Session,
@@ -72,39 +188,114 @@ def get_recent_predictions(
     )
 
 def get_statistics(db: Session, user_id: int) -> dict:
-    """Get prediction statistics for a user."""
-    total_predictions = (
-        db.query(Prediction)
-        .filter(Prediction.user_id == user_id)
-        .count()
-    )
+    """Get prediction statistics for a user.
 
-    tumor_count = (
-        db.query(Prediction)
-        .filter(
-            Prediction.user_id == user_id,
-            Prediction.prediction_label == "Tumor"
-        )
-        .count()
-    )
-
-    avg_confidence = (
-        db.query(func.avg(Prediction.confidence_score))
-        .filter(Prediction.user_id == user_id)
-        .scalar()
-    )
-    return {
-        "total_predictions": total_predictions,
-        "tumor_detected": tumor_count,
-        "average_confidence": round(float(avg_confidence or 0), 4),
-        "no_tumor_detected": total_predictions - tumor_count
-    }
+    Reads the user's rollup row. Users without one yet (no prediction
+    since the table was added, and not backfilled by migration 0003) fall
+    back to a single aggregate query.
+    """
+    rollup = db.get(UserPredictionStats, user_id)
+    if rollup is not None:
+        return _rollup_statistics(rollup)
+    return _statistics(*db.execute(_aggregate_statistics_query(user_id)).one())
 
 def delete_prediction(db: Session, prediction_id: int) -> bool:
     """Delete a prediction by ID."""
     db_prediction = get_prediction_by_id(db, prediction_id)
     if db_prediction:
+        db.execute(_rollup_decrement(db_prediction))
         db.delete(db_prediction)
         db.commit()
         return True
     return False
+
+
+# ── Async variants (request path) ────────────────────────────────────
+# Same behaviour as the functions above, for AsyncSession (get_async_db)
+
+async def create_prediction_async(
+    db: AsyncSession,
+    user_id: int,
+    filename: str,
+    file_size: int,
+    prediction_label: str,
+    confidence_score: float,
+    processing_time: float,
+    model_version: str = "vgg16_v1"
+) -> Prediction:
+    """Create a new prediction record."""
+    db_prediction = Prediction(
+        user_id=user_id,
+        filename=filename,
+        file_size=file_size,
+        prediction_label=prediction_label,
+        confidence_score=confidence_score,
+        processing_time=processing_time,
+        model_version=model_version
+    )
+
+    db.add(db_prediction)
+    await db.flush()
+    await db.execute(_rollup_increment(db.get_bind().dialect.name, user_id, [{
+        "prediction_label": prediction_label, "confidence_score": confidence_score
+    }]))
+    await db.commit()
+    await db.refresh(db_prediction)
+    return db_prediction
+
+async def create_predictions_async(
+    db: AsyncSession,
+    user_id: int,
+    predictions: List[dict],
+    model_version: str = "vgg16_v1",
+    commit: bool = True,
+) -> List[int]:
+    """Create many prediction records in one transaction. Returns the new ids.
+
+    With commit=False the rows are only flushed, so the caller can commit
+    them together with its own writes (e.g. the job that produced them).
+    """
+    db_predictions = [
+        Prediction(user_id=user_id, model_version=model_version, **prediction)
+        for prediction in predictions
+    ]
+
+    db.add_all(db_predictions)
+    await db.flush()
+    ids = [db_prediction.id for db_prediction in db_predictions]
+    if predictions:
+        await db.execute(_rollup_increment(db.get_bind().dialect.name, user_id, predictions))
+    if commit:
+        await db.commit()
+    return ids
+
+async def get_prediction_by_id_async(db: AsyncSession, prediction_id: int) -> Optional[Prediction]:
+    """Get a prediction by ID."""
+    return await db.get(Prediction, prediction_id)
+
+async def get_user_predictions_async(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[CursorKey] = None,
+) -> List[Prediction]:
+    """Get predictions for a specific user, newest first (see get_user_predictions)."""
+    result = await db.execute(_user_predictions_query(user_id, skip, limit, cursor))
+    return list(result.scalars().all())
+
+async def get_statistics_async(db: AsyncSession, user_id: int) -> dict:
+    """Get prediction statistics for a user (see get_statistics)."""
+    rollup = await db.get(UserPredictionStats, user_id)
+    if rollup is not None:
+        return _rollup_statistics(rollup)
+    return _statistics(*(await db.execute(_aggregate_statistics_query(user_id))).one())
+
+async def count_user_predictions_async(db: AsyncSession, user_id: int) -> int:
+    """Total predictions for a user — one primary-key read of the rollup row."""
+    rollup = await db.get(UserPredictionStats, user_id)
+    if rollup is not None:
+        return rollup.total_predictions
+    return await db.scalar(
+        select(func.count(Prediction.id)).where(Prediction.user_id == user_id)
+    )
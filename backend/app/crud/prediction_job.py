@@ -0,0 +1,167 @@
+"""CRUD operations for background prediction jobs.
+
+Follows the same pattern as app/crud/prediction.py:
+- Accept db: Session
+- Query / create / update
+- Return the ORM object(s)
+"""
+
+import json
+from typing import List, Optional, Any
+
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+
+from app.database.models import PredictionJob, JobStatus
+
+
+def create_job(
+    db: Session,
+    user_id: int,
+    total_slices: int,
+    storage_path: str,
+    job_id: Optional[str] = None,
+) -> PredictionJob:
+    """Create a queued job whose inputs are already stored at storage_path."""
+    kwargs = {
+        "user_id": user_id,
+        "status": JobStatus.queued,
+        "total_slices": total_slices,
+        "storage_path": storage_path,
+    }
+    if job_id:
+        kwargs["id"] = job_id
+
+    db_job = PredictionJob(**kwargs)
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job(db: Session, job_id: str, user_id: Optional[int] = None) -> Optional[PredictionJob]:
+    """Get a job by ID, optionally scoped to the user for authorization."""
+    query = db.query(PredictionJob).filter(PredictionJob.id == job_id)
+    if user_id is not None:
+        query = query.filter(PredictionJob.user_id == user_id)
+    return query.first()
+
+
+def get_unfinished_jobs(db: Session) -> List[PredictionJob]:
+    """Jobs that were queued or running when the process last stopped."""
+    return (
+        db.query(PredictionJob)
+        .filter(PredictionJob.status.in_([JobStatus.queued, JobStatus.running]))
+        .order_by(PredictionJob.created_at.asc())
+        .all()
+    )
+
+
+def claim_job(db: Session, job_id: str) -> bool:
+    """Atomically move a job from queued to running.
+
+    Returns False if another worker already claimed it.
+    """
+    result = db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id, PredictionJob.status == JobStatus.queued)
+        .values(status=JobStatus.running)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def requeue_job(db: Session, job_id: str) -> None:
+    """Put an interrupted running job back in the queue."""
+    db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id)
+        .values(status=JobStatus.queued, completed_slices=0)
+    )
+    db.commit()
+
+
+def update_job_progress(db: Session, job_id: str, completed_slices: int) -> None:
+    db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id)
+        .values(completed_slices=completed_slices)
+    )
+    db.commit()
+
+
+def complete_job(db: Session, job_id: str, result: Any) -> None:
+    db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id)
+        .values(
+            status=JobStatus.completed,
+            completed_slices=PredictionJob.total_slices,
+            result=json.dumps(result),
+        )
+    )
+    db.commit()
+
+
+def fail_job(db: Session, job_id: str, error: str) -> None:
+    db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id)
+        .values(status=JobStatus.failed, error=error)
+    )
+    db.commit()
+
+
+# ── Async variants (request path) ────────────────────────────────────
+# The job runner itself uses the sync functions on worker threads
+
+
+async def create_job_async(
+    db: AsyncSession,
+    user_id: int,
+    total_slices: int,
+    storage_path: str,
+    job_id: Optional[str] = None,
+) -> PredictionJob:
+    """Create a queued job whose inputs are already stored at storage_path."""
+    kwargs = {
+        "user_id": user_id,
+        "status": JobStatus.queued,
+        "total_slices": total_slices,
+        "storage_path": storage_path,
+    }
+    if job_id:
+        kwargs["id"] = job_id
+
+    db_job = PredictionJob(**kwargs)
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+
+async def complete_job_async(db: AsyncSession, job_id: str, result: Any) -> None:
+    """Mark a job completed. Commits the session, so any rows the job
+    wrote in it (its predictions) land in the same transaction."""
+    await db.execute(
+        update(PredictionJob)
+        .where(PredictionJob.id == job_id)
+        .values(
+            status=JobStatus.completed,
+            completed_slices=PredictionJob.total_slices,
+            result=json.dumps(result),
+        )
+    )
+    await db.commit()
+
+
+async def get_job_async(
+    db: AsyncSession, job_id: str, user_id: Optional[int] = None
+) -> Optional[PredictionJob]:
+    """Get a job by ID, optionally scoped to the user for authorization."""
+    query = select(PredictionJob).where(PredictionJob.id == job_id)
+    if user_id is not None:
+        query = query.where(PredictionJob.user_id == user_id)
+    result = await db.execute(query.limit(1))
+    return result.scalars().first()
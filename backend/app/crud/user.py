@@ -1,8 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database.models import User
-from app.auth.security import get_password_hash, verify_password
+from app.auth.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_and_update_password_async,
+    verify_password,
+)
+from app.auth.principal_cache import principal_cache
 
 
 """Create a new user."""
@@ -32,6 +40,14 @@ def get_user_by_username(db: Session, username: str) -> Optional[User]:
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
+"""Activate or deactivate a user (drops them from the auth cache)."""
+def set_user_active(db: Session, user: User, is_active: bool) -> User:
+    user.is_active = is_active
+    db.commit()
+    db.refresh(user)
+    principal_cache.invalidate(user.email)
+    return user
+
 """Authenticate a user by email and password[when he tries to login in]."""
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = get_user_by_email(db, email)
@@ -42,3 +58,63 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
         return None
 
     return user
+
+
+# ── Async variants (request path) ────────────────────────────────────
+
+"""Create a new user (the password is hashed on the password pool)."""
+async def create_user_async(db: AsyncSession, email: str, username: str, password: str) -> User:
+    db_user = User(
+        email=email,
+        username=username,
+        hashed_password=await get_password_hash_async(password)
+    )
+
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+
+    return db_user
+
+"""Get a user by email."""
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
+
+"""Get a user by username."""
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username).limit(1))
+    return result.scalars().first()
+
+"""Get a user by ID."""
+async def get_user_by_id_async(db: AsyncSession, user_id: int) -> Optional[User]:
+    return await db.get(User, user_id)
+
+"""Activate or deactivate a user (drops them from the auth cache)."""
+async def set_user_active_async(db: AsyncSession, user: User, is_active: bool) -> User:
+    user.is_active = is_active
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate(user.email)
+    return user
+
+"""Authenticate a user by email and password.
+
+bcrypt runs on the password pool. A hash made with a different cost
+than BCRYPT_ROUNDS is replaced after a successful check, so changing
+the cost upgrades users as they log in.
+"""
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    user = await get_user_by_email_async(db, email)
+
+    if not user:
+        return None
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
+        return None
+
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return user
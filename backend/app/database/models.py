@@ -11,6 +11,7 @@ from sqlalchemy import (
     ForeignKey,
     Text,
     Enum,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -33,6 +34,7 @@ class User(Base):
     # Relationships
     predictions = relationship("Prediction", back_populates="user")
     conversations = relationship("Conversation", back_populates="user")
+    prediction_jobs = relationship("PredictionJob", back_populates="user")
 
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email})>"
@@ -66,10 +68,41 @@ class Prediction(Base):
     # Relationship back to user
     user = relationship("User", back_populates="predictions")
 
+    # History listing: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+    # (id breaks ties for keyset pagination)
+    __table_args__ = (
+        Index("ix_predictions_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Prediction(id={self.id}, label={self.prediction_label})>"
 
 
+class UserPredictionStats(Base):
+    """Per-user prediction rollup, kept in step by crud/prediction.py.
+
+    Lets /api/statistics and the chat agent's statistics tool read one row
+    instead of scanning a user's whole prediction history.
+    """
+
+    __tablename__ = "user_prediction_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_predictions = Column(Integer, nullable=False, default=0)
+    tumor_detected = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<UserPredictionStats(user_id={self.user_id}, total={self.total_predictions})>"
+
+
 # ── Chat Persistence Models ──────────────────────────────────────────
 
 
@@ -113,6 +146,12 @@ class Conversation(Base):
         order_by="Message.created_at",
     )
 
+    # Sidebar listing: WHERE user_id = ? ORDER BY updated_at DESC, id DESC
+    # (id breaks ties for keyset pagination)
+    __table_args__ = (
+        Index("ix_conversations_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Conversation(id={self.id}, title={self.title})>"
 
@@ -142,5 +181,56 @@ class Message(Base):
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
 
+    # History loading: WHERE conversation_id = ? ORDER BY created_at
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Message(id={self.id}, role={self.role}, conversation={self.conversation_id})>"
+
+
+# ── Asynchronous Prediction Jobs ─────────────────────────────────────
+
+
+class JobStatus(str, enum.Enum):
+    """Lifecycle of a background prediction job."""
+
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class PredictionJob(Base):
+    __tablename__ = "prediction_jobs"
+
+    id = Column(String(36), primary_key=True, default=_generate_uuid)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.queued)
+
+    # Progress
+    total_slices = Column(Integer, nullable=False, default=0)
+    completed_slices = Column(Integer, nullable=False, default=0)
+
+    # Where the uploaded slices wait until a worker picks the job up
+    storage_path = Column(String(255), nullable=False)
+
+    # Outcome
+    result = Column(Text, nullable=True)  # JSON string: {"study": ..., "slices": [...]}
+    error = Column(Text, nullable=True)
+
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    user = relationship("User", back_populates="prediction_jobs")
+
+    def __repr__(self):
+        return f"<PredictionJob(id={self.id}, status={self.status})>"
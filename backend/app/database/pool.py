@@ -0,0 +1,162 @@
+"""
+app/database/pool.py — Connection pool settings and pool metrics
+
+The engines used to run on SQLAlchemy's default pool (5 connections +
+10 overflow, 30s timeout) with a pre-ping round trip on every checkout.
+Everything here is tunable from the environment instead, and each engine
+reports what its pool is doing on the /metrics registry:
+
+    db_pool_<name>_checkouts           connections handed out
+    db_pool_<name>_wait_seconds        time to obtain one (queue wait,
+                                       new connection, pre-ping)
+    db_pool_<name>_timeouts            checkouts that gave up (pool_timeout)
+    db_pool_<name>_checked_out         gauge: connections in use
+    db_pool_<name>_overflow            gauge: in use beyond pool_size
+    db_pool_<name>_overflow_checkouts  checkouts served by an overflow connection
+    db_pool_<name>_connects            new DBAPI connections opened
+    db_pool_<name>_invalidations       connections discarded (disconnects,
+                                       failed pre-pings, recycles)
+
+Pre-ping vs recycle: with DB_POOL_PRE_PING on, every checkout pays one
+extra round trip to detect dead connections. Setting it off and relying
+on DB_POOL_RECYCLE (below the server/proxy idle timeout) saves that
+round trip; a connection that died anyway is invalidated on first use.
+
+Usage (database.py):
+    sync_pool = PoolMetrics("sync")
+    engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, sync_pool))
+    sync_pool.attach(engine)
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool, StaticPool
+
+from app.utils.metrics import metrics
+
+# ── Pool config ────────────────────────────────────────────────────────
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 = never
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class PoolMetrics:
+    """Metrics for one engine's pool, registered under db_pool_<name>_*."""
+
+    def __init__(self, name: str):
+        self.name = name
+        prefix = f"db_pool_{name}"
+        self.checkouts = metrics.counter(f"{prefix}_checkouts", "Connections checked out")
+        self.wait = metrics.histogram(
+            f"{prefix}_wait_seconds", WAIT_BUCKETS, "Time to obtain a connection"
+        )
+        self.timeouts = metrics.counter(f"{prefix}_timeouts", "Checkouts that timed out")
+        self.checked_out = metrics.gauge(f"{prefix}_checked_out", "Connections in use")
+        self.overflow = metrics.gauge(f"{prefix}_overflow", "Connections in use beyond pool_size")
+        self.overflow_checkouts = metrics.counter(
+            f"{prefix}_overflow_checkouts", "Checkouts served by an overflow connection"
+        )
+        self.connects = metrics.counter(f"{prefix}_connects", "New DBAPI connections")
+        self.invalidations = metrics.counter(
+            f"{prefix}_invalidations", "Connections invalidated"
+        )
+
+    def pool_class(self, base: Type[Pool]) -> Type[Pool]:
+        """A subclass of base that times every checkout.
+
+        Pool events fire only after a connection is obtained, so the wait
+        has to be measured around connect(). The metrics live on the class
+        rather than the instance because dispose() recreates the pool.
+        """
+        pool_metrics = self
+
+        class TimedPool(base):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    return super().connect()
+                except exc.TimeoutError:
+                    pool_metrics.timeouts.inc()
+                    raise
+                finally:
+                    pool_metrics.wait.observe(time.perf_counter() - started)
+
+        TimedPool.__name__ = f"Timed{base.__name__}"
+        return TimedPool
+
+    def attach(self, engine: Engine) -> None:
+        """Listen to the engine's pool events (for an AsyncEngine, pass
+        async_engine.sync_engine). Listeners survive pool recreation."""
+
+        # Counted from the events: the checkin event fires before the pool
+        # has taken the connection back, so pool.checkedout() lags by one
+        def update_gauges(change: int) -> None:
+            self.checked_out.inc(change)
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                self.overflow.set(max(0, self.checked_out.value - pool.size()))
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts.inc()
+            update_gauges(+1)
+            if self.overflow.value > 0:
+                self.overflow_checkouts.inc()
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            update_gauges(-1)
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.connects.inc()
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations.inc()
+
+        @event.listens_for(engine, "soft_invalidate")
+        def on_soft_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations.inc()
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+
+def pool_options(
+    url: str,
+    pool_metrics: Optional[PoolMetrics] = None,
+    is_async: bool = False,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    pool_pre_ping: bool = DB_POOL_PRE_PING,
+) -> Dict[str, Any]:
+    """create_engine / create_async_engine keyword arguments for the pool."""
+    if _is_memory_sqlite(url):
+        # One shared in-memory database: nothing to size
+        return {"poolclass": StaticPool}
+    if is_async and url.startswith("sqlite"):
+        # aiosqlite connections belong to the event loop that opened them
+        # (tests and scripts run several loops); opening a file is cheap
+        return {"poolclass": NullPool}
+
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    return {
+        "poolclass": pool_metrics.pool_class(base) if pool_metrics else base,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pool_pre_ping,
+    }
@@ -1,18 +1,32 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from app.api.predict import router as predict_router
+from app.api.predict import router as predict_router, process_prediction_job
 from app.api.auth import router as auth_router
 from app.api.chat import router as chat_router
 
-from app.database.database import Base, engine
+from app.database.database import Base, engine, async_engine
+from app.auth.dependencies import get_current_admin_user
 from app.middleware.security_headers import SecurityHeadersMiddleware
+from app.middleware.body_limit import BodySizeLimitMiddleware
 from app.middleware.rate_limit import limiter, rate_limit_exceeded_handler
+from app.utils.metrics import metrics
+from app.utils.file_validator import (
+    MAX_REQUEST_BODY,
+    MAX_UPLOAD_REQUEST_SIZE,
+    MAX_BATCH_REQUEST_SIZE,
+)
+from app.services.inference_pool import inference_pool
+from app.auth.security import password_pool
+from app.ai.llm_client import llm_client
+from app.services.prediction_jobs import job_runner
+from app.services.model_service import model_service
 from slowapi.errors import RateLimitExceeded
 
-from app.database.models import User, Prediction, Conversation, Message  # noqa: F401
+from app.database.models import User, Prediction, PredictionJob, Conversation, Message  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
@@ -24,9 +38,14 @@ async def lifespan(app: FastAPI):
 
     ON STARTUP:
     - Creates DB tables (idempotent)
+    - Starts loading + warming up the prediction model on a background
+      thread. The app serves immediately; /health/ready reports when the
+      model is ready and predictions return 503 until then.
     - Initializes the RAG service: loads sentence-transformers model,
       connects to ChromaDB, and ingests medical documents if the
       collection is empty.
+    - Starts the background prediction job workers and resumes any jobs
+      left unfinished by the previous process.
 
     RAG initialization is best-effort: if it fails (e.g., missing model
     weights, out of memory), the app starts anyway and RAG is silently
@@ -36,6 +55,9 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables verified")
 
+    # ── Prediction model (background) ────────────────────────────────
+    await model_service.start()
+
     # ── RAG service ──────────────────────────────────────────────────
     try:
         from app.ai.rag import rag_service
@@ -47,10 +69,20 @@ async def lifespan(app: FastAPI):
         logger.error(f"RAG service failed to initialize: {e}", exc_info=True)
         logger.warning("App will start without RAG support")
 
+    # ── Background prediction jobs ───────────────────────────────────
+    # Resumes jobs left queued/running by the previous process
+    await job_runner.start(process_prediction_job)
+
     yield
 
     # ── Shutdown ─────────────────────────────────────────────────────
     logger.info("Application shutting down")
+    await job_runner.stop()
+    inference_pool.shutdown()
+    password_pool.shutdown()
+    await llm_client.aclose()
+    await model_service.stop()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -70,13 +102,46 @@ app.add_middleware(
     allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
 )
+# Added last so it runs first: oversized bodies never reach the app
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    default_limit=MAX_REQUEST_BODY,
+    path_limits={
+        "/api/predict": MAX_UPLOAD_REQUEST_SIZE,
+        "/api/predict/batch": MAX_BATCH_REQUEST_SIZE,
+        "/api/predict/jobs": MAX_BATCH_REQUEST_SIZE,
+    },
+)
 
 
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up and serving."""
     return {"status": "ok"}
 
 
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: 200 once the model is loaded and warmed up, else 503."""
+    model = model_service.status()
+    ready = model_service.is_ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "model": model},
+    )
+
+
+@app.get("/metrics")
+def get_metrics(_admin: User = Depends(get_current_admin_user)):
+    """JSON snapshot of in-process counters and histograms.
+
+    Admin only: pool saturation, cache hit rates, request counts and model
+    state are operational details, not for every user of the API. Scrapers
+    authenticate with an admin account's bearer token.
+    """
+    return metrics.snapshot()
+
+
 app.include_router(predict_router, prefix="/api", tags=["Predictions"])
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(chat_router, prefix="/api/chat", tags=["chatbot"])
@@ -0,0 +1,132 @@
+"""
+app/middleware/body_limit.py — Cut off oversized request bodies at the ASGI layer
+
+Without this, Starlette spools a whole multipart body to disk before any
+endpoint code runs, so a 2 GB junk upload is fully received before the
+validator rejects it. This middleware answers 413 straight away when
+Content-Length is over the limit, and otherwise counts bytes as they are
+received. When a chunked/streamed body goes over, the 413 is sent at
+that moment and the app is told the client disconnected, so it stops
+reading (anything it tries to send afterwards is dropped).
+
+Pure ASGI (not BaseHTTPMiddleware) so it sees the raw receive channel.
+Raising from receive() instead doesn't work: BaseHTTPMiddleware layers
+further in wrap the error in an ExceptionGroup and FastAPI turns it into
+a 400.
+
+Usage (main.py):
+    app.add_middleware(
+        BodySizeLimitMiddleware,
+        default_limit=1024 * 1024,
+        path_limits={"/api/predict": 11 * 1024 * 1024},
+    )
+"""
+
+import json
+import logging
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class BodySizeLimitMiddleware:
+    """Enforce a maximum request body size, per path prefix."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_limit: int,
+        path_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.default_limit = default_limit
+        # Longest prefix first, so /api/predict/batch wins over /api/predict
+        self.path_limits = sorted(
+            (path_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return limit
+        return self.default_limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+
+        # Declared size over the limit — reject without reading a byte
+        content_length = self._content_length(scope)
+        if content_length is not None and content_length > limit:
+            logger.warning(
+                f"Rejected {scope['path']}: Content-Length {content_length} > {limit}"
+            )
+            await self._send_413(send, limit)
+            return
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    logger.warning(f"Rejected {scope['path']}: body exceeded {limit} bytes")
+                    if not response_started:
+                        await self._send_413(send, limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected:
+                return  # the 413 has already been sent
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # The app sees a disconnect mid-body; any error that causes is moot
+            if not rejected:
+                raise
+
+    @staticmethod
+    def _content_length(scope: Scope) -> Optional[int]:
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @staticmethod
+    async def _send_413(send: Send, limit: int) -> None:
+        detail = f"Request body too large (max {limit // (1024 * 1024)}MB)"
+        body = json.dumps({"detail": detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,229 @@
+"""
+app/services/batching.py — Dynamic micro-batching for model inference
+
+Concurrent callers each submit one preprocessed tensor. A single dispatcher
+thread collects requests for up to INFERENCE_MAX_WAIT_MS (or until
+INFERENCE_MAX_BATCH_SIZE rows are queued), runs ONE batched forward pass,
+and hands every caller back its own slice of the output.
+
+Under load this turns hundreds of batch-of-one VGG16 calls into a handful
+of batched ones. With a single caller the extra latency is bounded by the
+wait window.
+
+With pad_to_buckets, batches are zero-padded up to the next power-of-two
+bucket (1, 2, 4, ... max_batch_size) so the model only ever sees a small,
+fixed set of input shapes — each one traced/allocated once at warm-up
+instead of on a live request.
+
+Usage:
+    batcher = InferenceBatcher(lambda batch: model.predict(batch, verbose=0))
+    preds = batcher.submit(img_array)   # blocks until the batch has run
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+import numpy as np
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ── Batching config ────────────────────────────────────────────────────
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+# ── Metrics ────────────────────────────────────────────────────────────
+batch_size_histogram = metrics.histogram(
+    "inference_batch_size",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+    description="Rows per batched forward pass",
+)
+queue_wait_histogram = metrics.histogram(
+    "inference_queue_wait_seconds",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0),
+    description="Time a request waited in the batching queue before dispatch",
+)
+batch_latency_histogram = metrics.histogram(
+    "inference_batch_seconds",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    description="Wall time of one batched forward pass",
+)
+
+_STOP = object()
+
+
+def batch_buckets(max_batch_size: int) -> List[int]:
+    """Power-of-two batch sizes up to (and including) max_batch_size."""
+    buckets = []
+    size = 1
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    buckets.append(max_batch_size)
+    return buckets
+
+
+class _PendingRequest:
+    __slots__ = ("array", "future", "enqueued_at")
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests into batched forward passes.
+
+    predict_fn receives an (N, H, W, C) array and must return an array whose
+    first dimension is N. Each submitted array keeps its own leading batch
+    dimension (usually 1), so callers get back exactly the rows they sent.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        pad_to_buckets: bool = False,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.pad_to_buckets = pad_to_buckets
+        self.buckets = batch_buckets(self.max_batch_size)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ══════════════════════════════════════════════════════════════════
+    #  PUBLIC API
+    # ══════════════════════════════════════════════════════════════════
+
+    def submit_async(self, img_array: np.ndarray) -> Future:
+        """Queue one tensor and return a Future for its prediction rows."""
+        self._ensure_started()
+        request = _PendingRequest(img_array)
+        self._queue.put(request)
+        return request.future
+
+    def submit(self, img_array: np.ndarray) -> np.ndarray:
+        """Queue one tensor and block until its prediction rows are ready."""
+        return self.submit_async(img_array).result()
+
+    def padded_size(self, rows: int) -> int:
+        """Batch size the model actually sees for `rows` queued rows."""
+        if not self.pad_to_buckets:
+            return rows
+        # A single oversized request can exceed max_batch_size; run it as-is
+        return next((b for b in self.buckets if b >= rows), rows)
+
+    def close(self) -> None:
+        """Stop the dispatcher thread after it drains the queue."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    # ══════════════════════════════════════════════════════════════════
+    #  DISPATCHER
+    # ══════════════════════════════════════════════════════════════════
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="inference-batcher", daemon=True
+                )
+                self._thread.start()
+                logger.info(
+                    f"Inference batcher started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait={self.max_wait * 1000:.1f}ms)"
+                )
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+
+            if stop:
+                return
+
+    def _collect(self, first: _PendingRequest):
+        """Gather requests until the batch is full or the wait window closes.
+
+        The window is measured from when the FIRST request was enqueued, so a
+        request that already waited while the previous batch ran is not
+        delayed any further.
+        """
+        batch: List[_PendingRequest] = [first]
+        rows = len(first.array)
+        deadline = first.enqueued_at + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+
+            batch.append(item)
+            rows += len(item.array)
+
+        return batch, False
+
+    def _run_batch(self, batch: List[_PendingRequest]) -> None:
+        dispatched_at = time.monotonic()
+        for request in batch:
+            queue_wait_histogram.observe(dispatched_at - request.enqueued_at)
+
+        try:
+            stacked = np.concatenate([request.array for request in batch], axis=0)
+            rows = len(stacked)
+            batch_size_histogram.observe(rows)
+
+            padded = self.padded_size(rows)
+            if padded > rows:
+                padding = np.zeros((padded - rows, *stacked.shape[1:]), dtype=stacked.dtype)
+                stacked = np.concatenate([stacked, padding], axis=0)
+
+            preds = np.asarray(self.predict_fn(stacked))
+            batch_latency_histogram.observe(time.monotonic() - dispatched_at)
+
+            if len(preds) != len(stacked):
+                raise ValueError(
+                    f"Model returned {len(preds)} rows for a batch of {len(stacked)}"
+                )
+        except Exception as e:
+            logger.exception("Batched inference failed")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            n = len(request.array)
+            request.future.set_result(preds[offset : offset + n])
+            offset += n
@@ -0,0 +1,143 @@
+"""
+app/services/inference_pool.py — Bounded worker pool for CPU-heavy inference
+
+Image decoding and the VGG16 forward pass are synchronous and CPU-bound.
+Running them inside an `async def` handler blocks the event loop, stalling
+auth, chat SSE streams and health checks. This pool moves that work onto a
+fixed number of worker threads and caps how much work may be waiting, so a
+burst of uploads gets a fast 503 instead of an ever-growing backlog.
+
+A thread pool (not a process pool) is used on purpose: TensorFlow and PIL
+release the GIL during the heavy work, and all workers must share the one
+in-memory model so the InferenceBatcher can coalesce their requests.
+
+Only preprocessing should run here. Waiting on the batcher's futures
+belongs on the event loop (asyncio.wrap_future): a worker blocked on a
+future can't preprocess the next request, which would cap every batch at
+INFERENCE_WORKERS rows whatever INFERENCE_MAX_BATCH_SIZE says.
+
+Usage:
+    from app.services.inference_pool import inference_pool, PoolSaturatedError
+
+    try:
+        batch = await inference_pool.run(predictor.submit_batch, images)
+    except PoolSaturatedError:
+        ...  # respond 503 with Retry-After
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ── Pool config ────────────────────────────────────────────────────────
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "32"))  # running + waiting
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))  # seconds
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool already holds max_queue tasks."""
+
+    def __init__(self, retry_after: int, name: str = "inference"):
+        super().__init__(f"{name.capitalize()} pool saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """Fixed-size thread pool with an admission limit.
+
+    Also used for other CPU-bound request work (e.g. password hashing in
+    app/auth/security.py); `name` keeps their threads and metrics apart:
+    <name>_pool_pending and <name>_pool_rejected.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        max_queue: int = INFERENCE_MAX_QUEUE,
+        retry_after: int = INFERENCE_RETRY_AFTER,
+        name: str = "inference",
+    ):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(self.workers, max_queue)
+        self.retry_after = retry_after
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=name
+        )
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self._pending_gauge = metrics.gauge(
+            f"{name}_pool_pending", f"Tasks running or waiting in the {name} pool"
+        )
+        self._rejected = metrics.counter(
+            f"{name}_pool_rejected", "Tasks rejected because the pool was saturated"
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _acquire(self, n: int = 1) -> None:
+        with self._lock:
+            if self._pending + n > self.max_queue:
+                self._rejected.inc()
+                raise PoolSaturatedError(self.retry_after, self.name)
+            self._pending += n
+            self._pending_gauge.set(self._pending)
+
+    def _release(self, n: int = 1) -> None:
+        with self._lock:
+            self._pending -= n
+            self._pending_gauge.set(self._pending)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on a worker thread, or raise PoolSaturatedError."""
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._release()
+
+    async def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Run fn over items in parallel, returning results in input order.
+
+        Reserves at most one slot per worker for the whole batch, all or
+        nothing, so a large study never fills the queue on its own and is
+        never rejected halfway through.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        slots = min(len(items), self.workers)
+        self._acquire(slots)
+        try:
+            loop = asyncio.get_running_loop()
+            semaphore = asyncio.Semaphore(slots)
+
+            async def run_one(item):
+                async with semaphore:
+                    return await loop.run_in_executor(self._executor, fn, item)
+
+            return await asyncio.gather(*(run_one(item) for item in items))
+        finally:
+            self._release(slots)
+
+    def shutdown(self) -> None:
+        """Wait for running tasks and stop the worker threads."""
+        logger.info(f"Shutting down {self.name} pool")
+        self._executor.shutdown(wait=True)
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+inference_pool = InferencePool()
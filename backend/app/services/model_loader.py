@@ -1,28 +1,307 @@
 import tensorflow as tf
+import numpy as np
 import logging
 import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
 
+# ── Backend selection ──────────────────────────────────────────────────
+# keras       — reference model, model.predict (default)
+# tf_function — graph-compiled serving function with a fixed input signature
+# tflite      — TFLite interpreter, optionally float16/int8 quantized
+# onnx        — ONNX Runtime (needs tf2onnx + onnxruntime), optionally int8
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "keras")
+MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION", "none")  # none | float16 | int8
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "model/exported")
+
+# Held-out images used to calibrate int8 and to verify accuracy parity
+MODEL_CALIBRATION_DIR = os.getenv("MODEL_CALIBRATION_DIR", "")
+MODEL_PARITY_DIR = os.getenv("MODEL_PARITY_DIR", "")
+PARITY_MAX_ABS_DIFF = float(os.getenv("MODEL_PARITY_MAX_ABS_DIFF", "0.05"))
+
+INPUT_SHAPE = (224, 224, 3)
+
+
+class InferenceBackend(ABC):
+    """Common interface: predict(batch) -> (N, 1) sigmoid outputs.
+
+    The signature matches keras Model.predict so callers don't care which
+    runtime is behind it. A backend without predict() can't be constructed.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Run the forward pass on a preprocessed (N, 224, 224, 3) batch."""
+
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self.model.predict(batch, verbose=verbose)
+
+
+class TFFunctionBackend(InferenceBackend):
+    """Graph-compiled forward pass.
+
+    The fixed input signature means the function is traced once and every
+    batch size reuses the same graph, skipping model.predict's per-call
+    data-adapter overhead.
+    """
+
+    name = "tf_function"
+
+    def __init__(self, model):
+        self.model = model
+        self._serve = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, *INPUT_SHAPE], tf.float32)],
+        )
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self._serve(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter over a converted (optionally quantized) model.
+
+    The interpreter is not thread-safe and resizing its input is costly, so
+    calls are serialized and tensors are only reallocated when the batch
+    size changes.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_content: bytes):
+        self.interpreter = tf.lite.Interpreter(model_content=model_content)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self.interpreter.resize_tensor_input(
+                    self._input["index"], [len(batch), *INPUT_SHAPE]
+                )
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+
+            self.interpreter.set_tensor(self._input["index"], batch.astype(np.float32))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+class ONNXBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, model_path: str):
+        import onnxruntime as ort  # deferred import — optional dependency
+
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch.astype(np.float32)})[0]
+
 
 class ModelLoader:
     """Load and manage the TensorFlow model."""
 
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        backend: str = MODEL_BACKEND,
+        quantization: str = MODEL_QUANTIZATION,
+    ):
         self.model_path = model_path
-        self.model = None
+        self.backend = backend
+        self.quantization = quantization
+        self.model = None          # serving backend (what load() returns)
+        self.keras_model = None    # reference model
 
     def load(self):
-        """Load the model from disk."""
+        """Load the model from disk and wrap it in the selected backend."""
         if not os.path.exists(self.model_path):
             logging.error(f"Model file not found: {self.model_path}")
             raise FileNotFoundError(f"{self.model_path} does not exist")
 
         try:
-            self.model = tf.keras.models.load_model(self.model_path, compile=False)
+            self.keras_model = tf.keras.models.load_model(self.model_path, compile=False)
             logging.info(f"Model loaded successfully from path {self.model_path}")
         except Exception as e:
             logging.exception(f"Error loading model: {e}")
             raise e
 
-        return self.model
\ No newline at end of file
+        self.model = self.build_backend(self.backend, self.quantization)
+        logging.info(
+            f"Serving backend: {self.model.name} (quantization={self.quantization})"
+        )
+
+        if MODEL_PARITY_DIR and self.model.name != "keras":
+            report = check_backend_parity(
+                KerasBackend(self.keras_model),
+                self.model,
+                load_image_set(MODEL_PARITY_DIR),
+            )
+            if not report["passed"]:
+                logging.error(
+                    f"Backend {self.model.name} failed accuracy parity {report} — "
+                    f"falling back to keras"
+                )
+                self.model = KerasBackend(self.keras_model)
+
+        return self.model
+
+    # ══════════════════════════════════════════════════════════════════
+    #  BACKENDS
+    # ══════════════════════════════════════════════════════════════════
+
+    def build_backend(self, backend: str, quantization: str = "none") -> InferenceBackend:
+        """Build a serving backend around the loaded reference model."""
+        if backend in ("keras", "tf_function") and quantization != "none":
+            raise ValueError(f"Quantization is not supported by the {backend} backend")
+
+        if backend == "keras":
+            return KerasBackend(self.keras_model)
+        if backend == "tf_function":
+            return TFFunctionBackend(self.keras_model)
+        if backend == "tflite":
+            return TFLiteBackend(self._export_tflite(quantization))
+        if backend == "onnx":
+            return ONNXBackend(self._export_onnx(quantization))
+
+        raise ValueError(f"Unknown model backend: {backend}")
+
+    def _export_path(self, suffix: str) -> Path:
+        """Exports are cached next to the model, keyed by source file + variant."""
+        stem = Path(self.model_path).stem
+        export_dir = Path(MODEL_EXPORT_DIR)
+        export_dir.mkdir(parents=True, exist_ok=True)
+        return export_dir / f"{stem}.{suffix}"
+
+    def _is_fresh(self, export_path: Path) -> bool:
+        return (
+            export_path.exists()
+            and export_path.stat().st_mtime >= os.path.getmtime(self.model_path)
+        )
+
+    def _export_tflite(self, quantization: str) -> bytes:
+        export_path = self._export_path(f"{quantization}.tflite")
+        if self._is_fresh(export_path):
+            return export_path.read_bytes()
+
+        logging.info(f"Converting model to TFLite (quantization={quantization})...")
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.keras_model)
+
+        if quantization == "float16":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == "int8":
+            if not MODEL_CALIBRATION_DIR:
+                raise ValueError("int8 quantization needs MODEL_CALIBRATION_DIR")
+            calibration = load_image_set(MODEL_CALIBRATION_DIR)
+
+            def representative_dataset():
+                for img in calibration:
+                    yield [img[np.newaxis].astype(np.float32)]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+        elif quantization != "none":
+            raise ValueError(f"Unknown quantization: {quantization}")
+
+        content = converter.convert()
+        export_path.write_bytes(content)
+        logging.info(f"TFLite model written to {export_path}")
+        return content
+
+    def _export_onnx(self, quantization: str) -> str:
+        base_path = self._export_path("onnx")
+        if not self._is_fresh(base_path):
+            import tf2onnx  # deferred import — optional dependency
+
+            logging.info("Converting model to ONNX...")
+            spec = (tf.TensorSpec([None, *INPUT_SHAPE], tf.float32, name="input"),)
+            tf2onnx.convert.from_keras(
+                self.keras_model, input_signature=spec, output_path=str(base_path)
+            )
+            logging.info(f"ONNX model written to {base_path}")
+
+        if quantization == "none":
+            return str(base_path)
+        if quantization != "int8":
+            raise ValueError(f"ONNX backend supports int8 quantization only, got {quantization}")
+
+        quantized_path = self._export_path("int8.onnx")
+        if not self._is_fresh(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic  # deferred import
+
+            quantize_dynamic(str(base_path), str(quantized_path), weight_type=QuantType.QInt8)
+            logging.info(f"Quantized ONNX model written to {quantized_path}")
+        return str(quantized_path)
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  ACCURACY PARITY
+# ══════════════════════════════════════════════════════════════════════
+
+
+def load_image_set(directory: str, limit: int = 200) -> np.ndarray:
+    """Load and VGG16-preprocess the images in a held-out directory."""
+    from app.services.preprocessing import Pre_processing_image
+
+    paths = sorted(
+        p for p in Path(directory).iterdir()
+        if p.suffix.lower() in (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+    )[:limit]
+    if not paths:
+        raise ValueError(f"No images found in {directory}")
+
+    return np.concatenate([Pre_processing_image(str(p))[0] for p in paths], axis=0)
+
+
+def check_backend_parity(
+    reference: InferenceBackend,
+    candidate: InferenceBackend,
+    images: np.ndarray,
+    max_abs_diff: float = PARITY_MAX_ABS_DIFF,
+    batch_size: int = 16,
+    threshold: float = 0.5,
+) -> dict:
+    """Compare a candidate backend's outputs with the reference model.
+
+    Passes when every sigmoid output is within max_abs_diff of the
+    reference and every Tumor / No Tumor decision agrees.
+    """
+    ref_out, cand_out = [], []
+    for start in range(0, len(images), batch_size):
+        batch = images[start : start + batch_size]
+        ref_out.append(np.asarray(reference.predict(batch)).reshape(-1))
+        cand_out.append(np.asarray(candidate.predict(batch)).reshape(-1))
+
+    ref = np.concatenate(ref_out)
+    cand = np.concatenate(cand_out)
+    diff = np.abs(ref - cand)
+    agreement = float(np.mean((ref >= threshold) == (cand >= threshold)))
+
+    report = {
+        "backend": candidate.name,
+        "images": int(len(images)),
+        "max_abs_diff": round(float(diff.max()), 6),
+        "mean_abs_diff": round(float(diff.mean()), 6),
+        "label_agreement": round(agreement, 4),
+    }
+    report["passed"] = report["max_abs_diff"] <= max_abs_diff and agreement == 1.0
+    logging.info(f"Parity check: {report}")
+    return report
@@ -0,0 +1,164 @@
+"""
+app/services/model_service.py — Background model loading and warm-up
+
+Loading TensorFlow and the VGG16 weights takes seconds, and the first
+forward pass at each input shape pays for graph tracing / tensor
+allocation on top. Doing that at import time blocked uvicorn startup and
+slowed every test import. Instead, the lifespan starts the load on a
+background thread and the app begins serving immediately:
+
+    not_loaded → loading → ready
+                         ↘ failed
+
+While loading, prediction endpoints answer 503 with Retry-After (cached
+results are still served). Warm-up runs one synthetic batch at every
+batch size the batcher can dispatch, so no live request triggers a trace.
+
+Usage:
+    from app.services.model_service import model_service, ModelNotReadyError
+
+    # main.py lifespan
+    await model_service.start()
+
+    # endpoint
+    predictor = model_service.get_predictor()   # raises ModelNotReadyError
+"""
+
+import asyncio
+import logging
+import os
+import time
+from enum import Enum
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from app.services.predictor import Predictor
+
+logger = logging.getLogger(__name__)
+
+# ── Model config ───────────────────────────────────────────────────────
+MODEL_PATH = os.getenv("MODEL_PATH", "model/tumor_model.keras")
+MODEL_VERSION = os.getenv("MODEL_VERSION", "vgg16_v1")
+MODEL_LOADING_RETRY_AFTER = int(os.getenv("MODEL_LOADING_RETRY_AFTER", "10"))  # seconds
+
+INPUT_SHAPE = (224, 224, 3)
+
+
+class ModelState(str, Enum):
+    not_loaded = "not_loaded"
+    loading = "loading"
+    ready = "ready"
+    failed = "failed"
+
+
+class ModelNotReadyError(Exception):
+    """Raised when a prediction needs the model before it is ready."""
+
+    def __init__(self, state: ModelState, retry_after: int = MODEL_LOADING_RETRY_AFTER):
+        super().__init__(f"Model is not ready (state={state.value})")
+        self.state = state
+        self.retry_after = retry_after
+
+
+class ModelService:
+    """Owns the Predictor and its loading lifecycle."""
+
+    def __init__(self, model_path: str = MODEL_PATH, model_version: str = MODEL_VERSION):
+        self.model_path = model_path
+        self.model_version = model_version
+
+        self.state = ModelState.not_loaded
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+        self._predictor: Optional["Predictor"] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == ModelState.ready
+
+    def get_predictor(self) -> "Predictor":
+        """Return the loaded predictor, or raise ModelNotReadyError."""
+        if self.state != ModelState.ready:
+            raise ModelNotReadyError(self.state)
+        return self._predictor
+
+    # ══════════════════════════════════════════════════════════════════
+    #  LIFECYCLE
+    # ══════════════════════════════════════════════════════════════════
+
+    async def start(self) -> None:
+        """Start loading in the background. Returns immediately."""
+        if self.state in (ModelState.loading, ModelState.ready):
+            return
+
+        self.state = ModelState.loading
+        self.error = None
+        started = time.monotonic()
+
+        # The executor thread starts now, so loading overlaps the rest of
+        # startup (RAG init) even though that part is synchronous
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self._build)
+        self._task = asyncio.create_task(self._finish(future, started), name="model-loader")
+        logger.info(f"Model: loading {self.model_path} in the background")
+
+    async def _finish(self, future: asyncio.Future, started: float) -> None:
+        try:
+            self._predictor = await future
+        except Exception as e:
+            self.state = ModelState.failed
+            self.error = str(e)
+            logger.error(f"Model: failed to load: {e}", exc_info=True)
+            return
+
+        self.load_seconds = round(time.monotonic() - started, 2)
+        self.state = ModelState.ready
+        logger.info(f"Model: ready in {self.load_seconds}s")
+
+    async def wait_until_loaded(self) -> None:
+        """Wait for an in-progress load to finish (ready or failed)."""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def stop(self) -> None:
+        """Stop the batcher thread. A load still in progress is abandoned."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        if self._predictor is not None:
+            self._predictor.batcher.close()
+
+    def _build(self) -> "Predictor":
+        """Load the model and warm it up (runs on a worker thread)."""
+        # Deferred import: keeps TensorFlow out of app import time
+        from app.services.predictor import Predictor
+
+        predictor = Predictor(self.model_path, model_version=self.model_version)
+        self._warm_up(predictor)
+        return predictor
+
+    @staticmethod
+    def _warm_up(predictor: "Predictor") -> None:
+        """One synthetic forward pass per batch size the batcher dispatches."""
+        for size in predictor.batcher.buckets:
+            started = time.monotonic()
+            predictor.batcher.predict_fn(np.zeros((size, *INPUT_SHAPE), dtype=np.float32))
+            logger.info(
+                f"Model: warm-up batch of {size} took {time.monotonic() - started:.2f}s"
+            )
+
+    def status(self) -> dict:
+        """Readiness details for /health/ready."""
+        return {
+            "state": self.state.value,
+            "model_version": self.model_version,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+model_service = ModelService()
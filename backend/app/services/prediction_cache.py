@@ -0,0 +1,130 @@
+"""
+app/services/prediction_cache.py — Content-addressed prediction cache
+
+Clinicians often re-upload the same scan. Results are cached under two
+content addresses, both scoped by model_version so a model upgrade never
+serves stale results:
+
+    bytes  — sha256 of the raw upload; checked before any inference work
+    tensor — sha256 of the preprocessed VGG16 input; catches re-encodes
+             (same pixels saved as a different file) before the forward pass
+
+Bounded LRU with a TTL. Thread-safe: lookups happen on the event loop and
+inserts happen on inference pool threads.
+
+Usage:
+    from app.services.prediction_cache import prediction_cache
+
+    key = prediction_cache.hash_bytes(file_bytes)
+    result = prediction_cache.get("vgg16_v1", key, kind="bytes")
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ── Cache config ───────────────────────────────────────────────────────
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "2048"))  # entries
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))  # seconds
+
+CACHE_KINDS = ("bytes", "tensor")
+
+
+class PredictionCache:
+    """Bounded LRU + TTL map of (model_version, kind, digest) → result dict."""
+
+    def __init__(
+        self,
+        max_entries: int = PREDICTION_CACHE_SIZE,
+        ttl_seconds: float = PREDICTION_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = {
+            kind: metrics.counter(f"prediction_cache_{kind}_hits") for kind in CACHE_KINDS
+        }
+        self._misses = {
+            kind: metrics.counter(f"prediction_cache_{kind}_misses")
+            for kind in CACHE_KINDS
+        }
+        self._evictions = metrics.counter("prediction_cache_evictions")
+
+    # ══════════════════════════════════════════════════════════════════
+    #  KEYS
+    # ══════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """Content address of a raw upload."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_tensor(array: np.ndarray) -> str:
+        """Content address of a preprocessed tensor (shape and dtype included)."""
+        digest = hashlib.sha256(f"{array.shape}|{array.dtype}|".encode())
+        digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    # ══════════════════════════════════════════════════════════════════
+    #  LOOKUP / STORE
+    # ══════════════════════════════════════════════════════════════════
+
+    def get(self, model_version: str, digest: str, kind: str = "bytes") -> Optional[dict]:
+        """Return a copy of the cached result, or None on a miss/expiry."""
+        if self.max_entries <= 0:
+            return None
+
+        key = (model_version, kind, digest)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits[kind].inc()
+                    return dict(result)
+                del self._entries[key]
+
+        self._misses[kind].inc()
+        return None
+
+    def put(self, model_version: str, digest: str, result: dict, kind: str = "bytes") -> None:
+        """Store a result, evicting the least recently used entry if full."""
+        if self.max_entries <= 0:
+            return
+
+        key = (model_version, kind, digest)
+        expires_at = time.monotonic() + self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (expires_at, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+prediction_cache = PredictionCache()
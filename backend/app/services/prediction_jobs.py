@@ -0,0 +1,201 @@
+"""
+app/services/prediction_jobs.py — Background prediction jobs
+
+Large studies on slow CPUs can outlive proxy timeouts, so clients may
+submit them as a job instead: the upload is stored, a job row is created,
+and the request returns a job id immediately. A small pool of asyncio
+worker tasks picks jobs off a queue and runs them through the normal
+inference path, recording progress and the final result on the job row.
+
+Persistence:
+    - Job state lives in the prediction_jobs table.
+    - Uploaded slices live under JOB_STORAGE_DIR/<job_id>/ until the job
+      finishes (the backend_uploads Docker volume).
+    - On startup, queued jobs — and jobs that were mid-run when the process
+      stopped — are put back on the queue, so a restart loses no work.
+
+Assumes a single app process owns the queue (the Dockerfile runs one
+uvicorn worker); claiming a job is still atomic, so two processes never
+run the same job twice.
+
+Usage:
+    from app.services.prediction_jobs import job_runner
+
+    # main.py lifespan
+    await job_runner.start(handler)   # handler(job) saves + completes; see JobHandler
+    await job_runner.stop()
+
+    # endpoint
+    path = job_runner.store_inputs(job_id, slices)
+    await job_runner.enqueue(job_id)
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.crud import prediction_job as crud_job
+from app.database.database import SessionLocal
+from app.database.models import JobStatus, PredictionJob
+from app.utils.file_validator import sanitize_filename
+
+logger = logging.getLogger(__name__)
+
+# ── Job config ─────────────────────────────────────────────────────────
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_STORAGE_DIR = os.getenv("JOB_STORAGE_DIR", "uploads/jobs")
+
+# The handler marks the job completed itself (crud_job.complete_job_async),
+# in the same transaction as the rows it writes, so a crash can't leave
+# results saved for a job that will be resumed and run again
+JobHandler = Callable[[PredictionJob], Awaitable[Any]]
+
+
+class JobRunner:
+    """Queue + worker tasks for background prediction jobs."""
+
+    def __init__(self, workers: int = JOB_WORKERS, storage_dir: str = JOB_STORAGE_DIR):
+        self.workers = max(1, workers)
+        self.storage_dir = Path(storage_dir)
+
+        self._handler: Optional[JobHandler] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    # ══════════════════════════════════════════════════════════════════
+    #  INPUT STORAGE
+    # ══════════════════════════════════════════════════════════════════
+
+    def store_inputs(self, job_id: str, slices: List[Tuple[str, bytes]]) -> str:
+        """Write a job's slices to disk. Returns the job's storage path."""
+        job_dir = self.storage_dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+
+        for index, (name, data) in enumerate(slices):
+            # Index prefix keeps slice order and makes duplicate names unique
+            (job_dir / f"{index:04d}_{sanitize_filename(name)}").write_bytes(data)
+
+        return str(job_dir)
+
+    @staticmethod
+    def load_inputs(storage_path: str) -> List[Tuple[str, bytes]]:
+        """Read a job's slices back in their original order."""
+        return [
+            (path.name.split("_", 1)[1], path.read_bytes())
+            for path in sorted(Path(storage_path).iterdir())
+        ]
+
+    @staticmethod
+    def remove_inputs(storage_path: str) -> None:
+        shutil.rmtree(storage_path, ignore_errors=True)
+
+    # ══════════════════════════════════════════════════════════════════
+    #  LIFECYCLE
+    # ══════════════════════════════════════════════════════════════════
+
+    async def start(self, handler: JobHandler) -> None:
+        """Resume unfinished jobs and start the worker tasks."""
+        if self.is_running:
+            return
+
+        self._handler = handler
+        self._queue = asyncio.Queue()
+
+        unfinished = await self.run_in_session(crud_job.get_unfinished_jobs)
+        for job in unfinished:
+            if job.status == JobStatus.running:
+                # Interrupted mid-run by a restart — start it over
+                await self.run_in_session(crud_job.requeue_job, job.id)
+            self._queue.put_nowait(job.id)
+
+        if unfinished:
+            logger.info(f"Jobs: resumed {len(unfinished)} unfinished job(s)")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"prediction-job-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Jobs: started {self.workers} worker(s)")
+
+    async def stop(self) -> None:
+        """Cancel the workers. Interrupted jobs are resumed on next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Jobs: workers stopped")
+
+    async def enqueue(self, job_id: str) -> None:
+        """Hand a queued job to the workers."""
+        if self._queue is None:
+            # Not started (e.g. during tests) — it stays queued in the DB
+            # and is picked up on the next start()
+            logger.warning(f"Jobs: runner not started, job {job_id} left queued")
+            return
+        await self._queue.put(job_id)
+
+    # ══════════════════════════════════════════════════════════════════
+    #  EXECUTION
+    # ══════════════════════════════════════════════════════════════════
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: str) -> None:
+        """Claim and run one job, recording its result or failure."""
+        if not await self.run_in_session(crud_job.claim_job, job_id):
+            return
+
+        job = await self.run_in_session(crud_job.get_job, job_id)
+        logger.info(f"Jobs: running {job_id} ({job.total_slices} slices)")
+
+        try:
+            await self._handler(job)
+        except asyncio.CancelledError:
+            # Shutdown — leave it 'running' so start() requeues it
+            raise
+        except Exception as e:
+            logger.exception(f"Jobs: {job_id} failed")
+            await self.run_in_session(crud_job.fail_job, job_id, str(e))
+        else:
+            logger.info(f"Jobs: {job_id} completed")
+
+        await run_in_threadpool(self.remove_inputs, job.storage_path)
+
+    async def report_progress(self, job_id: str, completed_slices: int) -> None:
+        await self.run_in_session(crud_job.update_job_progress, job_id, completed_slices)
+
+    async def fetch(self, job_id: str, user_id: int) -> Optional[PredictionJob]:
+        """Load a job in a fresh session (for polling and SSE)."""
+        return await self.run_in_session(crud_job.get_job, job_id, user_id)
+
+    @staticmethod
+    async def run_in_session(fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(db, *args) with its own session, off the event loop."""
+
+        def call():
+            db = SessionLocal()
+            try:
+                return fn(db, *args)
+            finally:
+                db.close()
+
+        return await run_in_threadpool(call)
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+job_runner = JobRunner()
@@ -1,7 +1,20 @@
 import logging
+from concurrent.futures import Future
+from typing import Any, List, NamedTuple, Optional, Tuple
 import numpy as np
 from app.services.model_loader import ModelLoader
-from app.services.preprocessing import Pre_processing_image
+from app.services.preprocessing import Pre_processing_image, ImageSource
+from app.services.batching import InferenceBatcher
+from app.services.prediction_cache import PredictionCache, prediction_cache
+
+
+class PendingBatch(NamedTuple):
+    """A submitted batch: results known so far (invalid input, cache hits,
+    preprocessing errors) plus the batcher futures still to collect."""
+    results: List[Optional[dict]]
+    pending: List[Tuple[int, Optional[str], Future]]  # (index, tensor_hash, future)
+    names: List[str]
+    content_hashes: List[Optional[str]]
 
 
 class Predictor:
@@ -11,61 +24,186 @@ class Predictor:
     PREDICTION_THRESHOLD = 0.5
     UNCERTAINTY_LOW = 0.35
     UNCERTAINTY_HIGH = 0.65
-    
-    def __init__(self, model_path: str):
+
+    def __init__(
+        self,
+        model_path: str,
+        model_version: str = "vgg16_v1",
+        cache: Optional[PredictionCache] = prediction_cache,
+    ):
         self.model_loader = ModelLoader(model_path)
         self.model = self.model_loader.load()
+        self.model_version = model_version
+        self.cache = cache
 
-    def predict_img(self, image_path: str) -> dict:
-        """Make a prediction on an image."""
-        
-        try:
-            # Preprocess and validate
-            img_array, validation_warnings = Pre_processing_image(image_path)
-            
-            # If image failed validation (e.g., too colorful), reject it
-            if validation_warnings.get("is_color_image"):
-                return {
-                    "label": "Invalid Input",
-                    "confidence": 0.0,
-                    "message": "Please upload a grayscale MRI/CT scan, not a color photograph",
-                    "valid_scan": False
-                }
-            
-            # Run prediction
-            preds = self.model.predict(img_array, verbose=0)
-            confidence = float(preds[0][0])
-            
-            # Check if model is uncertain (prediction near 0.5)
-            if self.UNCERTAINTY_LOW < confidence < self.UNCERTAINTY_HIGH:
-                return {
-                    "label": "Uncertain",
-                    "confidence": round(confidence, 4),
-                    "message": "Model is uncertain - image may not be a valid MRI scan",
-                    "valid_scan": False
-                }
-            
-            # Confident prediction
-            if confidence >= self.PREDICTION_THRESHOLD:
-                label = "Tumor"
-                final_confidence = confidence
-            else:
-                label = "No Tumor"
-                final_confidence = 1 - confidence  # Flip for "No Tumor" confidence
-            
-            logging.info(f"Prediction: {label} ({final_confidence:.4f}) for {image_path}")
+        # Concurrent predict_img calls share batched forward passes; padding
+        # to bucket sizes keeps the set of input shapes small and warmable
+        self.batcher = InferenceBatcher(
+            lambda batch: self.model.predict(batch, verbose=0),
+            pad_to_buckets=True,
+        )
 
-            return {
-                "label": label,
-                "confidence": round(final_confidence, 4),
-                "valid_scan": True
-            }
+    def predict_img(
+        self,
+        image: ImageSource,
+        name: str = "<upload>",
+        content_hash: Optional[str] = None,
+    ) -> dict:
+        """Make a prediction on a decoded upload, path, raw bytes or buffer.
+
+        content_hash is the caller's hash of the raw upload. When given, the
+        result is also cached under it so the next identical upload skips
+        preprocessing entirely.
+        """
+        return self.predict_batch([image], [name], [content_hash])[0]
+
+    def predict_batch(
+        self,
+        images: List[ImageSource],
+        names: Optional[List[str]] = None,
+        content_hashes: Optional[List[Optional[str]]] = None,
+    ) -> List[dict]:
+        """Predict many images, e.g. the slices of one MRI study.
+
+        Every tensor is queued on the batcher before waiting on any of them,
+        so a study runs as real batched forward passes. Failures are
+        reported per image and never abort the rest of the batch.
+
+        Blocks the calling thread until the forward passes finish. Async
+        callers should use submit_batch() on a worker thread and await the
+        futures instead, so no thread is held while the batch fills.
+        """
+        batch = self.submit_batch(images, names, content_hashes)
+        outputs = []
+        for _, _, future in batch.pending:
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                outputs.append(e)
+        return self.collect(batch, outputs)
+
+    def submit_batch(
+        self,
+        images: List[ImageSource],
+        names: Optional[List[str]] = None,
+        content_hashes: Optional[List[Optional[str]]] = None,
+    ) -> PendingBatch:
+        """Preprocess every image and queue the uncached tensors on the
+        batcher. Returns without waiting for the forward passes."""
+        names = names or [f"<upload {i}>" for i in range(len(images))]
+        content_hashes = content_hashes or [None] * len(images)
+
+        results: List[Optional[dict]] = [None] * len(images)
+        pending = []  # (index, tensor_hash, future)
+
+        for i, image in enumerate(images):
+            try:
+                result, tensor_hash, img_array = self._prepare(
+                    image, names[i], content_hashes[i]
+                )
+                if result is not None:
+                    results[i] = result
+                    continue
+
+                # Run prediction (coalesced with concurrent requests)
+                pending.append((i, tensor_hash, self.batcher.submit_async(img_array)))
+
+            except Exception as e:
+                results[i] = self._error(names[i], e)
+
+        return PendingBatch(results, pending, names, content_hashes)
+
+    def collect(self, batch: PendingBatch, outputs: List[Any]) -> List[dict]:
+        """Fill in a submitted batch from its futures' outputs (prediction
+        rows, or the exception a future raised), in batch.pending order."""
+        results = batch.results
+        for (i, tensor_hash, _), preds in zip(batch.pending, outputs):
+            name, content_hash = batch.names[i], batch.content_hashes[i]
+            try:
+                if isinstance(preds, BaseException):
+                    raise preds
+                result = self._interpret(float(preds[0][0]))
 
-        except Exception as e:
-            logging.exception(f"Prediction failed for {image_path}: {e}")
+                logging.info(
+                    f"Prediction: {result['label']} ({result['confidence']:.4f}) for {name}"
+                )
+
+                if self.cache is not None:
+                    self.cache.put(self.model_version, tensor_hash, result, kind="tensor")
+                    if content_hash:
+                        self.cache.put(self.model_version, content_hash, result)
+
+                results[i] = result
+
+            except Exception as e:
+                results[i] = self._error(name, e)
+
+        return results
+
+    def _prepare(
+        self, image: ImageSource, name: str, content_hash: Optional[str]
+    ) -> Tuple[Optional[dict], Optional[str], Optional[np.ndarray]]:
+        """Preprocess one image.
+
+        Returns (result, None, None) when no forward pass is needed (invalid
+        input or cache hit), otherwise (None, tensor_hash, img_array).
+        """
+        # Preprocess and validate
+        img_array, validation_warnings = Pre_processing_image(image)
+
+        # If image failed validation (e.g., too colorful), reject it
+        if validation_warnings.get("is_color_image"):
             return {
-                "label": "Error",
+                "label": "Invalid Input",
                 "confidence": 0.0,
-                "message": str(e),
+                "message": "Please upload a grayscale MRI/CT scan, not a color photograph",
+                "valid_scan": False
+            }, None, None
+
+        # Re-encoded copy of a scan we've already seen? Skip the forward pass
+        tensor_hash = None
+        if self.cache is not None:
+            tensor_hash = self.cache.hash_tensor(img_array)
+            cached = self.cache.get(self.model_version, tensor_hash, kind="tensor")
+            if cached is not None:
+                logging.info(f"Prediction cache hit (tensor) for {name}")
+                if content_hash:
+                    self.cache.put(self.model_version, content_hash, cached)
+                return cached, None, None
+
+        return None, tensor_hash, img_array
+
+    @staticmethod
+    def _error(name: str, e: Exception) -> dict:
+        logging.exception(f"Prediction failed for {name}: {e}")
+        return {
+            "label": "Error",
+            "confidence": 0.0,
+            "message": str(e),
+            "valid_scan": False
+        }
+
+    def _interpret(self, confidence: float) -> dict:
+        """Turn the raw sigmoid output into the API result dict."""
+        # Check if model is uncertain (prediction near 0.5)
+        if self.UNCERTAINTY_LOW < confidence < self.UNCERTAINTY_HIGH:
+            return {
+                "label": "Uncertain",
+                "confidence": round(confidence, 4),
+                "message": "Model is uncertain - image may not be a valid MRI scan",
                 "valid_scan": False
-            }
\ No newline at end of file
+            }
+
+        # Confident prediction
+        if confidence >= self.PREDICTION_THRESHOLD:
+            label = "Tumor"
+            final_confidence = confidence
+        else:
+            label = "No Tumor"
+            final_confidence = 1 - confidence  # Flip for "No Tumor" confidence
+
+        return {
+            "label": label,
+            "confidence": round(final_confidence, 4),
+            "valid_scan": True
+        }
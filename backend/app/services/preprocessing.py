@@ -1,10 +1,19 @@
-from PIL import Image
 import numpy as np
+from typing import BinaryIO, Union
 from tensorflow.keras.applications.vgg16 import preprocess_input
 
+from app.utils.image_decoder import DecodedImage, decode_image
 
-def Pre_processing_image(image_path: str, target_size=(224, 224)):
-    """Preprocess image for VGG16 model with validation."""
+ImageSource = Union[DecodedImage, str, bytes, BinaryIO]
+
+
+def Pre_processing_image(image_source: ImageSource, target_size=(224, 224)):
+    """Preprocess image for VGG16 model with validation.
+
+    image_source is normally the DecodedImage produced by the upload
+    validator, so the pixels are not decoded a second time. A file path,
+    raw bytes or a binary buffer are also accepted and decoded here.
+    """
     
     warnings = {
         "is_color_image": False,
@@ -12,26 +21,26 @@ def Pre_processing_image(image_path: str, target_size=(224, 224)):
     }
     
     try:
-        img = Image.open(image_path)
-        original_mode = img.mode
+        if isinstance(image_source, DecodedImage):
+            decoded = image_source
+        else:
+            decoded = decode_image(image_source)
         
         # Check if image is "too colorful" to be an MRI
-        if original_mode in ("RGB", "RGBA"):
-            warnings["is_color_image"] = _is_color_photo(img)
-        
-        # Convert to RGB for VGG16
-        img = img.convert("RGB")
+        if decoded.mode in ("RGB", "RGBA"):
+            warnings["is_color_image"] = _is_color_photo(decoded)
         
     except Exception as e:
         raise ValueError(f"Error loading image: {e}")
 
-    img = img.resize(target_size)
+    # Already RGB for VGG16
+    img = decoded.image.resize(target_size)
 
     # PIL to Numpy array
     img_array = np.array(img, dtype=np.float32)
     
-    # Check contrast
-    if img_array.std() < 20:
+    # Check contrast (same cached statistics the validator already used)
+    if decoded.std < 20:
         warnings["low_contrast"] = True
 
     # Apply VGG16 preprocessing
@@ -43,31 +52,24 @@ def Pre_processing_image(image_path: str, target_size=(224, 224)):
     return img_array, warnings
 
 
-def _is_color_photo(img: Image.Image, threshold: float = 15.0) -> bool:
+def _is_color_photo(decoded: DecodedImage, threshold: float = 15.0) -> bool:
     """
     Detect if an image is a color photograph vs grayscale medical scan.
     
     MRI/CT scans are grayscale, so R ≈ G ≈ B for every pixel.
     Color photos have significant differences between channels.
+
+    Both statistics come from decoded.stats: one integer-domain pass over
+    a bounded sample, never a full-resolution float copy.
     """
-    rgb_array = np.array(img.convert("RGB"), dtype=np.float32)
-    
-    r = rgb_array[:, :, 0]
-    g = rgb_array[:, :, 1]
-    b = rgb_array[:, :, 2]
-    
     # Calculate color variance across channels
     # For grayscale images, this should be near 0
-    channel_means = [r.mean(), g.mean(), b.mean()]
-    color_variance = np.std(channel_means)
+    color_variance = np.std(decoded.channel_means)
     
     # Also check per-pixel color difference
-    rg_diff = np.abs(r - g).mean()
-    rb_diff = np.abs(r - b).mean()
-    gb_diff = np.abs(g - b).mean()
-    avg_channel_diff = (rg_diff + rb_diff + gb_diff) / 3
+    avg_channel_diff = decoded.mean_channel_diff
     
     # If channels differ significantly, it's a color image
     is_color = color_variance > threshold or avg_channel_diff > threshold
     
-    return is_color
\ No newline at end of file
+    return is_color
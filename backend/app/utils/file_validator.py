@@ -1,14 +1,37 @@
-from PIL import Image
 from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
 import io
-import numpy as np
 import os
 import re
+import zipfile
+
+from PIL import Image
+
+from app.utils.image_decoder import DecodedImage, ImageTooLargeError, decode_image
+from app.utils.volume_decoder import (
+    VOLUME_SNIFF_BYTES,
+    decode_volume,
+    sniff_volume_format,
+)
 
 
 
 # Upload limits
 MAX_FILE_SIZE = 10 * 1024 * 1024  # bytes
+MAX_VOLUME_FILE_SIZE = int(os.getenv("MAX_VOLUME_FILE_SIZE", str(100 * 1024 * 1024)))  # DICOM / NIfTI
+
+# Batch (multi-slice study) limits
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "64"))  # slices per request
+MAX_ZIP_FILE_SIZE = 100 * 1024 * 1024  # bytes, compressed archive
+MAX_BATCH_TOTAL_SIZE = 200 * 1024 * 1024  # bytes, all slices uncompressed
+
+# Request body limits enforced by BodySizeLimitMiddleware (multipart
+# framing adds a little on top of the file itself)
+MULTIPART_OVERHEAD = 64 * 1024  # bytes
+MAX_REQUEST_BODY = int(os.getenv("MAX_REQUEST_BODY", str(1024 * 1024)))  # non-upload routes
+MAX_UPLOAD_REQUEST_SIZE = max(MAX_FILE_SIZE, MAX_VOLUME_FILE_SIZE) + MULTIPART_OVERHEAD
+MAX_BATCH_REQUEST_SIZE = MAX_BATCH_TOTAL_SIZE + MAX_BATCH_FILES * MULTIPART_OVERHEAD
 
 
 # Image geometry constraints
@@ -21,44 +44,172 @@ MAX_HEIGHT = 5000
 
 ALLOWED_FORMATS = {"PNG", "JPEG", "BMP", "WEBP"}
 
-async def validate_image_file(file: UploadFile) -> bytes:
-    # Step 1: File size
+
+class ScanSlice(NamedTuple):
+    """One 2D slice of an upload: decoded, or the reason it was rejected.
+
+    file_size is the size of the whole upload the slice came from.
+    """
+    name: str
+    decoded: Optional[DecodedImage]
+    error: Optional[HTTPException]
+    file_size: int
+
+
+async def validate_scan_file(file: UploadFile) -> List[ScanSlice]:
+    """
+    Validate an upload that may be an image, a DICOM file or a NIfTI volume.
+
+    Plain images go through validate_image_file and come back as a single
+    slice (invalid images raise, as before). DICOM / NIfTI uploads are
+    recognised from their leading bytes and expanded into slices; slices
+    failing the per-slice checks carry their error instead of failing the
+    whole volume.
+    """
+    filename = file.filename or "upload"
+    file_size = upload_size(file, max_size=MAX_VOLUME_FILE_SIZE)
+
+    head = file.file.read(VOLUME_SNIFF_BYTES)
+    file.file.seek(0)
+    if sniff_volume_format(head, filename) is None:
+        return [ScanSlice(filename, await validate_image_file(file), None, file_size)]
+
+    data = await read_upload(file, max_size=MAX_VOLUME_FILE_SIZE, file_size=file_size)
+    return await run_in_threadpool(decode_scan, data, filename)
+
+
+def decode_scan(data: bytes, filename: str) -> List[ScanSlice]:
+    """Decode raw upload bytes into slices (see validate_scan_file).
+
+    Raises HTTPException when the file as a whole is invalid.
+    """
+    volume_format = sniff_volume_format(data[:VOLUME_SNIFF_BYTES], filename)
+    if volume_format is None:
+        return [ScanSlice(filename, validate_image_bytes(data), None, len(data))]
+
+    try:
+        volume = decode_volume(data, volume_format, filename)
+    except ImportError:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Unsupported format: {volume_format} support is not installed"
+        )
+    except ImageTooLargeError as e:
+        # Checked from the header, before the pixel data is expanded
+        raise HTTPException(status_code=413, detail=f"{volume_format} volume too large: {e}")
+    except Exception:
+        raise HTTPException(status_code=402, detail=f"Invalid {volume_format} file")
+
+    slices = []
+    for name, decoded in volume:
+        try:
+            check_slice(decoded)
+            slices.append(ScanSlice(name, decoded, None, len(data)))
+        except HTTPException as e:
+            slices.append(ScanSlice(name, None, e, len(data)))
+    return slices
+
+
+def check_slice(decoded: DecodedImage) -> None:
+    """Dimension and contrast checks for a slice extracted from a volume."""
+    width, height = decoded.size
+
+    if width < MIN_WIDTH or height < MIN_HEIGHT:
+        raise HTTPException(status_code=404, detail="Image too small")
+
+    if width > MAX_WIDTH or height > MAX_HEIGHT:
+        raise HTTPException(status_code=405, detail="Image too large")
+
+    if decoded.std < 5:
+        raise HTTPException(
+            status_code=408,
+            detail="Low-contrast or invalid medical scan"
+        )
+
+
+async def validate_image_file(file: UploadFile) -> DecodedImage:
+    """
+    Validate an upload and return it decoded.
+
+    The returned DecodedImage (raw bytes, pixels, format, mode, stats) is
+    handed on to preprocessing so the image is only decoded once. Decoding
+    runs on a worker thread so large uploads don't block the event loop.
+
+    Format and dimensions are checked from the image header first, so a
+    wrong-format or out-of-range upload is rejected before its body is
+    read into memory or decoded.
+    """
+    file_size = upload_size(file)
+    await run_in_threadpool(check_image_header, file.file)
+    file_content = await read_upload(file, file_size=file_size)
+    return await run_in_threadpool(validate_image_bytes, file_content)
+
+
+def upload_size(file: UploadFile, max_size: int = MAX_FILE_SIZE) -> int:
+    """Size of a spooled upload (seek, no read), rejecting empty/oversize."""
     file.file.seek(0, 2)
     file_size = file.file.tell()
     file.file.seek(0)
-    print("file_size")
+
     if file_size == 0:
         raise HTTPException(status_code=200, detail="Empty file uploaded")
 
-    if file_size > MAX_FILE_SIZE:
+    if file_size > max_size:
         raise HTTPException(
             status_code=413,
-            detail="File too large (max 10MB)"
+            detail=f"File too large (max {max_size // (1024 * 1024)}MB)"
         )
 
-    # Step 2: Read content
-    file_content = await file.read()
+    return file_size
+
+
+async def read_upload(
+    file: UploadFile, max_size: int = MAX_FILE_SIZE, file_size: Optional[int] = None
+) -> bytes:
+    """Read a spooled upload into memory after checking its size."""
+    # Step 1: File size
+    if file_size is None:
+        file_size = upload_size(file, max_size)
+
+    # Step 2: Read content (never more than the checked size)
+    file_content = await file.read(file_size + 1)
 
     if len(file_content) != file_size:
         raise HTTPException(status_code=401, detail="Incomplete upload")
 
-    # Step 3: Open image (REAL validation)
+    return file_content
+
+
+def check_image_header(source: BinaryIO) -> None:
+    """
+    Validate format and dimensions from the image header alone.
+
+    Image.open is lazy: it reads just enough bytes to identify the format
+    and size, and no pixel data is decoded. The stream is rewound after.
+    """
+    position = source.tell()
     try:
-        img = Image.open(io.BytesIO(file_content))
-        img.verify()
-        img = Image.open(io.BytesIO(file_content))
+        with Image.open(source) as img:
+            image_format, size = img.format, img.size
     except Exception:
         raise HTTPException(status_code=402, detail="Invalid image file")
+    finally:
+        source.seek(position)
+
+    check_image_geometry(image_format, size)
+
 
-    # Step 4: Format validation (replacement for magic)
-    if img.format not in ALLOWED_FORMATS:
+def check_image_geometry(image_format: Optional[str], size: Tuple[int, int]) -> None:
+    """Format and dimension rules shared by the header and full checks."""
+    # Format validation (replacement for magic)
+    if image_format not in ALLOWED_FORMATS:
         raise HTTPException(
             status_code=403,
-            detail=f"Unsupported format: {img.format}"
+            detail=f"Unsupported format: {image_format}"
         )
 
-    # Step 5: Medical constraints
-    width, height = img.size
+    # Medical constraints
+    width, height = size
 
     if width < MIN_WIDTH or height < MIN_HEIGHT:
         raise HTTPException(status_code=404, detail="Image too small")
@@ -66,6 +217,24 @@ async def validate_image_file(file: UploadFile) -> bytes:
     if width > MAX_WIDTH or height > MAX_HEIGHT:
         raise HTTPException(status_code=405, detail="Image too large")
 
+
+def validate_image_bytes(file_content: bytes) -> DecodedImage:
+    """Decode raw upload bytes once and apply the image checks."""
+    # Step 3: Header checks — format and dimensions before any decoding
+    check_image_header(io.BytesIO(file_content))
+
+    # Step 4: Decode image (REAL validation — a full decode catches
+    # corrupt or truncated data)
+    try:
+        img = decode_image(file_content)
+    except ImageTooLargeError:
+        raise HTTPException(status_code=405, detail="Image too large")
+    except Exception:
+        raise HTTPException(status_code=402, detail="Invalid image file")
+
+    # Step 5: Re-check against the decoded image
+    check_image_geometry(img.format, img.size)
+
     # MRI/CT-specific checks
     """if img.mode not in ("L", "I;16", "I"):
         raise HTTPException(
@@ -81,14 +250,95 @@ async def validate_image_file(file: UploadFile) -> bytes:
         )"""
 
     # Intensity sanity check
-    pixels = np.array(img)
-    if pixels.std() < 5:
+    if img.std < 5:
         raise HTTPException(
             status_code=408,
             detail="Low-contrast or invalid medical scan"
         )
 
-    return file_content
+    return img
+
+
+async def read_batch_uploads(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """
+    Read a multi-slice upload into (filename, bytes) pairs.
+
+    Each upload may be a single image, a DICOM / NIfTI file or a .zip of
+    images or DICOM files. Archive members are size-checked against their
+    headers before being decompressed, so a zip bomb is rejected without
+    being expanded. Volumes are expanded into slices later, by decode_scan.
+    """
+    slices: List[Tuple[str, bytes]] = []
+
+    for file in files:
+        content = await read_upload(file, max_size=MAX_ZIP_FILE_SIZE)
+        if zipfile.is_zipfile(io.BytesIO(content)):
+            slices.extend(await run_in_threadpool(extract_zip_images, content))
+        elif len(content) > MAX_FILE_SIZE and (
+            len(content) > MAX_VOLUME_FILE_SIZE
+            or sniff_volume_format(content[:VOLUME_SNIFF_BYTES], file.filename or "") is None
+        ):
+            raise HTTPException(
+                status_code=413,
+                detail=f"{sanitize_filename(file.filename or 'upload')}: file too large (max 10MB)"
+            )
+        else:
+            slices.append((file.filename or "upload", content))
+
+        if len(slices) > MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many images in one study (max {MAX_BATCH_FILES})"
+            )
+
+    if not slices:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+
+    if sum(len(data) for _, data in slices) > MAX_BATCH_TOTAL_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Study too large (max {MAX_BATCH_TOTAL_SIZE // (1024 * 1024)}MB uncompressed)"
+        )
+
+    return slices
+
+
+def extract_zip_images(content: bytes) -> List[Tuple[str, bytes]]:
+    """Extract image files from a zip archive, enforcing the batch limits."""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not os.path.basename(info.filename).startswith(".")
+        and not info.filename.startswith("__MACOSX/")
+    ]
+
+    if len(members) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images in one study (max {MAX_BATCH_FILES})"
+        )
+
+    # Trust nothing until the declared sizes add up
+    if any(info.file_size > MAX_FILE_SIZE for info in members):
+        raise HTTPException(status_code=413, detail="Zip member too large (max 10MB)")
+    if sum(info.file_size for info in members) > MAX_BATCH_TOTAL_SIZE:
+        raise HTTPException(status_code=413, detail="Zip archive expands too large")
+
+    slices = []
+    for info in sorted(members, key=lambda m: m.filename):
+        with archive.open(info) as member:
+            # Read one byte past the limit in case the header lied
+            data = member.read(MAX_FILE_SIZE + 1)
+        if len(data) > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="Zip member too large (max 10MB)")
+        slices.append((os.path.basename(info.filename), data))
+
+    return slices
 
 
 def sanitize_filename(filename: str) -> str:
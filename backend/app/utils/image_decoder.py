@@ -0,0 +1,244 @@
+"""
+app/utils/image_decoder.py — Decode an uploaded image exactly once
+
+An upload used to be decoded up to five times (verify, re-open, contrast
+check, preprocessing, color check). DecodedImage holds the single decoded
+RGB image plus the header facts (format, original mode, size) and lazily
+computed pixel statistics, and is passed from the validator through the
+color/contrast checks into VGG16 preprocessing.
+
+Pixel statistics (contrast and colour checks) are computed in one pass
+over a nearest-neighbour sample of at most IMAGE_STATS_MAX_SAMPLES pixels,
+in row chunks with integer accumulators. A 5000×5000 upload costs a few
+MB of temporaries instead of several hundred MB of float32 copies.
+
+The model only needs 224×224, so large scans are decoded at reduced
+resolution: JPEG via draft mode (the DCT decoder scales by 1/2–1/8 as it
+decodes), other formats via Image.reduce before the RGB conversion. Each
+image must also fit the MAX_DECODE_PIXELS budget, checked from the header
+before any pixel is decoded.
+
+Usage:
+    decoded = decode_image(file_bytes)
+    decoded.format, decoded.mode, decoded.size
+    decoded.std                 # intensity spread, computed on first access
+    decoded.image.resize((224, 224))
+"""
+
+import io
+import math
+import os
+from functools import cached_property
+from typing import BinaryIO, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# ── Statistics config ──────────────────────────────────────────────────
+# Pixels sampled for std / colour statistics (0 = use every pixel)
+IMAGE_STATS_MAX_SAMPLES = int(os.getenv("IMAGE_STATS_MAX_SAMPLES", "262144"))  # ~512×512
+STATS_CHUNK_ROWS = 64
+
+# ── Decode config ──────────────────────────────────────────────────────
+# Reduced decodes keep at least this many pixels per side (2× the model
+# input, so the final resize still has real detail to work with)
+DECODE_MIN_SIDE = int(os.getenv("IMAGE_DECODE_MIN_SIDE", "448"))
+# Largest image (width × height) decoded per upload or slice
+MAX_DECODE_PIXELS = int(os.getenv("MAX_DECODE_PIXELS", str(5000 * 5000)))
+
+# Modes whose decoded RGB has R == G == B for every pixel
+GRAYSCALE_MODES = {"1", "L", "LA", "I", "I;16", "F"}
+
+
+class ImageTooLargeError(ValueError):
+    """The image header declares more pixels than the decode budget."""
+
+
+class ImageStats(NamedTuple):
+    std: float                                      # over all pixel values
+    channel_means: Tuple[float, float, float]       # R, G, B
+    mean_channel_diff: float                        # mean of |R-G|, |R-B|, |G-B|
+    samples: int                                    # pixels actually visited
+
+
+def compute_stats(
+    pixels: np.ndarray, grayscale: bool = False, chunk_rows: int = STATS_CHUNK_ROWS
+) -> ImageStats:
+    """Single pass over a uint8 (H, W, 3) array in row chunks.
+
+    Sums, sums of squares and channel differences are accumulated as
+    integers, so the results are exact and each chunk's temporaries stay
+    small. For grayscale sources only one channel is read.
+    """
+    height, width = pixels.shape[:2]
+    channels = 1 if grayscale else 3
+
+    channel_sums = np.zeros(channels, dtype=np.int64)
+    sum_sq = 0
+    diff_sum = 0
+
+    for start in range(0, height, chunk_rows):
+        chunk = pixels[start : start + chunk_rows, :, :channels].astype(np.int32)
+        channel_sums += chunk.sum(axis=(0, 1))
+        sum_sq += int(np.einsum("ijk,ijk->", chunk, chunk, dtype=np.int64))
+        if not grayscale:
+            r, g, b = chunk[:, :, 0], chunk[:, :, 1], chunk[:, :, 2]
+            diff_sum += int(
+                np.abs(r - g).sum() + np.abs(r - b).sum() + np.abs(g - b).sum()
+            )
+
+    n = height * width
+    values = n * channels
+    mean = int(channel_sums.sum()) / values
+    variance = max(sum_sq / values - mean * mean, 0.0)
+
+    if grayscale:
+        channel_means = (float(channel_sums[0]) / n,) * 3
+    else:
+        channel_means = tuple(float(c) / n for c in channel_sums)
+
+    return ImageStats(
+        std=math.sqrt(variance),
+        channel_means=channel_means,
+        mean_channel_diff=diff_sum / (3 * n),
+        samples=n,
+    )
+
+
+def sample_pixels(image: Image.Image, max_samples: int = IMAGE_STATS_MAX_SAMPLES) -> Image.Image:
+    """Every step-th pixel in both axes, with step chosen to fit max_samples.
+
+    Nearest-neighbour keeps the original pixel values (no averaging), so
+    noise and channel differences survive the subsampling.
+    """
+    width, height = image.size
+    if not max_samples or width * height <= max_samples:
+        return image
+    step = math.ceil(math.sqrt(width * height / max_samples))
+    return image.resize((max(1, width // step), max(1, height // step)), Image.NEAREST)
+
+
+class DecodedImage:
+    """A fully decoded image and the statistics derived from its pixels."""
+
+    def __init__(
+        self,
+        image: Image.Image,
+        data: Optional[bytes] = None,
+        header: Optional[Tuple[Optional[str], str, Tuple[int, int]]] = None,
+        stats_sample: Optional[Image.Image] = None,
+    ):
+        # Header facts — read before any conversion or reduction. size is
+        # the original size; image.size may be smaller (reduced decode)
+        self.format, self.mode, self.size = header or (image.format, image.mode, image.size)
+
+        # Raw upload (kept for file size / hashing) and the one RGB decode
+        self.data = data
+        self.image: Image.Image = image if image.mode == "RGB" else image.convert("RGB")
+
+        # RGB pixel sample taken before any box reduction (which would
+        # average away the noise and contrast the stats are meant to see)
+        self.stats_sample = stats_sample
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    @cached_property
+    def pixels(self) -> np.ndarray:
+        """uint8 (H, W, 3) array of the RGB image. Converted once."""
+        return np.asarray(self.image)
+
+    @cached_property
+    def stats(self) -> ImageStats:
+        """Contrast / colour statistics from a bounded pixel sample."""
+        sample = self.stats_sample or sample_pixels(self.image)
+        return compute_stats(np.asarray(sample), grayscale=self.mode in GRAYSCALE_MODES)
+
+    @property
+    def std(self) -> float:
+        """Standard deviation over all pixel values (contrast check)."""
+        return self.stats.std
+
+    @property
+    def channel_means(self) -> Tuple[float, float, float]:
+        """Mean of the R, G and B channels."""
+        return self.stats.channel_means
+
+    @property
+    def mean_channel_diff(self) -> float:
+        """Average of the mean |R-G|, |R-B| and |G-B| per-pixel differences."""
+        return self.stats.mean_channel_diff
+
+
+def decode_image(
+    source: Union[bytes, str, BinaryIO],
+    min_side: int = DECODE_MIN_SIDE,
+    max_pixels: int = MAX_DECODE_PIXELS,
+) -> DecodedImage:
+    """
+    Open and fully decode an image from bytes, a path or a binary buffer.
+
+    Forcing the RGB conversion decodes every pixel, so truncated or corrupt
+    files raise here (this replaces the separate Image.verify() pass).
+
+    Images larger than needed are decoded at reduced resolution, keeping
+    both sides >= min_side (0 disables this). Raises ImageTooLargeError
+    if the header declares more than max_pixels pixels (0 = no budget).
+
+    Statistics for other formats are sampled from the full-resolution
+    image before Image.reduce, so pixel noise and contrast survive the
+    box filter. JPEG is different: draft mode never produces the full
+    image, so its statistics come from the DCT-scaled decode. That
+    averages away pixel-level noise (std can come out a little lower),
+    while the large-scale contrast and colour the checks look for are
+    kept — tests compare both decodes.
+    """
+    data = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+        source = io.BytesIO(data)
+
+    img = Image.open(source)
+    header = (img.format, img.mode, img.size)
+
+    width, height = img.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image has {width * height} pixels (max {max_pixels})"
+        )
+
+    if min_side and img.format == "JPEG":
+        # Scaled DCT decode: never materializes the full-resolution image
+        img.draft(img.mode, (min_side, min_side))
+
+    img.load()
+
+    stats_sample = None
+    if min_side:
+        reduced = _reduce(img, min_side)
+        if reduced is not img:
+            stats_sample = sample_pixels(img).convert("RGB")
+            img = reduced
+
+    return DecodedImage(img, data=data, header=header, stats_sample=stats_sample)
+
+
+def _reduce(img: Image.Image, min_side: int) -> Image.Image:
+    """Integer box-downscale so the smaller side stays >= min_side.
+
+    Done in the image's own mode, before the RGB conversion, so a large
+    grayscale scan is never expanded to full-resolution RGB.
+    """
+    factor = min(img.width // min_side, img.height // min_side)
+    if factor < 2:
+        return img
+
+    if img.mode not in ("L", "LA", "RGB", "RGBA", "I", "F"):
+        # Palette / bilevel / 16-bit modes can't be box-filtered directly
+        img = img.convert("RGB")
+    return img.reduce(factor)
@@ -0,0 +1,168 @@
+"""
+app/utils/metrics.py — In-process counters and histograms
+
+Small, dependency-free stand-in for a Prometheus client. Services register
+their metrics on the module-level `metrics` registry and the /metrics
+endpoint in main.py returns a JSON snapshot of everything registered.
+
+Usage:
+    from app.utils.metrics import metrics
+
+    batch_sizes = metrics.histogram("inference_batch_size", buckets=(1, 2, 4, 8))
+    batch_sizes.observe(3)
+
+    cache_hits = metrics.counter("prediction_cache_hits")
+    cache_hits.inc()
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Sequence, Union
+
+
+class Counter:
+    """Monotonically increasing counter. Thread-safe."""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "description": self.description, "value": self._value}
+
+
+class Gauge:
+    """Point-in-time value that can go up and down. Thread-safe."""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "description": self.description, "value": self._value}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus-style cumulative buckets).
+
+    Percentiles in the snapshot are bucket upper bounds, so they are an
+    upper estimate — good enough to compare tuning runs against each other.
+    """
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = ""):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def _percentile(self, counts: list, total: int, q: float) -> Union[float, str, None]:
+        if total == 0:
+            return None
+        rank = q * total
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            if running >= rank:
+                return bound
+        return "+Inf"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            total_sum = self._sum
+
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = total
+
+        return {
+            "type": "histogram",
+            "description": self.description,
+            "count": total,
+            "sum": round(total_sum, 6),
+            "mean": round(total_sum / total, 6) if total else None,
+            "p50": self._percentile(counts, total, 0.50),
+            "p90": self._percentile(counts, total, 0.90),
+            "p99": self._percentile(counts, total, 0.99),
+            "buckets": cumulative,
+        }
+
+
+class MetricsRegistry:
+    """Get-or-create registry so modules can share metrics by name."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Gauge, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Gauge(name, description)
+            return self._metrics[name]
+
+    def histogram(
+        self, name: str, buckets: Sequence[float], description: str = ""
+    ) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, buckets, description)
+            return self._metrics[name]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(items)}
+
+
+# ── Module-level singleton ─────────────────────────────────────────────
+metrics = MetricsRegistry()
@@ -0,0 +1,92 @@
+"""
+app/utils/pagination.py — Keyset (cursor) pagination
+
+OFFSET pagination makes the database walk and discard every skipped row,
+so page N costs O(N * page size). Keyset pagination instead remembers the
+sort key of the last row served and asks for rows strictly after it, which
+the (owner, timestamp, id) composite indexes answer with one range seek
+at any depth.
+
+The key is (timestamp, id): the id breaks ties between rows created in
+the same instant. Clients get it as an opaque, URL-safe token.
+
+Usage (CRUD):
+    query = query.where(keyset_before(Prediction, Prediction.created_at, cursor))
+               .order_by(Prediction.created_at.desc(), Prediction.id.desc())
+               .limit(limit + 1)
+
+Usage (endpoint):
+    key = decode_cursor(cursor)            # InvalidCursor → 400
+    page = Page.from_rows(rows, limit, lambda p: (p.created_at, p.id))
+    return {"items": page.items, "next_cursor": page.next_cursor}
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, literal, select, tuple_
+from sqlalchemy.orm import aliased
+
+# (timestamp, id) of the last row on the previous page
+CursorKey = Tuple[datetime, Any]
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination token can't be decoded."""
+
+
+def encode_cursor(timestamp: datetime, row_id: Any) -> str:
+    """Opaque token for the position after (timestamp, row_id)."""
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> CursorKey:
+    """Inverse of encode_cursor. Raises InvalidCursor for anything else."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset_before(model, sort_column, key: CursorKey):
+    """WHERE clause for rows after `key` in (sort_column DESC, id DESC) order.
+
+    The anchor row's stored timestamp is looked up by primary key rather
+    than compared against the decoded one: timestamps can come back from
+    the driver in a different precision or format than they are stored in
+    (SQLite's CURRENT_TIMESTAMP has no fractional part), which would break
+    ties. If the anchor row was deleted, the decoded timestamp is used.
+    """
+    timestamp, row_id = key
+    # Aliased so the subquery isn't correlated with the outer query's table
+    anchor_row = aliased(model)
+    anchor = (
+        select(getattr(anchor_row, sort_column.key))
+        .where(anchor_row.id == row_id)
+        .scalar_subquery()
+    )
+    return tuple_(sort_column, model.id) < tuple_(
+        func.coalesce(anchor, literal(timestamp, sort_column.type)), row_id
+    )
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+
+    @classmethod
+    def from_rows(
+        cls, rows: List[Any], limit: int, key: Callable[[Any], CursorKey]
+    ) -> "Page":
+        """Build a page from up to limit + 1 rows (the extra row only
+        signals that another page exists). key(row) -> (timestamp, id)."""
+        items = rows[:limit]
+        if len(rows) <= limit or not items:
+            return cls(items, None)
+        return cls(items, encode_cursor(*key(items[-1])))
@@ -0,0 +1,270 @@
+"""
+app/utils/volume_decoder.py — DICOM and NIfTI ingestion
+
+Scanners emit DICOM (one file per slice, or multi-frame) and NIfTI
+volumes. This module turns either into 8-bit axial slices wrapped in
+DecodedImage, so they enter the same validation → preprocessing → VGG16
+path as PNG/JPEG uploads.
+
+    raw bytes → sniff_volume_format → decode_volume → [(name, DecodedImage)]
+
+- Uncompressed NIfTI is never copied whole: the voxel array is a
+  zero-copy view over the upload buffer and only the selected slices are
+  materialized.
+- Rescale (slope/intercept), windowing and 8-bit normalization run
+  vectorized over the stack of selected slices.
+- Volumes contribute at most VOLUME_MAX_SLICES evenly spaced slices from
+  their central axial range (the ends are mostly skull base / vertex).
+- Sizes are checked from the header before any pixel data is expanded:
+  each slice against MAX_DECODE_PIXELS, the volume against
+  MAX_VOLUME_VOXELS (VolumeTooLargeError). A .nii.gz is only decompressed
+  as far as its header says the first 3D volume reaches, so a gzip bomb
+  can't expand past the budget, and a multi-frame DICOM decodes only the
+  selected frames.
+
+pydicom and nibabel are imported lazily, so the app runs without them —
+volume uploads then fail with ImportError, reported by the validator.
+
+Usage:
+    fmt = sniff_volume_format(data, filename)    # "DICOM" | "NIFTI" | None
+    if fmt:
+        slices = decode_volume(data, fmt, filename)
+"""
+
+import gzip
+import io
+import math
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_decoder import MAX_DECODE_PIXELS, DecodedImage, ImageTooLargeError
+
+# ── Volume config ──────────────────────────────────────────────────────
+VOLUME_MAX_SLICES = int(os.getenv("VOLUME_MAX_SLICES", "16"))
+VOLUME_SLICE_RANGE = (0.2, 0.8)  # central fraction of the axial axis
+AUTO_WINDOW_PERCENTILES = (0.5, 99.5)
+# Largest volume (width × height × slices) accepted per upload
+MAX_VOLUME_VOXELS = int(os.getenv("MAX_VOLUME_VOXELS", str(512 * 512 * 512)))
+
+# Enough leading bytes to recognise every supported format
+VOLUME_SNIFF_BYTES = 544
+
+VOLUME_FORMATS = {"DICOM", "NIFTI"}
+
+
+class VolumeTooLargeError(ImageTooLargeError):
+    """The volume header declares more pixels / voxels than the budget."""
+
+
+def check_volume_size(width: int, height: int, depth: int) -> None:
+    """Reject a volume from its declared geometry, before decoding it."""
+    if MAX_DECODE_PIXELS and width * height > MAX_DECODE_PIXELS:
+        raise VolumeTooLargeError(
+            f"Slices have {width * height} pixels (max {MAX_DECODE_PIXELS})"
+        )
+    if MAX_VOLUME_VOXELS and width * height * depth > MAX_VOLUME_VOXELS:
+        raise VolumeTooLargeError(
+            f"Volume has {width * height * depth} voxels (max {MAX_VOLUME_VOXELS})"
+        )
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  FORMAT DETECTION
+# ══════════════════════════════════════════════════════════════════════
+
+
+def sniff_volume_format(head: bytes, filename: str = "") -> Optional[str]:
+    """Identify DICOM / NIfTI from the leading bytes (and name, for .nii.gz)."""
+    # DICOM Part 10: 128-byte preamble, then "DICM"
+    if head[128:132] == b"DICM":
+        return "DICOM"
+
+    # NIfTI-1 (sizeof_hdr 348, magic at 344) and NIfTI-2 (540, magic at 4),
+    # in either byte order
+    if len(head) >= 348 and head[344:348] in (b"n+1\x00", b"ni1\x00"):
+        if 348 in (int.from_bytes(head[:4], "little"), int.from_bytes(head[:4], "big")):
+            return "NIFTI"
+    if len(head) >= 8 and head[4:8] in (b"n+2\x00", b"ni2\x00"):
+        return "NIFTI"
+
+    if head[:2] == b"\x1f\x8b" and filename.lower().endswith(".nii.gz"):
+        return "NIFTI"
+
+    return None
+
+
+def decode_volume(data: bytes, volume_format: str, filename: str) -> List[Tuple[str, DecodedImage]]:
+    """Decode a DICOM file or NIfTI volume into named 8-bit slices."""
+    if volume_format == "DICOM":
+        return decode_dicom(data, filename)
+    if volume_format == "NIFTI":
+        return decode_nifti(data, filename)
+    raise ValueError(f"Unknown volume format: {volume_format}")
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  DICOM
+# ══════════════════════════════════════════════════════════════════════
+
+
+def decode_dicom(data: bytes, filename: str) -> List[Tuple[str, DecodedImage]]:
+    """One slice per file (a series is uploaded as many files), or the
+    selected frames of a multi-frame object."""
+    import pydicom  # deferred import — optional dependency
+    from pydicom.pixels import iter_pixels
+
+    # Pixel data stays encoded until frames are asked for
+    ds = pydicom.dcmread(io.BytesIO(data))
+    frame_count = int(getattr(ds, "NumberOfFrames", 1) or 1)
+    check_volume_size(int(ds.Columns), int(ds.Rows), frame_count)
+
+    indices = select_slices(frame_count)
+    if frame_count == 1:
+        frames = ds.pixel_array[np.newaxis]
+    else:
+        # Decode only the selected frames, not the whole object
+        frames = np.stack(list(iter_pixels(ds, indices=indices)))
+
+    if int(getattr(ds, "SamplesPerPixel", 1)) > 1:
+        # Colour-encoded (e.g. secondary capture) — collapse to luminance
+        frames = frames.mean(axis=-1)
+
+    stack = frames.astype(np.float32)
+    slope = float(getattr(ds, "RescaleSlope", 1) or 1)
+    intercept = float(getattr(ds, "RescaleIntercept", 0) or 0)
+    rescale(stack, slope, intercept)
+
+    window = _dicom_window(ds)
+    out = apply_window(stack, *(window or auto_window(stack)))
+
+    if getattr(ds, "PhotometricInterpretation", "") == "MONOCHROME1":
+        np.subtract(255, out, out=out)  # MONOCHROME1: low values are bright
+
+    if frame_count == 1:
+        return [(filename, to_decoded(out[0], "DICOM", data))]
+    return [(f"{filename}#f{index:03d}", to_decoded(s, "DICOM")) for index, s in zip(indices, out)]
+
+
+def _dicom_window(ds) -> Optional[Tuple[float, float]]:
+    """(center, width) from the VOI LUT tags, first value if multi-valued."""
+    center = getattr(ds, "WindowCenter", None)
+    width = getattr(ds, "WindowWidth", None)
+    if center is None or width is None:
+        return None
+    if isinstance(center, Sequence) and not isinstance(center, str):
+        center, width = center[0], width[0]
+    return float(center), max(float(width), 1.0)
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  NIfTI
+# ══════════════════════════════════════════════════════════════════════
+
+
+def decode_nifti(data: bytes, filename: str) -> List[Tuple[str, DecodedImage]]:
+    """Selected axial slices of a NIfTI-1/2 volume (first time point if 4D)."""
+    import nibabel as nib  # deferred import — optional dependency
+
+    compressed = data[:2] == b"\x1f\x8b"
+    if compressed:
+        stream = gzip.GzipFile(fileobj=io.BytesIO(data))
+        data = stream.read(VOLUME_SNIFF_BYTES)
+
+    header_class = nib.Nifti2Header if data[4:8] in (b"n+2\x00", b"ni2\x00") else nib.Nifti1Header
+    header = header_class.from_fileobj(io.BytesIO(data))
+
+    shape = header.get_data_shape()
+    if len(shape) < 3:
+        raise ValueError(f"Expected a 3D/4D volume, got shape {shape}")
+
+    # First time point if 4D: in Fortran order it is the leading block
+    shape = tuple(int(n) for n in shape[:3])
+    check_volume_size(*shape)
+    dtype = header.get_data_dtype()
+    offset = int(header.get_data_offset())
+
+    if compressed:
+        # Expand no further than the header says the 3D volume reaches
+        needed = offset + math.prod(shape) * dtype.itemsize
+        data += stream.read(max(needed - len(data), 0))
+
+    # Zero-copy view over the buffer: nothing is read until slices are taken
+    volume = np.ndarray(shape, dtype=dtype, buffer=data, offset=offset, order="F")
+
+    indices = select_slices(volume.shape[2])
+
+    # (X, Y, K) → (K, rows, cols) in display orientation: rows run
+    # anterior → posterior, so transpose and flip the y axis
+    stack = np.ascontiguousarray(
+        np.flip(np.transpose(volume[:, :, indices], (2, 1, 0)), axis=1), dtype=np.float32
+    )
+
+    slope, intercept = header.get_slope_inter()
+    if slope is not None:
+        rescale(stack, slope, intercept or 0.0)
+
+    out = apply_window(stack, *auto_window(stack))
+    return [(f"{filename}#z{index:03d}", to_decoded(s, "NIFTI")) for index, s in zip(indices, out)]
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  SLICE SELECTION + INTENSITY
+# ══════════════════════════════════════════════════════════════════════
+
+
+def select_slices(count: int, max_slices: int = VOLUME_MAX_SLICES) -> List[int]:
+    """Evenly spaced indices from the central range of an axis."""
+    if count <= max_slices:
+        return list(range(count))
+
+    lo = int(count * VOLUME_SLICE_RANGE[0])
+    hi = max(lo + 1, math.ceil(count * VOLUME_SLICE_RANGE[1]))
+    if hi - lo <= max_slices:
+        return list(range(lo, hi))
+    return sorted({int(round(i)) for i in np.linspace(lo, hi - 1, max_slices)})
+
+
+def rescale(stack: np.ndarray, slope: float, intercept: float) -> None:
+    """Stored values → real units (e.g. HU), in place."""
+    if slope != 1:
+        stack *= slope
+    if intercept:
+        stack += intercept
+
+
+def auto_window(stack: np.ndarray) -> Tuple[float, float]:
+    """Robust (center, width) from intensity percentiles of the stack."""
+    lo, hi = np.percentile(stack, AUTO_WINDOW_PERCENTILES)
+    width = max(float(hi - lo), 1.0)
+    return float(lo) + width / 2, width
+
+
+def apply_window(stack: np.ndarray, center: float, width: float) -> np.ndarray:
+    """Map [center - width/2, center + width/2] to 0..255 uint8.
+
+    Works in place on the float stack, so the only extra allocation is
+    the uint8 result.
+    """
+    stack -= center - width / 2
+    stack *= 255.0 / width
+    np.clip(stack, 0, 255, out=stack)
+    return stack.astype(np.uint8)
+
+
+def to_decoded(pixels: np.ndarray, volume_format: str, data: Optional[bytes] = None) -> DecodedImage:
+    """Wrap one 8-bit slice as a DecodedImage.
+
+    data is what the prediction cache hashes: the raw upload when the file
+    is a single slice (so it keys the same as any other upload of those
+    bytes), otherwise the slice's own pixel bytes.
+    """
+    pixels = np.ascontiguousarray(pixels)
+    image = Image.fromarray(pixels)
+    return DecodedImage(
+        image,
+        data=pixels.tobytes() if data is None else data,
+        header=(volume_format, "L", image.size),
+    )
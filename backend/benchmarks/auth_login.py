@@ -0,0 +1,151 @@
+"""
+benchmarks/auth_login.py — Login throughput vs bcrypt cost and pool size
+
+Drives POST /api/auth/login in-process (httpx ASGI transport, no network)
+with a fixed number of concurrent clients, for each combination of
+bcrypt cost (--rounds) and password pool size (--workers). Reports
+logins/s and latency percentiles, plus the p99 of a trivial /ping route
+probed during the run: since bcrypt runs on the password pool, that
+number should stay near zero however slow the logins get.
+
+Throughput is bounded by workers / bcrypt time: roughly doubling per
+worker (up to the core count) and halving per extra round.
+
+Usage (from backend/):
+    python -m benchmarks.auth_login
+    python -m benchmarks.auth_login --rounds 10 12 --workers 1 2 4 --concurrency 32 --requests 200
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# A throwaway SQLite file, before the app modules read the environment
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from passlib.context import CryptContext  # noqa: E402
+
+from app.api.auth import router as auth_router  # noqa: E402
+from app.auth import security  # noqa: E402
+from app.database.database import Base, async_engine, engine  # noqa: E402
+from app.middleware.rate_limit import limiter  # noqa: E402
+from app.services.inference_pool import InferencePool  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.state.limiter = limiter
+    limiter.enabled = False
+    app.include_router(auth_router, prefix="/api/auth")
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile_ms(samples, q) -> float:
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+async def run_config(
+    client: httpx.AsyncClient, rounds: int, workers: int, concurrency: int, requests: int
+) -> dict:
+    security.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    security.password_pool = InferencePool(
+        workers=workers, max_queue=max(workers, concurrency), name="password"
+    )
+
+    email = f"bench-{rounds}-{workers}@example.com"
+    response = await client.post(
+        "/api/auth/register",
+        json={"email": email, "username": f"bench{rounds}x{workers}", "password": PASSWORD},
+    )
+    response.raise_for_status()
+
+    latencies, ping_latencies, failures = [], [], 0
+    remaining = requests
+    done = asyncio.Event()
+
+    async def login_client():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/auth/login", json={"email": email, "password": PASSWORD}
+            )
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    async def ping_probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/ping")
+            ping_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    probe = asyncio.create_task(ping_probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(login_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe
+    security.password_pool.shutdown()
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": percentile_ms(latencies, 50),
+        "p99": percentile_ms(latencies, 99),
+        "ping_p99": percentile_ms(ping_latencies, 99),
+        "failures": failures,
+    }
+
+
+async def main_async(args) -> None:
+    Base.metadata.create_all(bind=engine)
+    transport = httpx.ASGITransport(app=build_app())
+
+    print(f"concurrency={args.concurrency}  requests={args.requests}  cpus={os.cpu_count()}")
+    header = (
+        f"{'rounds':>6} {'workers':>7} {'logins/s':>9} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'ping p99':>9} {'failed':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for rounds in args.rounds:
+            for workers in args.workers:
+                r = await run_config(client, rounds, workers, args.concurrency, args.requests)
+                print(
+                    f"{rounds:>6} {workers:>7} {r['rps']:>9.1f} {r['p50']:>8.1f} "
+                    f"{r['p99']:>8.1f} {r['ping_p99']:>9.2f} {r['failures']:>7}"
+                )
+
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64, help="logins per config")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
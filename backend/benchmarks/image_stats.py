@@ -0,0 +1,87 @@
+"""
+benchmarks/image_stats.py — Peak RSS and latency of the image statistics
+
+Compares the old full-resolution float32 colour/contrast checks with the
+sampled, integer-domain single pass (DecodedImage.stats) across upload
+sizes. Each measurement runs in a fresh process so peak RSS is not
+polluted by earlier runs.
+
+Usage (from backend/):
+    python -m benchmarks.image_stats
+    python -m benchmarks.image_stats --sizes 1024 4096 5000 --repeats 5
+"""
+
+import argparse
+import io
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_decoder import decode_image
+
+
+def legacy_stats(decoded) -> tuple:
+    """The previous implementation: full-res float32 copy + three diff arrays."""
+    pixels = np.asarray(decoded.image)
+    std = float(pixels.std())
+    means = pixels.reshape(-1, 3).mean(axis=0)
+    rgb = pixels.astype(np.float32)
+    r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    diff = float((np.abs(r - g).mean() + np.abs(r - b).mean() + np.abs(g - b).mean()) / 3)
+    return std, tuple(means), diff
+
+
+def sampled_stats(decoded) -> tuple:
+    stats = decoded.stats
+    return stats.std, stats.channel_means, stats.mean_channel_diff
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def measure(method: str, size: int, repeats: int) -> tuple:
+    """Runs in a child process: (median seconds, peak RSS growth in MB)."""
+    rgb = np.random.default_rng(size).integers(0, 255, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb).save(buffer, format="PNG")
+    data = buffer.getvalue()
+    del rgb, buffer
+
+    fn = legacy_stats if method == "legacy" else sampled_stats
+    baseline = _max_rss_mb()
+
+    timings = []
+    for _ in range(repeats):
+        decoded = decode_image(data)  # fresh object: stats are cached per decode
+        start = time.perf_counter()
+        fn(decoded)
+        timings.append(time.perf_counter() - start)
+
+    return float(np.median(timings)), _max_rss_mb() - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[512, 1024, 2048, 4096, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>11}  {'legacy ms':>10} {'legacy +MB':>11}  {'sampled ms':>10} {'sampled +MB':>12}")
+    for size in args.sizes:
+        row = f"{size:>5}x{size:<5}"
+        for method in ("legacy", "sampled"):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                seconds, rss = pool.submit(measure, method, size, args.repeats).result()
+            row += f"  {seconds * 1000:>10.1f} {rss:>11.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
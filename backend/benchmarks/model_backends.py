@@ -0,0 +1,83 @@
+"""
+benchmarks/model_backends.py — Compare inference backends against Keras
+
+For every backend/quantization variant: check accuracy parity against the
+reference Keras model on a held-out image set, then time forward passes
+at a few batch sizes.
+
+Usage (from backend/):
+    python -m benchmarks.model_backends --images data/holdout
+    python -m benchmarks.model_backends --images data/holdout \\
+        --variants keras tf_function tflite:float16 onnx
+
+int8 variants need MODEL_CALIBRATION_DIR set to a calibration image dir.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.services.model_loader import (
+    KerasBackend,
+    ModelLoader,
+    check_backend_parity,
+    load_image_set,
+)
+
+DEFAULT_VARIANTS = ["keras", "tf_function", "tflite", "tflite:float16", "tflite:int8", "onnx", "onnx:int8"]
+
+
+def time_backend(backend, images: np.ndarray, batch_size: int, repeats: int) -> float:
+    """Median seconds per image for one batch size."""
+    batch = np.resize(images, (batch_size, *images.shape[1:]))
+    backend.predict(batch)  # warm-up: tracing / tensor allocation
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.predict(batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) / batch_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "model/tumor_model.keras"))
+    parser.add_argument("--images", required=True, help="held-out image directory")
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 16])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    loader = ModelLoader(args.model, backend="keras", quantization="none")
+    loader.load()
+    reference = KerasBackend(loader.keras_model)
+    images = load_image_set(args.images)
+
+    header = f"{'variant':<16} {'parity':<7} {'max diff':>9} {'agree':>6}"
+    header += "".join(f" {f'ms/img@{b}':>10}" for b in args.batch_sizes)
+    print(header)
+    print("-" * len(header))
+
+    for variant in args.variants:
+        backend_name, _, quantization = variant.partition(":")
+        try:
+            backend = loader.build_backend(backend_name, quantization or "none")
+        except Exception as e:
+            print(f"{variant:<16} skipped: {e}")
+            continue
+
+        report = check_backend_parity(reference, backend, images)
+        row = (
+            f"{variant:<16} {'ok' if report['passed'] else 'FAIL':<7} "
+            f"{report['max_abs_diff']:>9.5f} {report['label_agreement']:>6.2%}"
+        )
+        for batch_size in args.batch_sizes:
+            row += f" {time_backend(backend, images, batch_size, args.repeats) * 1000:>10.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+# ============================================================
+# ClassifierBT Chat Agent Tests
+# ============================================================
+# Run with: pytest tests/test_agent.py -v
+#
+# The agent talks to a fake LLM server on localhost that speaks
+# the chat completions API and injects latency and errors, so
+# the real HTTP client, timeouts and retries are exercised
+# without a Groq account.
+#
+# What's tested:
+#   - Retry with backoff on 5xx, without blocking the event loop
+#   - Per-call timeouts
+#   - Rate-limit errors surfaced with the provider's wait time
+#   - Cancelling a reply aborts the in-flight HTTP request
+#   - The final answer is streamed token by token
+#   - Tool-call rounds (structured and inline) run before anything streams
+#   - Agents share one pooled client: messages reuse its connections
+#   - A round's tool calls run concurrently and are saved in one batch
+# ============================================================
+import asyncio
+import json
+import os
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Same SQLite file as test_api.py; these tests never touch it, but the
+# agent imports the database layer
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+
+import app.ai.agent as agent_module
+import app.ai.llm_client as llm_client_module
+from app.ai.agent import ChatAgent
+from app.ai.llm_client import llm_client
+
+
+# ── Fake LLM server ──────────────────────────────────────────
+class FakeLLM:
+    """Chat completions endpoint answering from a script of steps.
+
+    Each request takes the next step (the last one repeats):
+        {"delay": 0.5}                 wait before answering
+        {"status": 503}                fail with this status
+        {"reply": "text"}              succeed with this content
+        {"tokens": ["a", "b"]}         stream these content deltas
+        {"chunk_delay": 0.1}           wait between streamed deltas
+        {"tool_calls": [{"name": "get_user_statistics", "arguments": "{}"}]}
+                                       request tools instead of answering
+    Steps combine, e.g. {"delay": 2, "reply": "late"}. Requests with
+    "stream": true are answered as server-sent events.
+    """
+
+    def __init__(self):
+        self.script = [{"reply": "ok"}]
+        self.requests = []
+        self.aborted = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                request = json.loads(body)
+                fake.requests.append(request)
+                step = fake.script[min(len(fake.requests), len(fake.script)) - 1]
+
+                if not self._wait(step.get("delay", 0)):
+                    fake.aborted += 1
+                    return
+
+                status = step.get("status", 200)
+                if status == 200 and request.get("stream"):
+                    self._stream(step)
+                    return
+                if status == 200:
+                    payload = completion(step.get("reply", ""))
+                else:
+                    payload = {"error": {"message": step.get("message", "boom"), "type": "x"}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, step):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                deltas = [
+                    {"tool_calls": [tool_call_delta(i, call)]}
+                    for i, call in enumerate(step.get("tool_calls", []))
+                ]
+                deltas += [{"content": token} for token in step.get("tokens", [])]
+                if not deltas:
+                    deltas = [{"content": step.get("reply", "")}]
+
+                for i, delta in enumerate(deltas):
+                    if i and not self._wait(step.get("chunk_delay", 0)):
+                        fake.aborted += 1
+                        return
+                    self._write_chunk(f"data: {json.dumps(chunk(delta))}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _wait(self, seconds) -> bool:
+                """Sleep, returning False early if the client hangs up."""
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    readable, _, _ = select.select([self.connection], [], [], 0.02)
+                    if readable and self.connection.recv(1, socket.MSG_PEEK) == b"":
+                        return False
+                return True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "llama-3.3-70b-versatile",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def chunk(delta: dict) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "llama-3.3-70b-versatile",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+    }
+
+
+def tool_call_delta(index: int, call: dict) -> dict:
+    return {
+        "index": index,
+        "id": f"call_{index + 1}",
+        "type": "function",
+        "function": {"name": call["name"], "arguments": call.get("arguments", "{}")},
+    }
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_client_module, "GROQ_BASE_URL", fake.base_url)
+    monkeypatch.setattr(agent_module, "RETRY_BASE_DELAY", 0.05)
+    yield fake
+    fake.close()
+
+
+def make_agent() -> ChatAgent:
+    agent = ChatAgent(user_id=1, conversation_id="c1", db=None, api_key="test-key")
+    agent.conversation_history = [{"role": "user", "content": "What is a glioma?"}]
+    return agent
+
+
+async def reply(agent: ChatAgent) -> list:
+    try:
+        return [chunk async for chunk in agent.send_message("What is a glioma?")]
+    finally:
+        # The shared client belongs to this test's event loop
+        await llm_client.aclose()
+
+
+# ============================================================
+# RETRIES, TIMEOUTS, CANCELLATION
+# ============================================================
+
+
+def test_server_errors_are_retried_without_blocking_the_loop(llm):
+    """Two 503s then a reply: the agent retries with asyncio.sleep backoff
+    while other coroutines keep running."""
+    llm.script = [{"status": 503}, {"status": 503, "delay": 0.1}, {"reply": "Gliomas are..."}]
+
+    async def main():
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        chunks = await reply(make_agent())
+        stop.set()
+        await ticking
+        return chunks, ticks
+
+    chunks, ticks = asyncio.run(main())
+    assert chunks == ["Gliomas are..."]
+    assert len(llm.requests) == 3
+    # ~0.25s of server delay + backoff; a blocked loop would tick ~once
+    assert ticks >= 10
+
+
+def test_slow_calls_time_out(llm, monkeypatch):
+    monkeypatch.setattr(agent_module, "LLM_TIMEOUT", 0.2)
+    llm.script = [{"delay": 2, "reply": "too late"}]
+
+    started = time.perf_counter()
+    chunks = asyncio.run(reply(make_agent()))
+    assert chunks == ["__ERROR_TIMEOUT__"]
+    assert len(llm.requests) == agent_module.MAX_RETRIES
+    assert time.perf_counter() - started < 1.5
+
+
+def test_rate_limit_reports_wait_time(llm):
+    llm.script = [
+        {"status": 429, "message": "Rate limit reached. Please try again in 2m29.5s."}
+    ]
+    assert asyncio.run(reply(make_agent())) == ["__ERROR_RATE_LIMIT__2m29.5s"]
+
+
+def test_cancelling_a_reply_aborts_the_llm_request(llm):
+    """What happens when the SSE client disconnects: the stream task is
+    cancelled and the in-flight request is dropped, not waited out."""
+    llm.script = [{"delay": 5, "reply": "nobody is listening"}]
+
+    async def main():
+        task = asyncio.create_task(reply(make_agent()))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    assert time.perf_counter() - started < 1.5
+
+    deadline = time.monotonic() + 2
+    while llm.aborted == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert llm.aborted == 1
+
+
+# ============================================================
+# STREAMING
+# ============================================================
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    """Stub the tool layer: records calls and saved messages, no database.
+    Tools take tool_input.get("seconds", 0) to run."""
+    calls, saved = [], []
+
+    async def execute_tool(self, name, arguments, db=None):
+        calls.append((name, arguments))
+        await asyncio.sleep(arguments.get("seconds", 0))
+        return {"success": True, "total_predictions": 3}
+
+    async def save_message_async(db, **fields):
+        saved.append(fields)
+
+    async def save_messages_async(db, conversation_id, messages):
+        saved.append({"batch": [m["tool_name"] for m in messages]})
+
+    monkeypatch.setattr(ChatAgent, "execute_tool", execute_tool)
+    crud = agent_module.crud_conversation
+    monkeypatch.setattr(crud, "save_message_async", save_message_async)
+    monkeypatch.setattr(crud, "save_messages_async", save_messages_async)
+    return calls, saved
+
+
+def test_final_answer_is_streamed_token_by_token(llm):
+    llm.script = [
+        {"tokens": ["Gliomas ", "start in ", "glial cells."], "chunk_delay": 0.3}
+    ]
+
+    async def main():
+        started = time.perf_counter()
+        arrivals = []
+        agent = make_agent()
+        try:
+            async for text in agent.send_message("What is a glioma?"):
+                arrivals.append((time.perf_counter() - started, text))
+        finally:
+            await llm_client.aclose()
+        return arrivals
+
+    arrivals = asyncio.run(main())
+    assert [text for _, text in arrivals] == ["Gliomas ", "start in ", "glial cells."]
+    ttfb, total = arrivals[0][0], arrivals[-1][0]
+    # The first token doesn't wait for the other two (0.6s of chunk delay)
+    assert ttfb < 0.3
+    assert total >= 0.6
+    assert llm.requests[0]["stream"] is True
+
+
+def test_tool_round_runs_before_the_answer_streams(llm, tools):
+    calls, saved = tools
+    llm.script = [
+        {"tool_calls": [{"name": "get_user_statistics", "arguments": "{}"}]},
+        {"tokens": ["You have ", "3 scans."]},
+    ]
+
+    chunks = asyncio.run(reply(make_agent()))
+    assert chunks == ["You have ", "3 scans."]
+    assert calls == [("get_user_statistics", {})]
+    assert saved[0]["tool_name"] == "__tool_request__"
+    assert saved[1:] == [{"batch": ["call_1"]}]
+
+    # The second round sees the tool request and its result
+    history = llm.requests[1]["messages"]
+    assert history[-2]["tool_calls"][0]["function"]["name"] == "get_user_statistics"
+    assert history[-1] == {
+        "role": "tool",
+        "tool_call_id": "call_1",
+        "content": json.dumps({"success": True, "total_predictions": 3}),
+    }
+
+
+def test_inline_tool_call_text_is_never_streamed(llm, tools):
+    """Llama sometimes writes the call as text; it's held back while it
+    could still be one, then executed instead of shown."""
+    calls, _ = tools
+    llm.script = [
+        {"tokens": ["<func", "tion=get_user_statistics>", "{}</function>"]},
+        {"tokens": ["<", "3 scans so far."]},
+    ]
+
+    chunks = asyncio.run(reply(make_agent()))
+    assert calls == [("get_user_statistics", {})]
+    assert chunks == ["<3 scans so far."]
+
+
+def test_tool_calls_in_one_round_run_concurrently(llm, tools):
+    calls, saved = tools
+    slow = '{"seconds": 0.4}'
+    llm.script = [
+        {
+            "tool_calls": [
+                {"name": "get_user_predictions", "arguments": slow},
+                {"name": "get_user_statistics", "arguments": slow},
+                {"name": "explain_prediction", "arguments": slow},
+            ]
+        },
+        {"reply": "Here is everything."},
+    ]
+
+    started = time.perf_counter()
+    chunks = asyncio.run(reply(make_agent()))
+    elapsed = time.perf_counter() - started
+
+    assert chunks == ["Here is everything."]
+    assert len(calls) == 3
+    # The slowest tool (0.4s), not the sum (1.2s)
+    assert elapsed < 1.0
+    # One batch for the round's results, in call order
+    assert saved[1:] == [{"batch": ["call_1", "call_2", "call_3"]}]
+    assert [m["tool_call_id"] for m in llm.requests[1]["messages"][-3:]] == [
+        "call_1",
+        "call_2",
+        "call_3",
+    ]
+
+
+# ============================================================
+# SHARED CLIENT
+# ============================================================
+
+
+def test_agents_share_one_pooled_connection(llm):
+    """One agent per message, as in the chat endpoint: after the first
+    message, the others reuse its keep-alive connection."""
+    llm.script = [{"reply": "ok"}]
+    requests = llm_client_module.metrics.counter("llm_http_requests")
+    connects = llm_client_module.metrics.counter("llm_http_connections_opened")
+
+    async def main():
+        requests_before, connects_before = requests.value, connects.value
+        try:
+            for _ in range(3):
+                agent = make_agent()
+                assert agent.client._client is llm_client.get("test-key")._client
+                assert [c async for c in agent.send_message("What is a glioma?")] == ["ok"]
+        finally:
+            await llm_client.aclose()
+        return requests.value - requests_before, connects.value - connects_before
+
+    assert asyncio.run(main()) == (3, 1)
+
+
+def test_llm_client_is_recreated_for_a_new_event_loop(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+
+    async def get():
+        return llm_client.get()
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second
+    asyncio.run(llm_client.aclose())
@@ -11,6 +11,13 @@
 #   - User registration (success + validation errors)
 #   - User login (success + wrong credentials)
 #   - Protected endpoint access (with + without token)
+#   - Principal cache and token claims
+#   - Batch (multi-slice study) prediction
+#   - Per-user statistics rollup
+#   - Background prediction jobs (submit, poll, SSE)
+#   - Cursor pagination of prediction history and conversations
+#   - Query plans of the listing queries (composite indexes)
+#   - Constant statement count for the conversation listing
 # ============================================================
 from unittest.mock import MagicMock
 import sys
@@ -30,18 +37,24 @@ sys.modules["tensorflow.keras.models"] = MagicMock()
 
 
 # Point database to test SQLite BEFORE importing app
+import json
 import os
 
 os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")  # minimum cost keeps auth tests fast
 
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
 from app.main import app
-from app.database.database import Base, get_db
+from app.database.database import Base, get_db, get_async_db
+from app.services.model_service import model_service, ModelState
+from app.auth.principal_cache import principal_cache
 
 
 # ── Test Database Setup ─────────────────────────────────────
@@ -55,6 +68,16 @@ test_engine = create_engine(
 
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
+# Same file through aiosqlite for the async endpoints. NullPool: without
+# a context manager TestClient runs each request on a fresh event loop,
+# so connections must not outlive a request
+test_async_engine = create_async_engine(
+    "sqlite+aiosqlite:///./test.db", poolclass=NullPool
+)
+TestAsyncSessionLocal = async_sessionmaker(
+    bind=test_async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def override_get_db():
     """Swap real PostgreSQL with test SQLite."""
@@ -65,8 +88,14 @@ def override_get_db():
         db.close()
 
 
-# Override the database dependency
+async def override_get_async_db():
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
+
+# Override the database dependencies
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 # Disable rate limiting during tests
 from app.middleware.rate_limit import limiter
@@ -79,6 +108,7 @@ limiter.enabled = False
 def setup_database():
     """Create all tables before tests, drop them after."""
     Base.metadata.create_all(bind=test_engine)
+    principal_cache.clear()  # user ids restart with every fresh database
     yield
     Base.metadata.drop_all(bind=test_engine)
 
@@ -117,6 +147,41 @@ def test_health_check():
     assert response.json() == {"status": "ok"}
 
 
+def test_readiness_reports_model_state(monkeypatch):
+    """GET /health/ready is 503 while the model loads, 200 once ready."""
+    monkeypatch.setattr(model_service, "state", ModelState.loading)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["model"]["state"] == "loading"
+
+    monkeypatch.setattr(model_service, "state", ModelState.ready)
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+    # Liveness is unaffected by model state
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_metrics_require_an_admin():
+    """GET /metrics: 401 without a token, 403 for a regular user, 200 for an admin."""
+    from app.database.models import User
+
+    assert client.get("/metrics").status_code in (401, 403)
+
+    headers = get_auth_header()
+    assert client.get("/metrics", headers=headers).status_code == 403
+
+    with TestSessionLocal() as db:
+        db.query(User).filter(User.email == "testuser@example.com").update({"is_admin": True})
+        db.commit()
+    principal_cache.clear()
+
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
+
+
 # ============================================================
 # USER REGISTRATION
 # ============================================================
@@ -240,6 +305,55 @@ def test_login_success():
     assert len(data["access_token"]) > 0
 
 
+def test_login_upgrades_hash_when_cost_changes():
+    """A hash made with a different bcrypt cost is replaced on login."""
+    from passlib.context import CryptContext
+    from app.auth.security import BCRYPT_ROUNDS
+    from app.database.models import User
+
+    client.post(
+        "/api/auth/register",
+        json={"email": "old@example.com", "username": "old", "password": "securepassword123"},
+    )
+    old_cost = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS + 1)
+    with TestSessionLocal() as db:
+        user = db.query(User).filter(User.email == "old@example.com").one()
+        user.hashed_password = old_cost.hash("securepassword123")
+        db.commit()
+
+    response = client.post(
+        "/api/auth/login", json={"email": "old@example.com", "password": "securepassword123"}
+    )
+    assert response.status_code == 200
+    with TestSessionLocal() as db:
+        stored = db.query(User).filter(User.email == "old@example.com").one().hashed_password
+    assert stored.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+    # The upgraded hash still verifies
+    response = client.post(
+        "/api/auth/login", json={"email": "old@example.com", "password": "securepassword123"}
+    )
+    assert response.status_code == 200
+
+
+def test_login_returns_503_when_password_pool_is_full(monkeypatch):
+    from app.auth import security
+    from app.services.inference_pool import PoolSaturatedError
+
+    get_auth_header()
+
+    async def saturated(*args):
+        raise PoolSaturatedError(1, "password")
+
+    monkeypatch.setattr(security.password_pool, "run", saturated)
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "testuser@example.com", "password": "securepassword123"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
 def test_login_wrong_password():
     """Wrong password should return 401."""
     client.post(
@@ -297,6 +411,55 @@ def test_me_with_valid_token():
     assert "hashed_password" not in data
 
 
+def test_authenticated_requests_skip_user_lookup_until_invalidated():
+    """Tokens carry uid/active; after the first request the user comes
+    from the principal cache, and deactivation takes effect at once."""
+    from app.auth.security import decode_access_token
+    from app.crud import user as crud_user
+
+    headers = get_auth_header()
+    claims = decode_access_token(headers["Authorization"].split()[1])
+    assert claims["sub"] == "testuser@example.com"
+    assert claims["active"] is True and isinstance(claims["uid"], int)
+
+    def user_queries():
+        statements = capture_statements(
+            test_async_engine.sync_engine,
+            lambda: client.get("/api/predictions", headers=headers),
+        )
+        return [sql for sql, _ in statements if "FROM users" in sql]
+
+    principal_cache.clear()
+    assert len(user_queries()) == 1  # miss: primary-key lookup by uid
+    assert user_queries() == []  # hit
+
+    with TestSessionLocal() as db:
+        user = crud_user.get_user_by_email(db, "testuser@example.com")
+        crud_user.set_user_active(db, user, False)
+
+    response = client.get("/api/predictions", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+def test_principal_cache_ttl_and_lru():
+    from app.auth.principal_cache import PrincipalCache
+
+    cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "user-a")
+    cache.put("b", "user-b")
+    assert cache.get("a") == "user-a"  # touch a
+    cache.put("c", "user-c")
+    assert cache.get("b") is None  # least recently used
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("c") == "user-c"
+
+    expired = PrincipalCache(max_entries=2, ttl_seconds=0)
+    expired.put("a", "user-a")
+    assert expired.get("a") is None
+
+
 def test_predictions_without_token():
     """GET /api/predictions without token should return 403."""
     response = client.get("/api/predictions")
@@ -311,3 +474,690 @@ def test_predictions_with_valid_token():
     data = response.json()
     assert data["predictions"] == []
     assert data["total"] == 0
+
+
+def test_conversations_list_get_delete():
+    """Conversation endpoints run on the async session: the listing
+    reports message counts and delete cascades to messages."""
+    from app.crud import conversation as crud_conversation
+    from app.crud import user as crud_user
+    from app.database.models import Message, MessageRole
+
+    headers = get_auth_header()
+    db = TestSessionLocal()
+    try:
+        user = crud_user.get_user_by_email(db, "testuser@example.com")
+        conversation = crud_conversation.create_conversation(db, user.id, "Hello there")
+        for role, text in [(MessageRole.user, "Hello there"), (MessageRole.assistant, "Hi!")]:
+            crud_conversation.save_message(db, conversation.id, role, text)
+        conversation_id = conversation.id
+    finally:
+        db.close()
+
+    listing = client.get("/api/chat/conversations", headers=headers).json()
+    assert listing["total"] == 1
+    assert listing["conversations"][0]["message_count"] == 2
+
+    detail = client.get(f"/api/chat/conversations/{conversation_id}", headers=headers)
+    assert [m["content"] for m in detail.json()["messages"]] == ["Hello there", "Hi!"]
+
+    deleted = client.delete(f"/api/chat/conversations/{conversation_id}", headers=headers)
+    assert deleted.status_code == 200
+    missing = client.get(f"/api/chat/conversations/{conversation_id}", headers=headers)
+    assert missing.status_code == 404
+
+    db = TestSessionLocal()
+    try:
+        assert db.query(Message).count() == 0
+    finally:
+        db.close()
+
+
+def test_conversations_page_by_cursor():
+    """Conversation listing pages by (updated_at, id) cursor."""
+    from app.crud import conversation as crud_conversation
+    from app.crud import user as crud_user
+
+    headers = get_auth_header()
+    with TestSessionLocal() as db:
+        user = crud_user.get_user_by_email(db, "testuser@example.com")
+        for i in range(5):
+            crud_conversation.create_conversation(db, user.id, f"Question {i}")
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/chat/conversations?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url, headers=headers).json()
+        assert page["total"] == 5
+        seen += [c["id"] for c in page["conversations"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    everything = client.get("/api/chat/conversations?limit=100", headers=headers).json()
+    assert seen == [c["id"] for c in everything["conversations"]]
+    assert len(set(seen)) == 5
+
+    bad = client.get("/api/chat/conversations?cursor=%%%", headers=headers)
+    assert bad.status_code == 400
+
+
+class FakeChatAgent:
+    """Stand-in for ChatAgent: streams two chunks, uses its session for history."""
+
+    def __init__(self, db):
+        self.db = db
+
+    @classmethod
+    async def create(cls, user_id, conversation_id, db, api_key=None):
+        from app.crud import conversation as crud_conversation
+
+        await crud_conversation.get_conversation_messages_async(db, conversation_id, user_id)
+        return cls(db)
+
+    async def send_message(self, user_message):
+        yield "Hello, "
+        yield "world"
+
+    async def generate_follow_ups(self, assistant_response):
+        return []
+
+
+def test_chat_message_saves_reply_after_streaming(monkeypatch):
+    """The assistant reply is persisted once the stream finishes, through a
+    session opened for the stream (the request's session is already closed)."""
+    import app.api.chat as chat_module
+    from app.database.models import Message, MessageRole
+
+    monkeypatch.setattr(chat_module, "ChatAgent", FakeChatAgent)
+    headers = get_auth_header()
+    ttfb_before = chat_module.ttfb_histogram.snapshot()["count"]
+    total_before = chat_module.response_histogram.snapshot()["count"]
+
+    with client.stream(
+        "POST", "/api/chat/message", headers=headers, json={"message": "Hi"}
+    ) as stream:
+        events = [line[6:] for line in stream.iter_lines() if line.startswith("data: ")]
+
+    assert events[-1] == "[DONE]"
+    conversation_id = json.loads(events[0])["conversation_id"]
+    assert [json.loads(e)["text"] for e in events[1:-1]] == ["Hello, ", "world"]
+    # Time to first token and total time, once per message
+    assert chat_module.ttfb_histogram.snapshot()["count"] == ttfb_before + 1
+    assert chat_module.response_histogram.snapshot()["count"] == total_before + 1
+
+    db = TestSessionLocal()
+    try:
+        messages = (
+            db.query(Message)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at)
+            .all()
+        )
+        assert [(m.role, m.content) for m in messages] == [
+            (MessageRole.user, "Hi"),
+            (MessageRole.assistant, "Hello, world"),
+        ]
+    finally:
+        db.close()
+
+
+# ============================================================
+# BATCH PREDICTION
+# ============================================================
+import asyncio
+import io
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+import app.api.predict as predict_module
+from types import SimpleNamespace
+
+
+def make_scan_png(seed: int) -> bytes:
+    """A small grayscale PNG with enough contrast to pass validation."""
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (64, 64), dtype=np.uint8)).save(
+        buffer, format="PNG"
+    )
+    return buffer.getvalue()
+
+
+def fake_predict_batch(images, names, content_hashes):
+    """Stand-in for Predictor.predict_batch: first slice tumor, rest clear."""
+    results = []
+    for i, _ in enumerate(images):
+        if i == 0:
+            results.append({"label": "Tumor", "confidence": 0.9, "valid_scan": True})
+        else:
+            results.append({"label": "No Tumor", "confidence": 0.8, "valid_scan": True})
+    return results
+
+
+def use_fake_predictor(monkeypatch):
+    """Mark the model ready with a predictor whose batches are faked."""
+    predictor = MagicMock()
+    predictor.submit_batch = lambda images, names, hashes: SimpleNamespace(
+        results=fake_predict_batch(images, names, hashes), pending=[]
+    )
+    predictor.collect = lambda batch, outputs: batch.results
+    monkeypatch.setattr(model_service, "_predictor", predictor)
+    monkeypatch.setattr(model_service, "state", ModelState.ready)
+
+
+def test_waiting_requests_share_a_batch_beyond_worker_count(monkeypatch):
+    """Workers only preprocess; waiting for the forward pass doesn't hold
+    one, so concurrent requests fill batches larger than the pool."""
+    from app.services.batching import InferenceBatcher
+    from app.services.inference_pool import InferencePool
+
+    batch_sizes = []
+    batcher = InferenceBatcher(
+        lambda batch: batch_sizes.append(len(batch)) or np.zeros((len(batch), 1)),
+        max_batch_size=16,
+        max_wait_ms=200,
+    )
+
+    class BatchingPredictor:
+        def submit_batch(self, images, names, hashes):
+            pending = [
+                (i, None, batcher.submit_async(np.zeros((1, 2), dtype=np.float32)))
+                for i in range(len(images))
+            ]
+            return SimpleNamespace(results=[None] * len(images), pending=pending)
+
+        def collect(self, batch, outputs):
+            return [{"rows": len(preds)} for preds in outputs]
+
+    monkeypatch.setattr(predict_module, "inference_pool", InferencePool(workers=2))
+
+    async def burst():
+        predictor = BatchingPredictor()
+        return await asyncio.gather(
+            *(predict_module.run_predictions(predictor, [None], ["x"], [None]) for _ in range(8))
+        )
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        batcher.close()
+
+    assert results == [[{"rows": 1}]] * 8
+    assert max(batch_sizes) > 2
+
+
+def test_predict_batch_images_and_zip(monkeypatch):
+    """Images and zip members are predicted together and stored in bulk."""
+    use_fake_predictor(monkeypatch)
+    headers = get_auth_header()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("slice_002.png", make_scan_png(2))
+        zf.writestr("slice_003.png", make_scan_png(3))
+
+    response = client.post(
+        "/api/predict/batch",
+        headers=headers,
+        files=[
+            ("files", ("slice_001.png", make_scan_png(1), "image/png")),
+            ("files", ("broken.png", b"not an image", "image/png")),
+            ("files", ("study.zip", archive.getvalue(), "application/zip")),
+        ],
+    )
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [s["filename"] for s in data["slices"]] == [
+        "slice_001.png",
+        "broken.png",
+        "slice_002.png",
+        "slice_003.png",
+    ]
+    assert data["slices"][1]["valid_scan"] is False
+    assert data["slices"][1]["prediction_id"] is None
+    assert data["study"] == {
+        "label": "Tumor",
+        "confidence": 0.9,
+        "total_slices": 4,
+        "valid_slices": 3,
+        "tumor_slices": 1,
+    }
+
+    history = client.get("/api/predictions", headers=headers).json()
+    assert history["total"] == 3
+
+
+def test_statistics_rollup_tracks_creates_and_deletes(monkeypatch):
+    """/api/statistics reads the per-user rollup; it matches a fresh
+    aggregate after inserts and deletes, and reseeds itself if missing."""
+    from app.crud import prediction as crud_prediction
+    from app.database.models import Prediction, UserPredictionStats
+
+    use_fake_predictor(monkeypatch)
+    headers = get_auth_header()
+
+    def upload(*seeds):
+        files = [
+            ("files", (f"s{seed}.png", make_scan_png(seed), "image/png")) for seed in seeds
+        ]
+        assert client.post("/api/predict/batch", headers=headers, files=files).status_code == 200
+
+    def check(expected_total):
+        stats = client.get("/api/statistics", headers=headers).json()
+        with TestSessionLocal() as db:
+            user_id = db.query(Prediction.user_id).first()[0]
+            aggregate = crud_prediction._statistics(
+                *db.execute(crud_prediction._aggregate_statistics_query(user_id)).one()
+            )
+        assert stats == aggregate
+        assert stats["total_predictions"] == expected_total
+        return user_id
+
+    upload(31, 32, 33)
+    user_id = check(3)
+    assert client.get("/api/statistics", headers=headers).json()["tumor_detected"] == 1
+
+    with TestSessionLocal() as db:
+        tumor = db.query(Prediction).filter(Prediction.prediction_label == "Tumor").first()
+        assert crud_prediction.delete_prediction(db, tumor.id)
+    check(2)
+
+    # A user whose history predates the rollup gets seeded on next insert
+    with TestSessionLocal() as db:
+        db.query(UserPredictionStats).delete()
+        db.commit()
+    check(2)  # served by the aggregate fallback
+    upload(34, 35)
+    check(4)
+    with TestSessionLocal() as db:
+        assert db.get(UserPredictionStats, user_id).total_predictions == 4
+
+
+def test_prediction_history_pages_by_cursor(monkeypatch):
+    """next_cursor walks the whole history once, newest first, even when
+    rows share a timestamp; total is the full count on every page."""
+    use_fake_predictor(monkeypatch)
+    headers = get_auth_header()
+    files = [("files", (f"s{i}.png", make_scan_png(40 + i), "image/png")) for i in range(7)]
+    assert client.post("/api/predict/batch", headers=headers, files=files).status_code == 200
+
+    everything = client.get("/api/predictions?limit=100", headers=headers).json()
+    assert everything["next_cursor"] is None
+    expected = [p["id"] for p in everything["predictions"]]
+    assert len(expected) == 7
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/predictions?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url, headers=headers).json()
+        assert page["total"] == 7
+        assert len(page["predictions"]) <= 3
+        seen += [p["id"] for p in page["predictions"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    # Offset paging still works
+    offset_page = client.get("/api/predictions?skip=3&limit=3", headers=headers).json()
+    assert [p["id"] for p in offset_page["predictions"]] == expected[3:6]
+
+    bad = client.get("/api/predictions?cursor=not-a-cursor", headers=headers)
+    assert bad.status_code == 400
+    both = client.get(f"/api/predictions?skip=1&cursor={cursor or 'x'}", headers=headers)
+    assert both.status_code == 400
+
+
+@pytest.mark.parametrize("endpoint, field", [("/api/predict/batch", "files"), ("/api/predict", "file")])
+def test_predict_batch_while_model_loading(monkeypatch, endpoint, field):
+    """Until the model is ready, uncached slices get 503 + Retry-After
+    (every predict endpoint maps errors through prediction_errors)."""
+    monkeypatch.setattr(model_service, "state", ModelState.loading)
+    response = client.post(
+        endpoint,
+        headers=get_auth_header(),
+        files=[(field, ("a.png", make_scan_png(20), "image/png"))],
+    )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_predict_nifti_volume(monkeypatch):
+    """A NIfTI volume on /api/predict is predicted slice-wise as a study."""
+    nib = pytest.importorskip("nibabel")
+    use_fake_predictor(monkeypatch)
+    headers = get_auth_header()
+
+    volume = np.random.default_rng(5).normal(100, 30, (64, 64, 30)).astype(np.int16)
+    data = nib.Nifti1Image(volume, np.eye(4)).to_bytes()
+
+    response = client.post(
+        "/api/predict",
+        headers=headers,
+        files={"file": ("brain.nii", data, "application/octet-stream")},
+    )
+    assert response.status_code == 200
+    assert response.json()["label"] == "Tumor"
+
+    # Every selected slice is stored as its own prediction
+    history = client.get("/api/predictions", headers=headers).json()
+    assert history["total"] == 16
+
+
+def test_predict_batch_without_token():
+    """POST /api/predict/batch without a token should return 403."""
+    response = client.post(
+        "/api/predict/batch",
+        files=[("files", ("a.png", make_scan_png(4), "image/png"))],
+    )
+    assert response.status_code == 403
+
+
+# ============================================================
+# BACKGROUND PREDICTION JOBS
+# ============================================================
+
+from app.services.prediction_jobs import job_runner
+
+
+def test_prediction_job_lifecycle(monkeypatch, tmp_path):
+    """A submitted job is queued, runs in the background and reports results."""
+    use_fake_predictor(monkeypatch)
+    monkeypatch.setattr(job_runner, "storage_dir", tmp_path)
+    monkeypatch.setattr(job_runner, "_handler", predict_module.process_prediction_job)
+    headers = get_auth_header()
+
+    response = client.post(
+        "/api/predict/jobs",
+        headers=headers,
+        files=[
+            ("files", ("a.png", make_scan_png(10), "image/png")),
+            ("files", ("b.png", make_scan_png(11), "image/png")),
+        ],
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.json()["total_slices"] == 2
+
+    queued = client.get(f"/api/predict/jobs/{job_id}", headers=headers).json()
+    assert queued["status"] == "queued"
+    assert queued["result"] is None
+
+    # Run the job the way a worker task would
+    asyncio.run(job_runner.run_job(job_id))
+
+    done = client.get(f"/api/predict/jobs/{job_id}", headers=headers).json()
+    assert done["status"] == "completed"
+    assert done["completed_slices"] == 2
+    assert done["result"]["study"]["label"] == "Tumor"
+    assert len(done["result"]["slices"]) == 2
+    assert not (tmp_path / job_id).exists()  # inputs cleaned up
+
+    # SSE stream replays the final state, then [DONE]
+    with client.stream(
+        "GET", f"/api/predict/jobs/{job_id}/events", headers=headers
+    ) as stream:
+        events = [line[6:] for line in stream.iter_lines() if line.startswith("data: ")]
+    assert json.loads(events[0])["status"] == "completed"
+    assert events[-1] == "[DONE]"
+
+
+def test_prediction_job_saves_results_and_completion_atomically(monkeypatch, tmp_path):
+    """If completing the job fails, its predictions are rolled back too, so
+    a resumed run can't duplicate them."""
+    from app.crud import prediction_job as crud_job
+    from app.database.models import Prediction
+
+    use_fake_predictor(monkeypatch)
+    monkeypatch.setattr(job_runner, "storage_dir", tmp_path)
+    monkeypatch.setattr(job_runner, "_handler", predict_module.process_prediction_job)
+    headers = get_auth_header()
+
+    response = client.post(
+        "/api/predict/jobs",
+        headers=headers,
+        files=[("files", ("a.png", make_scan_png(13), "image/png"))],
+    )
+    job_id = response.json()["job_id"]
+
+    async def crash(db, job_id, result):
+        raise RuntimeError("process died")
+
+    monkeypatch.setattr(crud_job, "complete_job_async", crash)
+    asyncio.run(job_runner.run_job(job_id))
+
+    assert client.get(f"/api/predict/jobs/{job_id}", headers=headers).json()["status"] == "failed"
+    with TestSessionLocal() as db:
+        assert db.query(Prediction).count() == 0
+
+
+def test_prediction_job_other_user_gets_404(monkeypatch, tmp_path):
+    """Jobs are scoped to the user who submitted them."""
+    monkeypatch.setattr(job_runner, "storage_dir", tmp_path)
+    owner = get_auth_header()
+    response = client.post(
+        "/api/predict/jobs",
+        headers=owner,
+        files=[("files", ("a.png", make_scan_png(12), "image/png"))],
+    )
+    job_id = response.json()["job_id"]
+
+    other = get_auth_header(email="other@example.com", username="other")
+    response = client.get(f"/api/predict/jobs/{job_id}", headers=other)
+    assert response.status_code == 404
+
+
+# ============================================================
+# UPLOAD LIMITS
+# ============================================================
+import app.utils.file_validator as file_validator
+
+
+def test_oversized_body_rejected_by_content_length():
+    """A declared body over the route limit gets 413 before auth or parsing."""
+    body = b"x" * (file_validator.MAX_REQUEST_BODY + 1)
+    response = client.post(
+        "/api/auth/login",
+        content=body,
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 413
+
+
+def test_streamed_body_cut_off_at_limit():
+    """A chunked body with no Content-Length is aborted once over the limit."""
+
+    def chunks():
+        for _ in range(40):
+            yield b"x" * 64 * 1024  # 2.5MB total, default limit is 1MB
+
+    response = client.post(
+        "/api/auth/login",
+        content=chunks(),
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 413
+
+
+def test_upload_rejected_from_header_without_decoding(monkeypatch):
+    """Too-small or wrong-format images are rejected before any decode."""
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("image should not be decoded")
+
+    monkeypatch.setattr(file_validator, "decode_image", no_decode)
+    headers = get_auth_header()
+
+    tiny = io.BytesIO()
+    Image.new("L", (20, 20), 128).save(tiny, format="PNG")
+    response = client.post(
+        "/api/predict",
+        headers=headers,
+        files={"file": ("tiny.png", tiny.getvalue(), "image/png")},
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Image too small"
+
+    gif = io.BytesIO()
+    Image.new("L", (100, 100), 128).save(gif, format="GIF")
+    response = client.post(
+        "/api/predict",
+        headers=headers,
+        files={"file": ("scan.gif", gif.getvalue(), "image/gif")},
+    )
+    assert response.status_code == 403
+
+
+# ============================================================
+# QUERY PLANS
+# ============================================================
+from datetime import datetime
+
+
+def capture_statements(engine, run):
+    """Run run() and return the (sql, params) it sent through engine."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def query_plan(statement, parameters):
+    with test_engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return " | ".join(row[-1] for row in rows)
+
+
+KEYSET = (datetime(2026, 1, 1), 5)
+
+LISTING_QUERIES = [
+    ("get_user_predictions", "prediction", (1,), "ix_predictions_user_id_created_at_id"),
+    ("get_user_predictions", "prediction", (1, 0, 20, KEYSET), "ix_predictions_user_id_created_at_id"),
+    ("list_user_conversations", "conversation", (1,), "ix_conversations_user_id_updated_at_id"),
+    ("list_user_conversations", "conversation", (1, 0, 20, KEYSET), "ix_conversations_user_id_updated_at_id"),
+    ("get_conversation_messages", "conversation", ("c1", 1), "ix_messages_conversation_id_created_at"),
+]
+
+
+@pytest.mark.parametrize("variant", ["sync", "async"])
+@pytest.mark.parametrize("func_name, module, args, index", LISTING_QUERIES)
+def test_listing_queries_use_composite_indexes(func_name, module, args, index, variant):
+    """Each listing query is served by its composite index — filter,
+    keyset seek and ORDER BY — with no full scan or temp sort."""
+    import importlib
+
+    crud = importlib.import_module(f"app.crud.{module}")
+    if variant == "sync":
+        engine = test_engine
+
+        def run():
+            with TestSessionLocal() as db:
+                getattr(crud, func_name)(db, *args)
+    else:
+        engine = test_async_engine.sync_engine
+
+        def run():
+            async def query():
+                async with TestAsyncSessionLocal() as db:
+                    await getattr(crud, f"{func_name}_async")(db, *args)
+
+            asyncio.run(query())
+
+    statements = capture_statements(engine, run)
+    plans = [query_plan(sql, params) for sql, params in statements]
+    assert any(index in plan for plan in plans), plans
+    for plan in plans:
+        assert "TEMP B-TREE" not in plan, plan
+        assert not any(step.startswith("SCAN ") and "INDEX" not in step
+                       for step in plan.split(" | ")), plan
+
+
+def test_conversation_listing_statement_count_is_constant():
+    """Message counts come from the listing query itself: the number of
+    SQL statements doesn't grow with the page size."""
+    from app.crud import conversation as crud_conversation
+    from app.crud import user as crud_user
+    from app.database.models import MessageRole
+
+    headers = get_auth_header()
+    with TestSessionLocal() as db:
+        user = crud_user.get_user_by_email(db, "testuser@example.com")
+        for i in range(12):
+            conversation = crud_conversation.create_conversation(db, user.id, f"Question {i}")
+            for n in range(i % 4):
+                crud_conversation.save_message(db, conversation.id, MessageRole.user, f"m{n}")
+
+    def count_for(limit):
+        responses = []
+        statements = capture_statements(
+            test_async_engine.sync_engine,
+            lambda: responses.append(
+                client.get(f"/api/chat/conversations?limit={limit}", headers=headers)
+            ),
+        )
+        listing = responses[0].json()
+        assert len(listing["conversations"]) == min(limit, 12)
+        return len(statements), listing
+
+    count_for(1)  # warm the principal cache so both runs skip the user lookup
+    small, _ = count_for(2)
+    large, listing = count_for(12)
+    assert small == large
+    counts = {c["title"]: c["message_count"] for c in listing["conversations"]}
+    assert counts == {f"Question {i}": i % 4 for i in range(12)}
+
+
+def test_tool_messages_are_saved_in_one_batch():
+    """A tool round's results go in with one INSERT and one updated_at
+    touch, and load back in the order they were saved."""
+    from app.crud import conversation as crud_conversation
+    from app.crud import user as crud_user
+    from app.database.models import MessageRole
+
+    get_auth_header()
+    with TestSessionLocal() as db:
+        user_id = crud_user.get_user_by_email(db, "testuser@example.com").id
+        conversation_id = crud_conversation.create_conversation(db, user_id, "Q").id
+
+    messages = [
+        {
+            "role": MessageRole.tool,
+            "content": json.dumps({"n": n}),
+            "tool_name": f"call_{n}",
+            "tool_input": {"limit": n},
+            "tool_result": {"n": n},
+        }
+        for n in range(1, 9)
+    ]
+
+    async def save():
+        async with TestAsyncSessionLocal() as db:
+            await crud_conversation.save_messages_async(db, conversation_id, messages)
+
+    statements = capture_statements(
+        test_async_engine.sync_engine, lambda: asyncio.run(save())
+    )
+    verbs = [sql.split()[0] for sql, _ in statements]
+    assert verbs.count("INSERT") == 1
+    assert verbs.count("UPDATE") == 1
+
+    with TestSessionLocal() as db:
+        saved = crud_conversation.get_conversation_messages(db, conversation_id, user_id)
+    assert [m.tool_name for m in saved] == [f"call_{n}" for n in range(1, 9)]
+    # Ordered by created_at alone, so no two rows of the batch may tie
+    timestamps = [m.created_at for m in saved]
+    assert timestamps == sorted(set(timestamps))
+    assert all(m.role == MessageRole.tool for m in saved)
@@ -0,0 +1,857 @@
+# ============================================================
+# ClassifierBT Service Tests
+# ============================================================
+# Run with: pytest tests/test_services.py -v
+#
+# Unit tests for the pure-Python service layer. No model file,
+# TensorFlow or database is needed — the model is replaced by a
+# small numpy function.
+#
+# What's tested:
+#   - Micro-batching of concurrent inference requests
+#   - Inference worker pool admission limit
+#   - Single-decode image pipeline
+#   - Content-addressed prediction cache
+#   - Background model loading and warm-up
+#   - Serving backend selection and accuracy parity
+#   - DICOM / NIfTI volume ingestion
+#   - Database connection pool settings and metrics
+#   - Keyset pagination cursors
+# ============================================================
+import asyncio
+import importlib.util
+import io
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.batching import InferenceBatcher
+from app.services.inference_pool import InferencePool, PoolSaturatedError
+from app.services.model_service import ModelNotReadyError, ModelService, ModelState
+from app.services.prediction_cache import PredictionCache
+from app.utils.image_decoder import ImageTooLargeError, compute_stats, decode_image
+import app.utils.volume_decoder as volume_decoder
+from app.utils.volume_decoder import (
+    VolumeTooLargeError,
+    apply_window,
+    decode_volume,
+    select_slices,
+    sniff_volume_format,
+)
+
+
+def fake_model(batch: np.ndarray) -> np.ndarray:
+    """Return each row's mean as a (N, 1) prediction."""
+    return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+
+def encode_image(array: np.ndarray, fmt: str = "PNG") -> bytes:
+    """Encode a uint8 array as image bytes."""
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+# ============================================================
+# MICRO-BATCHING
+# ============================================================
+
+
+def test_batcher_single_request():
+    """A lone request is dispatched once the wait window closes."""
+    batcher = InferenceBatcher(fake_model, max_batch_size=8, max_wait_ms=1)
+    try:
+        preds = batcher.submit(np.full((1, 4, 4, 3), 7.0, dtype=np.float32))
+        assert preds.shape == (1, 1)
+        assert preds[0][0] == 7.0
+    finally:
+        batcher.close()
+
+
+def test_batcher_coalesces_concurrent_requests():
+    """Concurrent callers share one forward pass and get their own rows back."""
+    batch_sizes = []
+
+    def recording_model(batch):
+        batch_sizes.append(len(batch))
+        return fake_model(batch)
+
+    batcher = InferenceBatcher(recording_model, max_batch_size=8, max_wait_ms=200)
+    results = {}
+
+    def call(value):
+        arr = np.full((1, 4, 4, 3), float(value), dtype=np.float32)
+        results[value] = batcher.submit(arr)[0][0]
+
+    try:
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        batcher.close()
+
+    assert results == {i: float(i) for i in range(8)}
+    assert sum(batch_sizes) == 8
+    assert len(batch_sizes) < 8
+
+
+def test_batcher_respects_max_batch_size():
+    """No forward pass ever exceeds max_batch_size rows."""
+    batch_sizes = []
+
+    def recording_model(batch):
+        batch_sizes.append(len(batch))
+        time.sleep(0.01)
+        return fake_model(batch)
+
+    batcher = InferenceBatcher(recording_model, max_batch_size=3, max_wait_ms=50)
+    try:
+        futures = [
+            batcher.submit_async(np.zeros((1, 2, 2, 3), dtype=np.float32))
+            for _ in range(10)
+        ]
+        for f in futures:
+            f.result(timeout=5)
+    finally:
+        batcher.close()
+
+    assert max(batch_sizes) <= 3
+    assert sum(batch_sizes) == 10
+
+
+def test_batcher_propagates_model_errors():
+    """A failing forward pass fails every caller in that batch."""
+
+    def broken_model(batch):
+        raise RuntimeError("boom")
+
+    batcher = InferenceBatcher(broken_model, max_batch_size=4, max_wait_ms=1)
+    try:
+        future = batcher.submit_async(np.zeros((1, 2, 2, 3), dtype=np.float32))
+        with pytest.raises(RuntimeError, match="boom"):
+            future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_batcher_pads_to_bucket_sizes():
+    """Padded batches only use bucket shapes; callers get only their rows."""
+    seen_shapes = []
+
+    def first_pixel_model(batch):
+        seen_shapes.append(len(batch))
+        return batch[:, 0, 0, :1]
+
+    batcher = InferenceBatcher(
+        first_pixel_model, max_batch_size=6, max_wait_ms=50, pad_to_buckets=True
+    )
+    assert batcher.buckets == [1, 2, 4, 6]
+    try:
+        futures = [
+            batcher.submit_async(np.full((1, 2, 2, 3), i, dtype=np.float32))
+            for i in range(3)
+        ]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.close()
+
+    assert all(size in batcher.buckets for size in seen_shapes)
+    assert [r.tolist() for r in results] == [[[0.0]], [[1.0]], [[2.0]]]
+
+
+# ============================================================
+# INFERENCE WORKER POOL
+# ============================================================
+
+
+def test_pool_runs_work_off_the_event_loop():
+    """Work runs on a pool thread, not the event loop thread."""
+    pool = InferencePool(workers=2, max_queue=4)
+    try:
+        loop_thread = threading.get_ident()
+        worker_thread = asyncio.run(pool.run(threading.get_ident))
+        assert worker_thread != loop_thread
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+def test_pool_rejects_when_saturated():
+    """Submissions beyond max_queue fail fast with a retry hint."""
+    pool = InferencePool(workers=1, max_queue=2, retry_after=7)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturatedError) as exc_info:
+            await pool.run(time.sleep, 0)
+        release.set()
+        await asyncio.gather(*running)
+        return exc_info.value
+
+    try:
+        error = asyncio.run(scenario())
+        assert error.retry_after == 7
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+# ============================================================
+# SINGLE-DECODE IMAGE PIPELINE
+# ============================================================
+
+
+def test_decode_grayscale_scan():
+    """A grayscale PNG keeps its header facts and decodes to RGB once."""
+    gray = np.tile(np.arange(0, 200, 2, dtype=np.uint8), (80, 1))
+    decoded = decode_image(encode_image(gray))
+
+    assert decoded.format == "PNG"
+    assert decoded.mode == "L"
+    assert decoded.size == (100, 80)
+    assert decoded.image.mode == "RGB"
+    assert decoded.pixels.shape == (80, 100, 3)
+    assert decoded.mean_channel_diff == 0.0
+    assert decoded.std == pytest.approx(float(gray.std()), abs=1e-3)
+
+
+def test_decode_color_photo_stats():
+    """Channel statistics separate colour photos from grayscale scans."""
+    rgb = np.zeros((60, 60, 3), dtype=np.uint8)
+    rgb[:, :, 0] = 200
+    rgb[:, :, 2] = 40
+    decoded = decode_image(encode_image(rgb))
+
+    assert decoded.mode == "RGB"
+    assert decoded.channel_means == pytest.approx((200.0, 0.0, 40.0))
+    assert decoded.mean_channel_diff == pytest.approx((200 + 160 + 40) / 3)
+
+
+def test_decode_rejects_corrupt_data():
+    """Truncated image data fails during the single decode."""
+    data = encode_image(np.random.randint(0, 255, (64, 64), dtype=np.uint8))
+    with pytest.raises(Exception):
+        decode_image(data[: len(data) // 2])
+
+
+def test_large_jpeg_decoded_in_draft_mode():
+    """A large JPEG is DCT-scaled while decoding; header facts stay original."""
+    gray = np.random.default_rng(2).integers(0, 255, (3000, 2400), dtype=np.uint8)
+    decoded = decode_image(encode_image(gray, "JPEG"), min_side=448)
+
+    assert decoded.size == (2400, 3000)
+    assert decoded.format == "JPEG"
+    # 1/4 scale is the smallest that keeps both sides >= 448
+    assert decoded.image.size == (600, 750)
+
+
+def test_large_png_reduced_before_rgb_conversion():
+    """Non-JPEG formats are box-reduced in their own mode, then converted."""
+    gray = np.random.default_rng(3).integers(0, 255, (1000, 2000), dtype=np.uint8)
+    decoded = decode_image(encode_image(gray), min_side=448)
+
+    assert decoded.size == (2000, 1000)
+    assert decoded.image.size == (1000, 500)
+    assert decoded.image.mode == "RGB"
+    # Stats still see the original noise, not the averaged-out reduction
+    assert decoded.std == pytest.approx(float(gray.std()), rel=0.02)
+
+
+def test_decode_enforces_pixel_budget():
+    """Images over the pixel budget are refused from the header alone."""
+    data = encode_image(np.zeros((100, 100), dtype=np.uint8))
+    with pytest.raises(ImageTooLargeError):
+        decode_image(data, max_pixels=5000)
+
+
+def test_stats_match_full_resolution_numpy():
+    """Chunked integer statistics equal the float reference exactly."""
+    rgb = np.random.default_rng(0).integers(0, 255, (130, 90, 3), dtype=np.uint8)
+    stats = compute_stats(rgb, chunk_rows=16)
+
+    reference = rgb.astype(np.float64)
+    r, g, b = reference[:, :, 0], reference[:, :, 1], reference[:, :, 2]
+    assert stats.std == pytest.approx(reference.std())
+    assert stats.channel_means == pytest.approx(tuple(reference.mean(axis=(0, 1))))
+    assert stats.mean_channel_diff == pytest.approx(
+        (np.abs(r - g).mean() + np.abs(r - b).mean() + np.abs(g - b).mean()) / 3
+    )
+
+
+def test_stats_on_large_image_use_bounded_memory():
+    """A large upload is sampled: few pixels visited, small temporaries."""
+    rng = np.random.default_rng(1)
+    gray = rng.integers(0, 255, (3000, 3000), dtype=np.uint8)
+    decoded = decode_image(encode_image(gray))
+
+    tracemalloc.start()
+    stats = decoded.stats
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert stats.samples <= 262144
+    assert stats.std == pytest.approx(float(gray.std()), rel=0.02)
+    assert peak < 8 * 1024 * 1024
+
+
+def jpeg_bytes(pixels: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def test_jpeg_draft_stats_match_full_resolution():
+    """JPEG stats come from the draft-mode decode; the contrast and colour
+    checks must reach the same answer as at full resolution."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:2000, 0:2000]
+    scan = 128 + 60 * np.sin(x / 150) * np.cos(y / 200) + rng.normal(0, 8, (2000, 2000))
+    scan = scan.clip(0, 255).astype(np.uint8)
+    flat = (100 + rng.normal(0, 1.5, (2000, 2000))).clip(0, 255).astype(np.uint8)
+    colour = np.stack([scan, np.roll(scan, 300, axis=1), 255 - scan], axis=-1)
+
+    for pixels in (scan, flat, colour):
+        data = jpeg_bytes(pixels)
+        full = decode_image(data, min_side=0)
+        draft = decode_image(data)
+        assert draft.image.width < full.image.width  # draft mode kicked in
+
+        assert (draft.std < 5) == (full.std < 5)
+        assert draft.std == pytest.approx(full.std, rel=0.1, abs=1.0)
+        assert draft.mean_channel_diff == pytest.approx(full.mean_channel_diff, rel=0.05, abs=0.5)
+
+
+# ============================================================
+# PREDICTION CACHE
+# ============================================================
+
+RESULT = {"label": "Tumor", "confidence": 0.91, "valid_scan": True}
+
+
+def test_cache_hit_is_scoped_by_model_version():
+    """A result cached for one model version is invisible to another."""
+    cache = PredictionCache(max_entries=8, ttl_seconds=60)
+    key = cache.hash_bytes(b"scan")
+    cache.put("vgg16_v1", key, RESULT)
+
+    assert cache.get("vgg16_v1", key) == RESULT
+    assert cache.get("vgg16_v2", key) is None
+
+
+def test_cache_returns_copies():
+    """Callers mutating a cached result don't corrupt the cache."""
+    cache = PredictionCache(max_entries=8, ttl_seconds=60)
+    cache.put("v1", "abc", RESULT)
+    cache.get("v1", "abc")["label"] = "changed"
+    assert cache.get("v1", "abc")["label"] == "Tumor"
+
+
+def test_cache_evicts_least_recently_used():
+    """The oldest untouched entry is evicted once the cache is full."""
+    cache = PredictionCache(max_entries=2, ttl_seconds=60)
+    cache.put("v1", "a", RESULT)
+    cache.put("v1", "b", RESULT)
+    cache.get("v1", "a")  # touch a
+    cache.put("v1", "c", RESULT)
+
+    assert cache.get("v1", "a") is not None
+    assert cache.get("v1", "b") is None
+    assert len(cache) == 2
+
+
+def test_cache_entries_expire():
+    """Entries older than the TTL are treated as misses."""
+    cache = PredictionCache(max_entries=8, ttl_seconds=0.01)
+    cache.put("v1", "a", RESULT)
+    time.sleep(0.02)
+    assert cache.get("v1", "a") is None
+
+
+def test_tensor_hash_ignores_encoding():
+    """Same pixels saved as PNG and BMP give the same tensor address."""
+    pixels = np.random.randint(0, 255, (32, 32), dtype=np.uint8)
+    png = decode_image(encode_image(pixels, "PNG")).pixels
+    bmp = decode_image(encode_image(pixels, "BMP")).pixels
+
+    assert PredictionCache.hash_tensor(png) == PredictionCache.hash_tensor(bmp)
+    assert encode_image(pixels, "PNG") != encode_image(pixels, "BMP")
+
+
+# ============================================================
+# BACKGROUND MODEL LOADING
+# ============================================================
+
+
+class FakePredictor:
+    def __init__(self):
+        self.batcher = InferenceBatcher(fake_model, max_batch_size=8, pad_to_buckets=True)
+
+
+def test_model_service_loads_in_background(monkeypatch):
+    """start() returns immediately; the predictor is usable once ready."""
+    service = ModelService("unused.keras")
+    predictor = FakePredictor()
+    monkeypatch.setattr(service, "_build", lambda: predictor)
+
+    with pytest.raises(ModelNotReadyError):
+        service.get_predictor()
+
+    async def lifecycle():
+        await service.start()
+        assert service.state == ModelState.loading
+        await service.wait_until_loaded()
+
+    asyncio.run(lifecycle())
+    assert service.state == ModelState.ready
+    assert service.get_predictor() is predictor
+
+
+def test_model_service_reports_load_failure(monkeypatch):
+    """A failed load is reported, and predictions keep raising."""
+    service = ModelService("missing.keras")
+
+    def broken_build():
+        raise FileNotFoundError("missing.keras does not exist")
+
+    monkeypatch.setattr(service, "_build", broken_build)
+
+    async def lifecycle():
+        await service.start()
+        await service.wait_until_loaded()
+
+    asyncio.run(lifecycle())
+    assert service.status()["state"] == "failed"
+    assert "does not exist" in service.status()["error"]
+    with pytest.raises(ModelNotReadyError):
+        service.get_predictor()
+
+
+def test_model_warm_up_covers_every_bucket():
+    """Warm-up runs one synthetic batch per bucket size."""
+    predictor = FakePredictor()
+    seen = []
+    predictor.batcher.predict_fn = lambda batch: seen.append(batch.shape) or fake_model(batch)
+
+    ModelService._warm_up(predictor)
+
+    assert [shape[0] for shape in seen] == [1, 2, 4, 8]
+    assert all(shape[1:] == (224, 224, 3) for shape in seen)
+
+
+# ============================================================
+# SERVING BACKENDS + ACCURACY PARITY
+# ============================================================
+
+
+@pytest.fixture
+def model_loader(monkeypatch):
+    """The real model_loader module with TensorFlow stubbed out.
+
+    Loaded from its file under a private name: test_api replaces
+    app.services.model_loader in sys.modules with a mock.
+    """
+    monkeypatch.setitem(sys.modules, "tensorflow", MagicMock())
+    path = Path(__file__).parent.parent / "app" / "services" / "model_loader.py"
+    spec = importlib.util.spec_from_file_location("_model_loader_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fixed_backend(model_loader, outputs, name="candidate"):
+    """Backend returning preset sigmoid outputs, batch by batch."""
+    outputs = np.asarray(outputs, dtype=np.float32)
+
+    class FixedBackend(model_loader.InferenceBackend):
+        def __init__(self):
+            self.name = name
+            self.offset = 0
+
+        def predict(self, batch, verbose=0):
+            rows = outputs[self.offset : self.offset + len(batch)]
+            self.offset += len(batch)
+            return rows.reshape(-1, 1)
+
+    return FixedBackend()
+
+
+def test_backend_without_predict_fails_at_construction(model_loader):
+    class Incomplete(model_loader.InferenceBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+PARITY_IMAGES = np.zeros((6, 2, 2, 3), dtype=np.float32)
+REFERENCE = [0.1, 0.2, 0.9, 0.8, 0.3, 0.7]
+
+
+def test_parity_passes_within_tolerance(model_loader):
+    report = model_loader.check_backend_parity(
+        fixed_backend(model_loader, REFERENCE, "keras"),
+        fixed_backend(model_loader, [v + 0.01 for v in REFERENCE]),
+        PARITY_IMAGES,
+        max_abs_diff=0.05,
+        batch_size=4,
+    )
+    assert report["passed"]
+    assert report["label_agreement"] == 1.0
+    assert report["images"] == 6
+
+
+def test_parity_fails_on_max_abs_diff(model_loader):
+    candidate = list(REFERENCE)
+    candidate[2] = 0.99  # same label, but 0.09 off
+    report = model_loader.check_backend_parity(
+        fixed_backend(model_loader, REFERENCE, "keras"),
+        fixed_backend(model_loader, candidate),
+        PARITY_IMAGES,
+        max_abs_diff=0.05,
+    )
+    assert not report["passed"]
+    assert report["label_agreement"] == 1.0
+    assert report["max_abs_diff"] == pytest.approx(0.09, abs=1e-5)
+
+
+def test_parity_fails_on_label_disagreement(model_loader):
+    reference = [0.49, 0.2, 0.9, 0.8, 0.3, 0.7]
+    candidate = [0.51, 0.2, 0.9, 0.8, 0.3, 0.7]  # within tolerance, flips one label
+    report = model_loader.check_backend_parity(
+        fixed_backend(model_loader, reference, "keras"),
+        fixed_backend(model_loader, candidate),
+        PARITY_IMAGES,
+        max_abs_diff=0.05,
+    )
+    assert not report["passed"]
+    assert report["label_agreement"] == pytest.approx(5 / 6, abs=1e-4)
+
+
+@pytest.mark.parametrize(
+    "backend, quantization",
+    [("keras", "int8"), ("keras", "float16"), ("tf_function", "int8"), ("torch", "none")],
+)
+def test_build_backend_rejects_invalid_combinations(model_loader, backend, quantization):
+    loader = model_loader.ModelLoader("unused.keras")
+    with pytest.raises(ValueError):
+        loader.build_backend(backend, quantization)
+
+
+@pytest.mark.parametrize(
+    "candidate_outputs, expected",
+    [([0.9, 0.1], "tflite"), ([0.1, 0.9], "keras")],  # parity passes / fails
+)
+def test_load_falls_back_to_keras_when_parity_fails(
+    model_loader, monkeypatch, tmp_path, candidate_outputs, expected
+):
+    model_path = tmp_path / "model.keras"
+    model_path.write_bytes(b"weights")
+
+    keras_model = MagicMock()
+    keras_model.predict = lambda batch, verbose=0: np.array([[0.9], [0.1]])[: len(batch)]
+    model_loader.tf.keras.models.load_model.return_value = keras_model
+
+    monkeypatch.setattr(model_loader, "MODEL_PARITY_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        model_loader, "load_image_set", lambda directory: np.zeros((2, 2, 2, 3), np.float32)
+    )
+    monkeypatch.setattr(
+        model_loader.ModelLoader,
+        "build_backend",
+        lambda self, backend, quantization="none": fixed_backend(
+            model_loader, candidate_outputs, "tflite"
+        ),
+    )
+
+    served = model_loader.ModelLoader(str(model_path), backend="tflite").load()
+    assert served.name == expected
+    if expected == "keras":
+        assert isinstance(served, model_loader.KerasBackend)
+
+
+# ============================================================
+# DICOM / NIfTI INGESTION
+# ============================================================
+
+
+def make_nifti(shape=(64, 72, 40)) -> bytes:
+    """A NIfTI-1 volume: noisy background with a bright block in the middle."""
+    nib = pytest.importorskip("nibabel")
+    rng = np.random.default_rng(4)
+    volume = rng.normal(100, 20, shape).astype(np.int16)
+    volume[20:40, 20:40, :] += 600
+    image = nib.Nifti1Image(volume, np.eye(4))
+    image.header.set_slope_inter(2.0, -10.0)
+    return image.to_bytes()
+
+
+def make_dicom(pixels: np.ndarray, **tags) -> bytes:
+    """A MONOCHROME2 DICOM file with the given stored values; a 3D array
+    gives a multi-frame object."""
+    pydicom = pytest.importorskip("pydicom")
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = len(pixels)
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = pixels.astype(np.uint16).tobytes()
+    for name, value in tags.items():
+        setattr(ds, name, value)
+
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def test_sniff_volume_formats():
+    """DICOM and NIfTI are recognised from their leading bytes."""
+    assert sniff_volume_format(make_nifti()) == "NIFTI"
+    assert sniff_volume_format(make_dicom(np.zeros((8, 8)))) == "DICOM"
+    assert sniff_volume_format(encode_image(np.zeros((8, 8), dtype=np.uint8))) is None
+
+
+def test_select_slices_prefers_central_range():
+    assert select_slices(10, max_slices=16) == list(range(10))
+    picked = select_slices(100, max_slices=5)
+    assert len(picked) == 5
+    assert min(picked) >= 20 and max(picked) < 80
+
+
+def test_apply_window_maps_to_uint8():
+    stack = np.array([[-1000.0, 0.0, 40.0, 240.0, 3000.0]], dtype=np.float32)
+    out = apply_window(stack, center=40, width=400)
+    assert out.dtype == np.uint8
+    assert out.tolist() == [[0, 102, 127, 255, 255]]
+
+
+def test_decode_nifti_volume_into_slices():
+    """Only the selected axial slices are materialized, as 8-bit images."""
+    slices = decode_volume(make_nifti(), "NIFTI", "brain.nii")
+
+    assert len(slices) == 16
+    name, decoded = slices[0]
+    assert name.startswith("brain.nii#z")
+    assert decoded.format == "NIFTI"
+    # (X=64, Y=72) voxels → 64 columns × 72 rows
+    assert decoded.size == (64, 72)
+    assert decoded.image.mode == "RGB"
+    assert decoded.std > 5
+
+
+def test_decode_dicom_applies_rescale_and_window():
+    """Stored values are rescaled to HU, then windowed to 0..255."""
+    stored = np.full((64, 64), 1024, dtype=np.uint16)  # 0 HU
+    stored[:, 32:] = 1264                                 # 240 HU
+    data = make_dicom(
+        stored, RescaleSlope=1, RescaleIntercept=-1024, WindowCenter=40, WindowWidth=400
+    )
+
+    [(name, decoded)] = decode_volume(data, "DICOM", "slice.dcm")
+    pixels = np.asarray(decoded.image)[:, :, 0]
+
+    assert name == "slice.dcm"
+    assert decoded.format == "DICOM"
+    assert pixels[0, 0] == 102 and pixels[0, 63] == 255
+
+
+
+def test_multiframe_dicom_decodes_only_selected_frames(monkeypatch):
+    """Frames outside the selection are never decoded."""
+    pytest.importorskip("pydicom")
+    import pydicom.pixels
+
+    frames = np.random.default_rng(6).integers(0, 4000, (40, 64, 64)).astype(np.uint16)
+    data = make_dicom(frames)
+
+    decoded_indices = []
+    iter_pixels = pydicom.pixels.iter_pixels
+
+    def recording_iter_pixels(src, indices=None, **kwargs):
+        decoded_indices.extend(indices)
+        return iter_pixels(src, indices=indices, **kwargs)
+
+    monkeypatch.setattr(pydicom.pixels, "iter_pixels", recording_iter_pixels)
+    slices = decode_volume(data, "DICOM", "cine.dcm")
+
+    assert len(slices) == 16
+    assert sorted(decoded_indices) == volume_decoder.select_slices(40)
+    assert slices[0][0].startswith("cine.dcm#f")
+
+
+def test_volume_budget_checked_before_decoding(monkeypatch):
+    """Oversized volumes are rejected from the header alone."""
+    monkeypatch.setattr(volume_decoder, "MAX_VOLUME_VOXELS", 64 * 72 * 39)
+    with pytest.raises(VolumeTooLargeError):
+        decode_volume(make_nifti(), "NIFTI", "brain.nii")
+
+    monkeypatch.setattr(volume_decoder, "MAX_DECODE_PIXELS", 63 * 63)
+    with pytest.raises(VolumeTooLargeError):
+        decode_volume(make_dicom(np.zeros((64, 64))), "DICOM", "slice.dcm")
+
+
+def test_gzipped_nifti_expands_only_the_declared_volume(monkeypatch):
+    """A .nii.gz is decompressed up to the end of its first 3D volume:
+    trailing data (a gzip bomb's payload) is never expanded."""
+    import gzip
+
+    volume = make_nifti()
+    bomb = gzip.compress(volume + bytes(64 * 1024 * 1024))
+    assert sniff_volume_format(bomb[:544], "brain.nii.gz") == "NIFTI"
+
+    reads = []
+    read = gzip.GzipFile.read
+
+    def recording_read(self, size=-1):
+        data = read(self, size)
+        reads.append(len(data))
+        return data
+
+    monkeypatch.setattr(gzip.GzipFile, "read", recording_read)
+    slices = decode_volume(bomb, "NIFTI", "brain.nii.gz")
+
+    assert len(slices) == 16
+    assert sum(reads) == len(volume)
+
+    # A header declaring more than the budget is refused before expanding
+    monkeypatch.setattr(volume_decoder, "MAX_VOLUME_VOXELS", 1000)
+    reads.clear()
+    with pytest.raises(VolumeTooLargeError):
+        decode_volume(bomb, "NIFTI", "brain.nii.gz")
+    assert sum(reads) <= 544
+
+
+def test_scan_slices_report_the_upload_size_and_hash():
+    """A single-slice DICOM keys the cache and reports its size by the raw
+    upload; slices of a volume report the upload size but hash apart."""
+    from app.utils.file_validator import decode_scan
+
+    frame = np.random.default_rng(7).integers(0, 4000, (64, 64)).astype(np.uint16)
+    data = make_dicom(frame)
+    [scan_slice] = decode_scan(data, "slice.dcm")
+    assert scan_slice.file_size == len(data)
+    assert PredictionCache.hash_bytes(scan_slice.decoded.data) == PredictionCache.hash_bytes(data)
+
+    volume = make_nifti()
+    slices = decode_scan(volume, "brain.nii")
+    assert {s.file_size for s in slices} == {len(volume)}
+    assert len({PredictionCache.hash_bytes(s.decoded.data) for s in slices}) == len(slices)
+
+
+# ============================================================
+# DATABASE CONNECTION POOL
+# ============================================================
+from sqlalchemy import create_engine, exc as sa_exc, text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+
+from app.database.pool import PoolMetrics, pool_options
+
+
+def test_pool_options_per_url():
+    assert pool_options("sqlite:///:memory:") == {"poolclass": StaticPool}
+    assert pool_options("sqlite+aiosqlite:///./app.db", is_async=True) == {"poolclass": NullPool}
+
+    settings = {
+        "pool_size": 3,
+        "max_overflow": 2,
+        "pool_timeout": 1.5,
+        "pool_recycle": 600,
+        "pool_pre_ping": False,
+    }
+    options = pool_options("postgresql://u:p@db/app", PoolMetrics("test_options"), **settings)
+    assert issubclass(options.pop("poolclass"), QueuePool)
+    assert options == settings
+
+    async_options = pool_options("postgresql+asyncpg://u:p@db/app", is_async=True)
+    assert async_options["poolclass"] is AsyncAdaptedQueuePool
+
+
+def test_pool_metrics_count_checkouts_overflow_timeouts_invalidations(tmp_path):
+    pool_metrics = PoolMetrics("test_sqlite_file")
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(
+        url,
+        **pool_options(url, pool_metrics, pool_size=1, max_overflow=1, pool_timeout=0.1),
+    )
+    pool_metrics.attach(engine)
+
+    first = engine.connect()
+    second = engine.connect()  # beyond pool_size: served by overflow
+    first.execute(text("SELECT 1"))
+
+    assert pool_metrics.checkouts.value == 2
+    assert pool_metrics.checked_out.value == 2
+    assert pool_metrics.overflow.value == 1
+    assert pool_metrics.overflow_checkouts.value == 1
+    assert pool_metrics.connects.value == 2
+
+    with pytest.raises(sa_exc.TimeoutError):
+        engine.connect()  # pool and overflow exhausted
+    assert pool_metrics.timeouts.value == 1
+    assert pool_metrics.wait.snapshot()["count"] == 3
+
+    second.invalidate()
+    second.close()
+    first.close()
+    assert pool_metrics.invalidations.value == 1
+    assert pool_metrics.checked_out.value == 0
+    assert pool_metrics.overflow.value == 0
+    engine.dispose()
+
+
+# ============================================================
+# PAGINATION CURSORS
+# ============================================================
+from datetime import datetime, timezone
+
+from app.utils.pagination import InvalidCursor, Page, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    key = (datetime(2026, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc), "c0ffee-id")
+    token = encode_cursor(*key)
+    assert "=" not in token and "/" not in token and "+" not in token
+    assert decode_cursor(token) == key
+
+    for garbage in ["", "not-a-cursor", encode_cursor(key[0], 1)[:-3], "W10"]:
+        with pytest.raises(InvalidCursor):
+            decode_cursor(garbage)
+
+
+def test_page_from_rows_sets_cursor_only_when_more_rows_exist():
+    Row = type("Row", (), {})
+    rows = []
+    for i in range(3):
+        row = Row()
+        row.id, row.created_at = i, datetime(2026, 1, 1, 0, 0, i)
+        rows.append(row)
+
+    assert Page.from_rows(rows, 3, lambda r: (r.created_at, r.id)).next_cursor is None
+    page = Page.from_rows(rows, 2, lambda r: (r.created_at, r.id))
+    assert page.items == rows[:2]
+    assert decode_cursor(page.next_cursor) == (rows[1].created_at, 1)